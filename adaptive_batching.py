@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Adaptive Batching
+Runs a parser generator on its own thread and hands its records to the writer through a
+buffer capped at a number of records, so a slow writer blocks the parser (backpressure)
+instead of letting parsed records pile up in memory. The writer's batch size is tuned
+after every commit from the measured commit latency and parse rate, within Firestore's
+500-write limit.
+"""
+
+import time
+import threading
+from collections import deque
+
+MIN_BATCH_SIZE = 25
+MAX_BATCH_SIZE = 500  # Firestore batch limit
+TARGET_COMMIT_SECONDS = 2.0  # Commit duration the controller aims for
+MAX_QUEUED_RECORDS = 2000  # Parsed records allowed to wait for the writer
+
+
+class AdaptiveBatchController:
+    """
+    Picks the size of the next writer batch.
+
+    - Commit latency: the per-record cost of the last commit gives the size that commits
+      in about TARGET_COMMIT_SECONDS (fast writes -> bigger batches, fewer round-trips).
+    - Parse rate: when the writer had to wait for the parser, a batch is capped at what
+      the parser produces in TARGET_COMMIT_SECONDS, so records are not held back waiting
+      for a batch to fill.
+    Each step at most halves or doubles the size.
+    """
+
+    def __init__(self, initial_size=MAX_BATCH_SIZE, min_size=MIN_BATCH_SIZE, max_size=MAX_BATCH_SIZE,
+                 target_seconds=TARGET_COMMIT_SECONDS):
+        self.min_size = max(1, min(min_size, max_size))
+        self.max_size = min(max_size, MAX_BATCH_SIZE)
+        self.size = self._clamp(initial_size)
+        self.initial_size = self.size
+        self.target_seconds = target_seconds
+        self.decisions = []
+        self.parsed = 0
+        self.parse_seconds = 0.0
+        self.parser_blocked_seconds = 0.0
+        self.writer_idle_seconds = 0.0
+        self.commit_seconds = 0.0
+        self.peak_queued = 0
+        self._last_wait = 0.0
+        self._last_depth = 0
+        self._lock = threading.Lock()
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(self.max_size, size)))
+
+    def record_parsed(self, count, seconds):
+        """Called by the parser thread for every chunk it produces"""
+        with self._lock:
+            self.parsed += count
+            self.parse_seconds += seconds
+
+    def record_blocked(self, seconds):
+        with self._lock:
+            self.parser_blocked_seconds += seconds
+
+    def record_fill(self, wait_seconds, queued_records):
+        """Called when a batch is handed to the writer: how long it waited and what is still queued"""
+        self._last_wait = wait_seconds
+        self._last_depth = queued_records
+        self.writer_idle_seconds += wait_seconds
+        self.peak_queued = max(self.peak_queued, queued_records)
+
+    def parse_rate(self):
+        with self._lock:
+            return self.parsed / self.parse_seconds if self.parse_seconds > 0 else 0.0
+
+    def record_commit(self, count, seconds):
+        """Feed back one commit's size and duration; returns the size for the next batch"""
+        self.commit_seconds += seconds
+        if count <= 0:
+            return self.size
+
+        per_record = seconds / count
+        proposed = self.target_seconds / per_record if per_record > 0 else self.max_size
+        reason = "commit latency"
+        parse_rate = self.parse_rate()
+        if self._last_wait > 0 and parse_rate > 0 and parse_rate * self.target_seconds < proposed:
+            proposed = parse_rate * self.target_seconds
+            reason = "parse rate"
+
+        previous = self.size
+        self.size = self._clamp(min(max(proposed, previous / 2), previous * 2))
+        self.decisions.append({
+            "batch": len(self.decisions) + 1,
+            "records": count,
+            "commit_seconds": round(seconds, 3),
+            "parse_rate": round(parse_rate, 1),
+            "writer_wait_seconds": round(self._last_wait, 3),
+            "queued_records": self._last_depth,
+            "next_size": self.size,
+            "reason": reason
+        })
+        return self.size
+
+    def summary(self):
+        sizes = [d["records"] for d in self.decisions]
+        return {
+            "initial_size": self.initial_size,
+            "final_size": self.size,
+            "min_used": min(sizes) if sizes else 0,
+            "max_used": max(sizes) if sizes else 0,
+            "average_commit_seconds": round(self.commit_seconds / len(sizes), 3) if sizes else 0,
+            "parse_rate": round(self.parse_rate(), 1),
+            "parser_blocked_seconds": round(self.parser_blocked_seconds, 2),
+            "writer_idle_seconds": round(self.writer_idle_seconds, 2),
+            "peak_queued_records": self.peak_queued,
+            "decisions": self.decisions
+        }
+
+
+def adaptive_batches(record_source, controller, max_queued_records=MAX_QUEUED_RECORDS):
+    """
+    Yield lists of records sized by controller.size, parsing record_source (an iterable of
+    record lists) on a background thread. The parser blocks once max_queued_records are
+    waiting; the caller reports each commit with controller.record_commit().
+    Parser exceptions are re-raised here.
+    """
+    buffer = deque()
+    queued = [0]
+    state = {"done": False, "error": None}
+    cond = threading.Condition()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            source = iter(record_source)
+            while not stop.is_set():
+                started = time.time()
+                records = next(source, None)
+                if records is None:
+                    break
+                controller.record_parsed(len(records), time.time() - started)
+                with cond:
+                    blocked_since = time.time()
+                    # Backpressure: wait for the writer, but always accept into an empty buffer
+                    while queued[0] and queued[0] + len(records) > max_queued_records and not stop.is_set():
+                        cond.wait(0.5)
+                    controller.record_blocked(time.time() - blocked_since)
+                    buffer.append(records)
+                    queued[0] += len(records)
+                    cond.notify_all()
+        except Exception as e:
+            state["error"] = e
+        finally:
+            with cond:
+                state["done"] = True
+                cond.notify_all()
+
+    producer = threading.Thread(target=produce, name="adaptive-batch-parser", daemon=True)
+    producer.start()
+    pending = []
+    try:
+        while True:
+            waited = 0.0
+            with cond:
+                while len(pending) + queued[0] < controller.size and not state["done"]:
+                    if not buffer:
+                        wait_started = time.time()
+                        cond.wait()
+                        waited += time.time() - wait_started
+                        continue
+                    # Take what is queued now; more can arrive while this chunk is merged
+                    records = buffer.popleft()
+                    queued[0] -= len(records)
+                    pending.extend(records)
+                    cond.notify_all()
+                while buffer and len(pending) < controller.size:
+                    records = buffer.popleft()
+                    queued[0] -= len(records)
+                    pending.extend(records)
+                cond.notify_all()
+                if state["error"] is not None:
+                    raise state["error"]
+                remaining = queued[0]
+            if not pending:
+                return
+            batch, pending = pending[:controller.size], pending[controller.size:]
+            controller.record_fill(waited, remaining + len(pending))
+            yield batch
+    finally:
+        stop.set()
+        with cond:
+            cond.notify_all()
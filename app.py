@@ -6,9 +6,11 @@ import json
 import time
 import threading
 import re
+import tempfile
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory, render_template, session, redirect, url_for
+from flask import Flask, Request, g, request, jsonify, send_from_directory, render_template, session, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
@@ -151,8 +153,18 @@ def fix_unknown_years(batch_size=200):
         time.sleep(0.2)  # avoid hitting Firestore limits
     logger.info(f"Done! Fixed {count} records.")
     return {"success": True, "updated": count, "updated_ids": updated_ids}
-from parser.parser_jntuk import parse_jntuk_pdf
+from parser.parser_jntuk import parse_jntuk_pdf, parse_code_list
 from parser.parser_autonomous import parse_autonomous_pdf
+from ingestion import (stream_pdfs_parallel, parse_pdf_in_pool, stream_pdf_batches, submit_ingestion_job, queue_status,
+                       queue_stats, register_job_handler, start_job_runners, IngestionQueueFull,
+                       IngestionCancelled, IngestionLeaseLost, cancellation_check, cancel_ingestion_job, INGEST_MODE)
+import job_store
+import progress_store
+import chunked_upload
+from write_journal import WriteJournal
+import delta_ingestion
+from firestore_gate import gate as firestore_gate
+from record_spool import RecordSpool, INGEST_MEMORY_BUDGET_MB
 
 # Import batch processor for supply functionality
 try:
@@ -550,11 +562,43 @@ except Exception as e:
     bucket = None
     FIREBASE_AVAILABLE = False
 
+def commit_journal_batch(writes):
+    """Commit one journaled batch of (op, collection, doc_id, data) writes"""
+    batch = db.batch()
+    for op, collection, doc_id, data in writes:
+        doc_ref = db.collection(collection).document(doc_id)
+        if op == 'delete':
+            batch.delete(doc_ref)
+        else:
+            batch.set(doc_ref, data)
+    with firestore_gate.bulk():
+        batch.commit()
+
+# Pending Firestore writes are fsynced here before commit and replayed after a crash
+write_journal = WriteJournal(commit_journal_batch)
+if FIREBASE_AVAILABLE:
+    write_journal.start()
+
 # -----------------------------------------------------------------------------
 # Firebase helper functions
 # -----------------------------------------------------------------------------
-def save_to_firebase(student_results, year, semesters, exam_types, format_type, doc_id, upload_id=None, allow_duplicates=True):
-    """Save parsed results to Firebase Firestore with progress tracking"""
+def save_to_firebase(student_results, year, semesters, exam_types, format_type, doc_id, upload_id=None, allow_duplicates=True,
+                     cancel_check=None, committed_refs=None, doc_ids=None, journal_batches=None, delta=None,
+                     saved_indices=None):
+    """
+    Save parsed results to Firebase Firestore with progress tracking.
+    Batches go to the write journal and are committed by its flusher, so this returns once
+    they are durable locally; the ids of journaled batches are appended to journal_batches
+    for callers that wait on the commits (write_journal.wait).
+    cancel_check is called before every batch (it raises to stop the upload), and the
+    references of journaled documents are appended to committed_refs for rollback.
+    doc_ids (student_id -> document id) is filled as students are written; a student already
+    in it is written to the same document again instead of a new one.
+    delta (delta_ingestion.new_delta()) switches to delta mode: students whose stored record
+    has the same content hash are skipped and changed ones overwrite their document; the
+    returned count is then the number of students written.
+    saved_indices receives the positions in student_results of the students journaled.
+    """
     if not FIREBASE_AVAILABLE or not db:
         logger.warning("Firebase not available - skipping Firebase upload")
         if upload_id:
@@ -565,12 +609,36 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
         update_progress(upload_id, "firebase_uploading", firebase={"status": "uploading", "progress": 0, "batches": 0, "students_saved": 0})
     
     students_saved = 0
-    batch = db.batch()
+    batch_writes = []
+    batch_refs = []
+    batch_indices = []
     batch_count = 0
     batch_number = 0
     MAX_BATCH_SIZE = 500
     total_students = len(student_results)
     
+    def journal_pending():
+        """Journal the current batch (fsynced before any commit); False if the journal write failed"""
+        nonlocal batch_writes, batch_refs, batch_indices, batch_count, batch_number, students_saved
+        try:
+            batch_id = write_journal.append(batch_writes)
+        except OSError as e:
+            logger.error(f"Error journaling Firebase batch: {e}")
+            students_saved -= batch_count
+            return False
+        finally:
+            refs, indices = batch_refs, batch_indices
+            batch_writes, batch_refs, batch_indices, batch_count = [], [], [], 0
+        if committed_refs is not None:
+            committed_refs.extend(refs)
+        if saved_indices is not None:
+            saved_indices.extend(indices)
+        if journal_batches is not None:
+            journal_batches.append(batch_id)
+        batch_number += 1
+        logger.info(f"Journaled Firebase batch {batch_number}: {len(refs)} records")
+        return True
+    
     try:
         for i, student_data in enumerate(student_results):
             student_id = student_data.get('student_id', '')
@@ -604,16 +672,30 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
 
             # Create unique document ID with timestamp to ensure uniqueness
             timestamp_suffix = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # Include milliseconds
-            if allow_duplicates:
+            rewrite = doc_ids is not None and student_id in doc_ids
+            record_hash = delta_ingestion.content_hash(student_data)
+            existing_doc_id = None
+            if delta is not None and not rewrite:
+                with firestore_gate.bulk():
+                    outcome, existing_doc_id = delta_ingestion.classify(
+                        delta, db, (year_to_use, year_semester, detected_exam_type), student_id, record_hash)
+                if outcome == 'unchanged':
+                    continue
+            if rewrite:
+                student_doc_id = doc_ids[student_id]
+            elif existing_doc_id:
+                student_doc_id = existing_doc_id
+            elif allow_duplicates:
                 # When allowing duplicates, add timestamp to make each entry unique
                 student_doc_id = f"{student_id}_{year_to_use}_{detected_semester.replace(' ', '_')}_{detected_exam_type}_{timestamp_suffix}"
             else:
                 student_doc_id = f"{student_id}_{year_to_use}_{detected_semester.replace(' ', '_')}_{detected_exam_type}"
 
             # Check for duplicates only if allow_duplicates is False
-            if not allow_duplicates:
+            if not allow_duplicates and not rewrite and not existing_doc_id:
                 try:
-                    existing_doc = db.collection('student_results').document(student_doc_id).get()
+                    with firestore_gate.bulk():
+                        existing_doc = db.collection('student_results').document(student_doc_id).get()
                     if existing_doc.exists:
                         # Log first few duplicates to help user understand
                         logger.info(f"Duplicate found: {student_id} already exists in database - will skip")
@@ -628,6 +710,8 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
                     logger.warning(f"Error checking duplicate for {student_id}: {e}")
                     continue
             
+            if doc_ids is not None:
+                doc_ids[student_id] = student_doc_id
             firebase_student_data = student_data.copy()
             
             # Debug: Check what's in student_data
@@ -649,7 +733,8 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
                 'attempts': 0,
                 'uploadedAt': firestore.SERVER_TIMESTAMP,
                 'supplyExamTypes': [],
-                'isSupplyOnly': False
+                'isSupplyOnly': False,
+                'contentHash': record_hash
             })
             
             # Debug: Check final year value
@@ -659,18 +744,17 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
                 logger.info(f"DEBUG: Student {i+1} - student_doc_id: {student_doc_id}")
 
             # Add to batch
-            student_ref = db.collection('student_results').document(student_doc_id)
-            batch.set(student_ref, firebase_student_data)
+            batch_writes.append(('set', 'student_results', student_doc_id, firebase_student_data))
+            batch_refs.append(db.collection('student_results').document(student_doc_id))
+            batch_indices.append(i)
             students_saved += 1
             batch_count += 1
             
-            # Commit batch when reaching limit
+            # Journal batch when reaching limit; the journal's flusher commits it
             if batch_count >= MAX_BATCH_SIZE:
-                try:
-                    batch.commit()
-                    batch_number += 1
-                    logger.info(f"Committed Firebase batch {batch_number}: {batch_count} records")
-                    
+                if cancel_check:
+                    cancel_check()
+                if journal_pending():
                     # Update progress
                     if upload_id:
                         progress = (i + 1) / total_students * 100
@@ -682,36 +766,12 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
                             "total_students": total_students,
                             "message": f"Batch {batch_number} uploaded: {students_saved} students saved"
                         })
-                    
-                    batch = db.batch()
-                    batch_count = 0
-                except Exception as e:
-                    # Handle Firebase authentication errors gracefully
-                    if "invalid_grant" in str(e).lower() or "jwt signature" in str(e).lower():
-                        logger.error(f"Firebase authentication error during batch commit: {e}")
-                        if upload_id:
-                            update_progress(upload_id, "firebase_auth_error", firebase={"status": "auth_error", "message": "Firebase authentication failed during upload"})
-                        return students_saved - batch_count
-                    logger.error(f"Error committing Firebase batch: {e}")
-                    batch = db.batch()
-                    batch_count = 0
-                    students_saved -= batch_count
-        
-        # Commit remaining records
+        
+        # Journal remaining records
         if batch_count > 0:
-            try:
-                batch.commit()
-                batch_number += 1
-                logger.info(f"Committed final Firebase batch {batch_number}: {batch_count} records")
-            except Exception as e:
-                # Handle Firebase authentication errors gracefully
-                if "invalid_grant" in str(e).lower() or "jwt signature" in str(e).lower():
-                    logger.error(f"Firebase authentication error during final batch commit: {e}")
-                    if upload_id:
-                        update_progress(upload_id, "firebase_auth_error", firebase={"status": "auth_error", "message": "Firebase authentication failed during final upload"})
-                    return students_saved - batch_count
-                logger.error(f"Error committing final Firebase batch: {e}")
-                students_saved -= batch_count
+            if cancel_check:
+                cancel_check()
+            journal_pending()
         
         logger.info(f"Firebase upload complete: {students_saved} students saved")
         
@@ -728,6 +788,8 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
         
         return students_saved
         
+    except IngestionCancelled:
+        raise
     except Exception as e:
         # Handle Firebase authentication errors gracefully
         if "invalid_grant" in str(e).lower() or "jwt signature" in str(e).lower():
@@ -740,18 +802,62 @@ def save_to_firebase(student_results, year, semesters, exam_types, format_type,
                 update_progress(upload_id, "firebase_error", firebase={"status": "error", "message": str(e)})
         return 0
 
+def rollback_committed_students(doc_refs, upload_id=None, batch_ids=None):
+    """
+    Delete documents an upload already wrote, in Firestore-sized batches; returns how many.
+    The deletes go through the write journal, so they commit after the upload's own sets.
+    batch_ids, the upload's journal batches, are marked rolled back first so a replay after
+    a crash never re-commits them on top of the deletes.
+    """
+    if batch_ids:
+        write_journal.mark_rolled_back(batch_ids)
+    deleted = 0
+    for start in range(0, len(doc_refs), FIRESTORE_BATCH_LIMIT):
+        chunk = doc_refs[start:start + FIRESTORE_BATCH_LIMIT]
+        batch_id = write_journal.append([('delete', 'student_results', doc_ref.id, None) for doc_ref in chunk])
+        if not write_journal.wait([batch_id], timeout=FIREBASE_COMMIT_WAIT_SECONDS):
+            raise TimeoutError(f"{len(doc_refs) - deleted} deletes still queued in the write journal")
+        deleted += len(chunk)
+        if upload_id:
+            update_progress(upload_id, "rolling_back", firebase={
+                "status": "rolling_back",
+                "message": f"Removing saved records: {deleted}/{len(doc_refs)}"
+            })
+    logger.info(f"Rolled back {deleted} committed student records")
+    return deleted
+
+def finish_cancelled_upload(upload_id, committed_refs, journal_batches, files=None):
+    """Roll back what a cancelled upload already wrote and mark it cancelled in progress"""
+    extra = {"files": files} if files is not None else {}
+    try:
+        deleted = rollback_committed_students(committed_refs, upload_id, journal_batches) if committed_refs else 0
+    except Exception as e:
+        logger.error(f"Rollback of cancelled upload {upload_id} failed: {e}")
+        update_progress(upload_id, "cancelled", error={
+            "status": "cancelled",
+            "message": f"Upload cancelled, but removing {len(committed_refs)} saved records failed: {e}"
+        }, **extra)
+        return
+    update_progress(upload_id, "cancelled", firebase={
+        "status": "cancelled",
+        "students_saved": 0,
+        "message": f"Upload cancelled, {deleted} saved records removed"
+    }, **extra)
+
+STORAGE_CHUNK_BYTES = 4 * 1024 * 1024  # Resumable upload chunk (multiple of 256 KB): memory per upload stays flat
+
 def upload_pdf_to_storage(file, filename):
-    """Upload PDF file to Firebase Storage"""
+    """Upload a PDF (a path on disk or an open binary file) to Firebase Storage, streamed in chunks"""
     if not FIREBASE_AVAILABLE or not bucket:
         logger.warning("Firebase Storage not available - skipping file upload")
         return None
     
     try:
-        file.seek(0)
-        blob = bucket.blob(filename)
-        content = file.read()
-        
-        blob.upload_from_string(content, content_type='application/pdf')
+        blob = bucket.blob(filename, chunk_size=STORAGE_CHUNK_BYTES)
+        if isinstance(file, (str, os.PathLike)):
+            blob.upload_from_filename(file, content_type='application/pdf')
+        else:
+            blob.upload_from_file(file, rewind=True, content_type='application/pdf')
         blob.make_public()
         
         logger.info(f"PDF uploaded to Firebase Storage: {filename}")
@@ -766,21 +872,50 @@ def upload_pdf_to_storage(file, filename):
         return None
 
 # -----------------------------------------------------------------------------
-# Progress tracking for upload operations
+# Progress tracking for upload operations (progress_store: SQLite shared by all workers)
 # -----------------------------------------------------------------------------
-upload_progress = {}
+def progress_from_job_store(upload_id):
+    """Progress view of a job queued, running or finished in any gunicorn worker"""
+    job = job_store.get_job(upload_id)
+    if job is None:
+        return None
+    
+    queue = queue_status(upload_id)
+    if job['state'] == 'pending':
+        return {"status": "queued", "queue": queue, "parsing": {
+            "status": "queued",
+            "message": f"Waiting in queue (position {queue['position']}, starts in ~{queue['eta_seconds']}s)"
+        }}
+    if job['state'] == 'running':
+        return {"status": "processing", "queue": queue, "parsing": {
+            "status": "parsing", "message": f"Processing (attempt {job['attempts']})..."
+        }}
+    if job['state'] == 'finished':
+        return {"status": "completed", "queue": queue, "final_result": job['result']}
+    if job['state'] == 'cancelled':
+        return {"status": "cancelled", "queue": queue}
+    return {"status": "error", "queue": queue, "error": {"status": "error", "message": job['error']}}
+
+def current_progress(upload_id):
+    """Progress record of an upload, falling back to the job store while it is still queued"""
+    progress = progress_store.get(upload_id)
+    
+    # Jobs no runner has started yet only exist in the shared job store
+    if progress is None or progress.get("status") in ("started", "queued"):
+        progress = progress_from_job_store(upload_id) or progress or {
+            "status": "not_found",
+            "message": "Upload not found"
+        }
+    return progress
 
 @app.route('/api/upload-progress/<upload_id>', methods=['GET'])
 def get_upload_progress(upload_id):
     """Get real-time upload progress"""
-    progress = upload_progress.get(upload_id, {
-        "status": "not_found",
-        "message": "Upload not found"
-    })
+    progress = current_progress(upload_id)
     
     # Include final result data if available and status is completed
-    if progress.get("status") == "completed" and "final_result" in upload_progress.get(upload_id, {}):
-        progress["result"] = upload_progress[upload_id]["final_result"]
+    if progress.get("status") == "completed" and progress.get("final_result"):
+        progress["result"] = progress["final_result"]
         
         # Also include the students data if available in the JSON file for metadata extraction
         json_filename = progress["result"].get("json_file")
@@ -796,27 +931,119 @@ def get_upload_progress(upload_id):
     
     return jsonify(progress)
 
-def update_progress(upload_id, status, **kwargs):
-    """Update progress for an upload"""
-    if upload_id not in upload_progress:
-        upload_progress[upload_id] = {
-            "status": "starting",
-            "timestamp": time.time(),
-            "parsing": {"status": "pending", "progress": 0},
-            "firebase": {"status": "pending", "progress": 0, "batches": 0, "students_saved": 0},
-            "storage": {"status": "pending"},
-            "json": {"status": "pending"}
-        }
+PROGRESS_STREAM_INTERVAL = 0.25  # Seconds between store reads while streaming (matches the flush interval)
+PROGRESS_STREAM_KEEPALIVE = 15  # Seconds between comment lines that keep proxies from closing the stream
+PROGRESS_STREAM_MAX_SECONDS = 600  # Browsers reconnect automatically after the server ends a stream
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.route('/api/upload-progress/<upload_id>/stream', methods=['GET'])
+def stream_upload_progress(upload_id):
+    """
+    Server-Sent Events stream of upload progress: a 'progress' event whenever stages or
+    batch counts change, then one 'summary' event with the final result (or error).
+    """
+    def generate():
+        yield "retry: 2000\n\n"
+        last_sent = None
+        last_write = time.time()
+        deadline = time.time() + PROGRESS_STREAM_MAX_SECONDS
+        while time.time() < deadline:
+            progress = current_progress(upload_id)
+            status = progress.get("status")
+            
+            if status in ("completed", "error", "cancelled", "not_found"):
+                # Final event: the summary only (the student list is already in the JSON file)
+                summary = {key: value for key, value in progress.items() if key != "final_result"}
+                if progress.get("final_result"):
+                    summary["result"] = {key: value for key, value in progress["final_result"].items() if key != "students"}
+                yield sse_event("summary", summary)
+                return
+            
+            snapshot = json.dumps({key: value for key, value in progress.items() if key != "timestamp"}, sort_keys=True, default=str)
+            if snapshot != last_sent:
+                last_sent = snapshot
+                last_write = time.time()
+                yield sse_event("progress", progress)
+            elif time.time() - last_write >= PROGRESS_STREAM_KEEPALIVE:
+                last_write = time.time()
+                yield ": keepalive\n\n"
+            time.sleep(PROGRESS_STREAM_INTERVAL)
     
-    upload_progress[upload_id]["status"] = status
-    upload_progress[upload_id]["timestamp"] = time.time()
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/ingestion-queue', methods=['GET'])
+def get_ingestion_queue():
+    """Current ingestion queue load (workers, running, queued, capacity) and, in thread mode, this worker's bulk Firestore slots"""
+    firestore_slots = firestore_gate.stats() if INGEST_MODE == 'threads' else None  # Jobs run in the ingestion process
+    return jsonify(dict(queue_stats(), mode=INGEST_MODE, firestore=firestore_slots))
+
+@app.route('/api/write-journal', methods=['GET'])
+def get_write_journal():
+    """This worker's write journal (batches appended, committed, retried, replayed, pending)"""
+    return jsonify(write_journal.status())
+
+@app.route('/api/cancel-upload/<upload_id>', methods=['POST'])
+def cancel_upload(upload_id):
+    """
+    Cancel a queued or running upload. A running job stops at its next page or Firestore
+    batch and deletes the batches it already committed.
+    """
+    previous_state = cancel_ingestion_job(upload_id)
+    if previous_state is None:
+        return jsonify({"error": "Upload not found"}), 404
     
-    for key, value in kwargs.items():
-        if key in upload_progress[upload_id]:
-            if isinstance(upload_progress[upload_id][key], dict) and isinstance(value, dict):
-                upload_progress[upload_id][key].update(value)
-            else:
-                upload_progress[upload_id][key] = value
+    if previous_state == 'pending':
+        # Never started: drop its saved PDFs now, nothing was written
+        job = job_store.get_job(upload_id)
+        saved = job['payload']['args'][0]
+        for path in ([saved] if isinstance(saved, str) else [path for path, _ in saved]):
+            if os.path.exists(path):
+                os.remove(path)
+        update_progress(upload_id, "cancelled", parsing={"status": "cancelled", "message": "Upload cancelled before processing started"})
+        return jsonify({"success": True, "upload_id": upload_id, "status": "cancelled"})
+    
+    if previous_state == 'running':
+        update_progress(upload_id, "cancelling", parsing={"status": "cancelling", "message": "Cancelling upload..."})
+        return jsonify({"success": True, "upload_id": upload_id, "status": "cancelling"}), 202
+    
+    return jsonify({"error": f"Upload already {previous_state}", "status": previous_state}), 409
+
+@app.route('/api/upload-progress-stats', methods=['GET'])
+def get_upload_progress_stats():
+    """Progress store size and eviction metrics"""
+    return jsonify(progress_store.stats())
+
+def enqueue_upload(upload_id, kind, args, code_filter, saved_paths, delta=False):
+    """Persist an upload job in the shared job store; on a full queue remove its saved files and answer 503"""
+    payload = {
+        "upload_id": upload_id,
+        "args": args,
+        "kwargs": dict({key: sorted(codes) if codes else None for key, codes in code_filter.items()}, delta=delta)
+    }
+    try:
+        status = submit_ingestion_job(upload_id, kind, payload)
+    except IngestionQueueFull as e:
+        for path in saved_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        progress_store.delete(upload_id)
+        response = jsonify({"error": str(e), "retry_after": 30})
+        response.headers['Retry-After'] = '30'
+        return None, (response, 503)
+    return status, None
+
+def parse_delta_flag(value):
+    """Form/JSON 'delta' option: re-upload writes only added or changed students"""
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def update_progress(upload_id, status, **kwargs):
+    """Update progress for an upload (shared by all workers; intermediate updates are coalesced)"""
+    progress_store.update(upload_id, status, **kwargs)
 
 # -----------------------------------------------------------------------------
 # API key setup for authorization (store keys safely in production!)
@@ -969,24 +1196,37 @@ class PDFValidator:
         if not file or not file.filename:
             return False, "No file provided"
             
-        if not file.filename.lower().endswith('.pdf'):
-            return False, "Only PDF files are allowed"
-            
         # Check file size
         file.seek(0, os.SEEK_END)
         size = file.tell()
         file.seek(0)
         
+        # Check PDF header
+        header = file.read(1024)
+        file.seek(0)
+        
+        return PDFValidator.check(file.filename, size, header)
+
+    @staticmethod
+    def validate_path(file_path, filename):
+        """Validates a PDF already on disk (an upload's single copy), reading only its header"""
+        if not filename:
+            return False, "No file provided"
+        with open(file_path, 'rb') as f:
+            header = f.read(1024)
+        return PDFValidator.check(filename, os.path.getsize(file_path), header)
+
+    @staticmethod
+    def check(filename, size, header):
+        if not filename.lower().endswith('.pdf'):
+            return False, "Only PDF files are allowed"
+            
         if size > PDFValidator.MAX_SIZE:
             return False, f"File too large. Maximum size is {PDFValidator.MAX_SIZE / 1024 / 1024}MB"
             
         if size < PDFValidator.MIN_SIZE:
             return False, "File too small or possibly corrupted"
             
-        # Check PDF header
-        header = file.read(1024)
-        file.seek(0)
-        
         if not header.startswith(b'%PDF-'):
             return False, "Invalid PDF file format"
             
@@ -1010,6 +1250,62 @@ def secure_file_handling(file):
         raise ValueError("Security violation: Path traversal detected.")
     return str(secure_path), unique_filename
 
+# -----------------------------------------------------------------------------
+# Single-copy uploads: multipart file parts are written straight into temp/ while the
+# request body is read; handlers claim that file and validate, parse and store it in place
+# -----------------------------------------------------------------------------
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        """Spool every uploaded file into temp/ (instead of memory or a second temporary file)"""
+        temp_dir = Path("temp").resolve()
+        temp_dir.mkdir(exist_ok=True)
+        stream = tempfile.NamedTemporaryFile(dir=temp_dir, prefix="upload-", suffix=".part", delete=False)
+        g.setdefault('upload_temp_paths', []).append(stream.name)
+        return stream
+
+app.request_class = UploadRequest
+
+@app.teardown_request
+def remove_unclaimed_uploads(exc=None):
+    """Delete spooled uploads no handler claimed (rejected requests, unused fields)"""
+    for path in g.pop('upload_temp_paths', []):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to delete unclaimed upload {path}: {e}")
+
+def claim_uploaded_file(file):
+    """
+    Path of an uploaded file in temp/, which the caller now owns and removes. The file the
+    request was spooled into is renamed, not copied; other streams are saved the old way.
+    """
+    spooled = g.get('upload_temp_paths', [])
+    stream_path = getattr(file.stream, 'name', None)
+    file_path, _ = secure_file_handling(file)
+    if stream_path in spooled:
+        file.stream.flush()
+        os.rename(stream_path, file_path)
+        spooled.remove(stream_path)
+    else:
+        file.save(file_path)
+    return file_path
+
+def claim_pdf_upload(file):
+    """Claim an uploaded PDF and validate it from disk: (file_path, None), or (None, error) with the file removed"""
+    if not file or not file.filename:
+        return None, "No file provided"
+    try:
+        file_path = claim_uploaded_file(file)
+    except ValueError as e:
+        return None, str(e)
+    valid, error_msg = PDFValidator.validate_path(file_path, file.filename)
+    if not valid:
+        os.remove(file_path)
+        return None, error_msg
+    return file_path, None
+
 # -----------------------------------------------------------------------------
 # Custom application error for consistent JSON error results
 # -----------------------------------------------------------------------------
@@ -1897,11 +2193,9 @@ def upload_pdf():
             raise AppError("Invalid format type. Must be 'jntuk' or 'autonomous'.", 400)
         if exam_type.lower() not in ('regular', 'supply'):
             raise AppError("Invalid exam type. Must be 'regular' or 'supply'.", 400)
-        valid, error_msg = PDFValidator.validate_file(file)
-        if not valid:
+        file_path, error_msg = claim_pdf_upload(file)
+        if error_msg:
             raise AppError(error_msg, 400)
-        file_path, _ = secure_file_handling(file)
-        file.save(file_path)
         # Parse all student results from the PDF using the selected parser:
         if format_type.lower() == 'autonomous':
             results = parse_autonomous_pdf(file_path)
@@ -1926,12 +2220,9 @@ def upload_pdf():
         students_saved = save_to_firebase(results, "Unknown", [exam_type], [exam_type], format_type, doc_id, upload_id=None, allow_duplicates=True)
         firebase_time = time.time() - firebase_start_time
         
-        # Upload PDF to Firebase Storage
-        storage_url = None
-        if file:
-            file.seek(0)  # Reset file pointer
-            storage_filename = f"pdfs/{format_type}_{exam_type}_{timestamp}_{file.filename}"
-            storage_url = upload_pdf_to_storage(file, storage_filename)
+        # Upload PDF to Firebase Storage, streamed from the same temp file
+        storage_filename = f"pdfs/{format_type}_{exam_type}_{timestamp}_{file.filename}"
+        storage_url = upload_pdf_to_storage(file_path, storage_filename)
         
         # Prepare data for JSON file with Firebase status
         json_data = {
@@ -2020,13 +2311,10 @@ def upload_supply_pdf():
         if format_type.lower() not in ('jntuk', 'autonomous'):
             raise AppError("Invalid format type. Must be 'jntuk' or 'autonomous'.", 400)
         
-        valid, error_msg = PDFValidator.validate_file(file)
-        if not valid:
+        file_path, error_msg = claim_pdf_upload(file)
+        if error_msg:
             raise AppError(error_msg, 400)
         
-        file_path, _ = secure_file_handling(file)
-        file.save(file_path)
-        
         # Process supply PDF with smart merge
         logger.info(f"Processing supply PDF with smart merge: {file.filename}")
         
@@ -2036,13 +2324,10 @@ def upload_supply_pdf():
             original_filename=file.filename
         )
         
-        # Upload PDF to Firebase Storage
-        storage_url = None
-        if file:
-            file.seek(0)  # Reset file pointer
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            storage_filename = f"pdfs/supply_{format_type}_{timestamp}_{file.filename}"
-            storage_url = upload_pdf_to_storage(file, storage_filename)
+        # Upload PDF to Firebase Storage, streamed from the same temp file
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        storage_filename = f"pdfs/supply_{format_type}_{timestamp}_{file.filename}"
+        storage_url = upload_pdf_to_storage(file_path, storage_filename)
         
         # Add storage info to result
         result['cloud_storage'] = {
@@ -2329,13 +2614,21 @@ def api_uploaded_results():
 def api_upload_result():
     """API endpoint for uploading results (frontend compatibility) - Async version"""
     try:
-        file = request.files.get('pdf') or request.files.get('file')
+        files = request.files.getlist('pdf') or request.files.getlist('file') or request.files.getlist('files')
+        file = files[0] if files else None
         format_type = request.form.get('format') or request.form.get('resultType', 'jntuk')
         exam_type = request.form.get('exam_type') or request.form.get('examType', 'regular')
         
         # Get user selections for year and semester
         user_year = request.form.get('year')
         user_semester = request.form.get('semester')
+        delta = parse_delta_flag(request.form.get('delta'))
+        
+        # Optional HTNO filters (comma-separated) so university-wide PDFs only ingest our rows
+        code_filter = {
+            'college_codes': parse_code_list(request.form.get('college_codes')),
+            'branch_codes': parse_code_list(request.form.get('branch_codes'))
+        }
         
         # DEBUG: Log received form data
         logger.info(f"DEBUG FORM DATA: user_year='{user_year}', user_semester='{user_semester}'")
@@ -2351,160 +2644,437 @@ def api_upload_result():
         if exam_type.lower() not in ('regular', 'supply'):
             return jsonify({"error": "Invalid exam type. Must be 'regular' or 'supply'"}), 400
             
-        valid, error_msg = PDFValidator.validate_file(file)
-        if not valid:
-            return jsonify({"error": error_msg}), 400
+        if len(files) > MAX_FILES_PER_UPLOAD:
+            return jsonify({"error": f"Too many files. Maximum is {MAX_FILES_PER_UPLOAD} PDFs per upload"}), 400
+            
+        # Each file was written to temp/ once while the request was read; validate it there
+        file_entries = []
+        for upload_file in files:
+            file_path, error_msg = claim_pdf_upload(upload_file)
+            if error_msg:
+                for claimed_path, _ in file_entries:
+                    os.remove(claimed_path)
+                return jsonify({"error": f"{upload_file.filename}: {error_msg}"}), 400
+            file_entries.append((file_path, upload_file.filename))
             
         # Generate upload ID immediately
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        upload_id = f"upload_{timestamp}"
-        
-        # Save file temporarily
-        file_path, _ = secure_file_handling(file)
-        file.save(file_path)
-        
-        # Initialize progress tracking
-        update_progress(upload_id, "started", parsing={"status": "started", "message": "Upload started, processing PDF..."})
+        upload_id = f"upload_{timestamp}_{secrets.token_hex(3)}"  # Suffix keeps same-second uploads apart
         
-        # Start background processing using threading
-        import threading
-        thread = threading.Thread(target=process_upload_background, args=(file_path, format_type, exam_type, file.filename, upload_id, user_year, user_semester))
-        thread.daemon = True
-        thread.start()
+        if len(files) > 1:
+            # Several branch-wise PDFs become one job with a shared writer stage
+            update_progress(upload_id, "started",
+                            parsing={"status": "started", "message": f"Upload started, processing {len(files)} PDFs..."},
+                            files={name: {"status": "queued"} for name in unique_file_keys([f.filename for f in files])})
+            
+            queue_info, rejection = enqueue_upload(
+                upload_id, 'multi_upload',
+                [file_entries, format_type, exam_type, upload_id, user_year, user_semester], code_filter,
+                [path for path, _ in file_entries], delta=delta)
+            if rejection:
+                return rejection
+            
+            return jsonify({
+                "success": True,
+                "message": f"Upload of {len(files)} files queued successfully",
+                "upload_id": upload_id,
+                "files": len(files),
+                "status": "queued",
+                "queue": queue_info
+            }), 200
         
-        # Return immediately with upload_id
-        return jsonify({
-            "success": True,
-            "message": "Upload started successfully",
-            "upload_id": upload_id,
-            "status": "processing"
-        }), 200
+        file_path = file_entries[0][0]
+        return start_single_upload(upload_id, file_path, file.filename, format_type, exam_type,
+                                   user_year, user_semester, code_filter, delta=delta)
         
     except Exception as ex:
         logger.error(f"Upload start error: {ex}\n{traceback.format_exc()}")
         return jsonify({"error": "Internal server error while starting upload"}), 500
 
+def start_single_upload(upload_id, file_path, original_filename, format_type, exam_type, user_year, user_semester, code_filter,
+                        delta=False):
+    """Queue a saved PDF for background processing and answer with its upload_id"""
+    # Initialize progress tracking
+    update_progress(upload_id, "started", parsing={"status": "started", "message": "Upload started, processing PDF..."})
+    
+    # Queue background processing on the bounded ingestion workers
+    queue_info, rejection = enqueue_upload(
+        upload_id, 'upload',
+        [file_path, format_type, exam_type, original_filename, upload_id, user_year, user_semester], code_filter,
+        [file_path], delta=delta)
+    if rejection:
+        return rejection
+    
+    # Return immediately with upload_id
+    return jsonify({
+        "success": True,
+        "message": "Upload queued successfully",
+        "upload_id": upload_id,
+        "status": "queued",
+        "queue": queue_info
+    }), 200
+
+# -----------------------------------------------------------------------------
+# Resumable chunked uploads: open a session, PUT checksummed chunks at the
+# server's offset (GET the session to resume), then complete to queue parsing
+# -----------------------------------------------------------------------------
+def chunked_upload_error_response(error):
+    body = {"error": error.message}
+    if error.offset is not None:
+        body["offset"] = error.offset
+    return jsonify(body), error.status_code
+
+@app.route('/api/chunked-upload', methods=['POST'])
+def open_chunked_upload():
+    """Open a resumable upload session: JSON {filename, size, sha256?}"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    
+    if not filename.lower().endswith('.pdf'):
+        return jsonify({"error": "Only PDF files are allowed"}), 400
+    if size > PDFValidator.MAX_SIZE:
+        return jsonify({"error": f"File too large. Maximum size is {PDFValidator.MAX_SIZE / 1024 / 1024}MB"}), 400
+    if size < PDFValidator.MIN_SIZE:
+        return jsonify({"error": "File too small or possibly corrupted"}), 400
+    
+    session_meta = chunked_upload.create_session(filename, size, data.get('sha256'))
+    return jsonify({key: session_meta[key] for key in ("session_id", "chunk_size", "offset", "size")}), 201
 
-def process_upload_background(file_path, format_type, exam_type, original_filename, upload_id, user_year=None, user_semester=None):
-    """Background processing function for file uploads"""
+@app.route('/api/chunked-upload/<session_id>', methods=['GET'])
+def chunked_upload_status(session_id):
+    """Offset to resume from"""
     try:
-        # Step 1: Parse PDF
-        update_progress(upload_id, "parsing", parsing={"status": "parsing", "message": "Extracting student data from PDF..."})
-        
-        if format_type.lower() == 'autonomous':
-            results = parse_autonomous_pdf(file_path)
-        else:
-            results = parse_jntuk_pdf(file_path)
-            
-        if not results:
-            update_progress(upload_id, "error", parsing={"status": "error", "message": "No valid student results found in PDF"})
-            return
-        
-        # Update parsing complete
-        update_progress(upload_id, "parsing_complete", parsing={
-            "status": "completed", 
-            "message": f"Extracted {len(results)} student records",
-            "total_students": len(results)
-        })
-        
-        # Step 2: Upload to Firebase
-        firebase_start_time = time.time()
-        
-        # Generate document ID
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        doc_id = f"{format_type}_{exam_type}_{timestamp}"
-        
-        # Use user-provided year and semester, or fall back to auto-detection
-        logger.info(f"DEBUG: user_year={user_year}, user_semester={user_semester}")
-        
-        # Process year information for format: 1-1, 1-2, 2-1, 2-2, 3-1, 3-2, 4-1, 4-2
-        year_to_use = user_year if user_year else "Unknown"
-        
-        # Convert year selection to academic year format
-        if user_year and str(user_year) in ['1', '2', '3', '4']:
-            year_to_use = str(user_year)  # Keep as string for consistency
-            logger.info(f"DEBUG: Using academic year: {year_to_use}")
-        else:
-            logger.warning(f"DEBUG: Invalid or missing year: {user_year}, using 'Unknown'")
-            year_to_use = "Unknown"
-            
-        # If year is still Unknown, infer from semester
-        if not year_to_use or str(year_to_use).lower() == 'unknown':
-            logger.warning(f"DEBUG: Year is Unknown, will infer from semester in save_to_firebase")
-        
-        semesters_to_use = [user_semester] if user_semester else [exam_type]
-        
-        # Extract semester number from user selection (e.g., "Semester 1" -> "1")
-        if user_semester and "Semester" in user_semester:
-            try:
-                sem_num = int(user_semester.split()[-1])
-                semesters_to_use = [f"Semester {sem_num}"]
-            except ValueError:
-                semesters_to_use = [user_semester]
-        
-        students_saved = save_to_firebase(results, year_to_use, semesters_to_use, [exam_type], format_type, doc_id, upload_id, allow_duplicates=True)
-        firebase_time = time.time() - firebase_start_time
-        
-        # Step 3: Upload PDF to Firebase Storage
-        update_progress(upload_id, "storage_uploading", storage={"status": "uploading", "message": "Uploading PDF to cloud storage..."})
+        session_meta = chunked_upload.load_session(session_id)
+    except chunked_upload.ChunkedUploadError as e:
+        return chunked_upload_error_response(e)
+    if session_meta is None:
+        return jsonify({"error": "Unknown upload session"}), 404
+    return jsonify({key: session_meta[key] for key in ("session_id", "chunk_size", "offset", "size", "chunks")})
+
+@app.route('/api/chunked-upload/<session_id>', methods=['PUT'])
+def upload_chunk(session_id):
+    """Append the raw request body at ?offset=N; X-Chunk-SHA256 is verified when sent"""
+    try:
+        offset = int(request.args.get('offset', -1))
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        return jsonify({"error": "Missing or invalid offset"}), 400
+    if (request.content_length or 0) > chunked_upload.MAX_CHUNK_SIZE:
+        return jsonify({"error": f"Chunk too large (max {chunked_upload.MAX_CHUNK_SIZE} bytes)"}), 413
+    
+    try:
+        new_offset = chunked_upload.append_chunk(session_id, offset, request.get_data(cache=False),
+                                                 request.headers.get('X-Chunk-SHA256'))
+    except chunked_upload.ChunkedUploadError as e:
+        return chunked_upload_error_response(e)
+    return jsonify({"offset": new_offset})
+
+@app.route('/api/chunked-upload/<session_id>/complete', methods=['POST'])
+def complete_chunked_upload(session_id):
+    """Assemble the received chunks in temp/ and queue the PDF like /api/upload-result"""
+    form = request.get_json(silent=True) or request.form
+    format_type = form.get('format') or form.get('resultType', 'jntuk')
+    exam_type = form.get('exam_type') or form.get('examType', 'regular')
+    if format_type.lower() not in ('jntuk', 'autonomous'):
+        return jsonify({"error": "Invalid format type. Must be 'jntuk' or 'autonomous'"}), 400
+    if exam_type.lower() not in ('regular', 'supply'):
+        return jsonify({"error": "Invalid exam type. Must be 'regular' or 'supply'"}), 400
+    code_filter = {
+        'college_codes': parse_code_list(form.get('college_codes')),
+        'branch_codes': parse_code_list(form.get('branch_codes'))
+    }
+    
+    try:
+        file_path, original_filename = chunked_upload.assemble(session_id)
+    except chunked_upload.ChunkedUploadError as e:
+        return chunked_upload_error_response(e)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    upload_id = f"upload_{timestamp}_{secrets.token_hex(3)}"
+    return start_single_upload(upload_id, file_path, original_filename, format_type, exam_type,
+                               form.get('year'), form.get('semester'), code_filter, delta=parse_delta_flag(form.get('delta')))
+
+
+MAX_FILES_PER_UPLOAD = 20
+FIRESTORE_BATCH_LIMIT = 500
+FIREBASE_COMMIT_WAIT_SECONDS = 300  # How long an upload waits for its journaled batches to commit
+
+def unique_file_keys(filenames):
+    """Progress keys for a multi-file upload (duplicate names get a numeric suffix)"""
+    keys = []
+    for name in filenames:
+        key = name
+        suffix = 2
+        while key in keys:
+            key = f"{name} ({suffix})"
+            suffix += 1
+        keys.append(key)
+    return keys
+
+def resolve_year_and_semesters(user_year, user_semester, exam_type):
+    """Map the upload form's year/semester selection to what save_to_firebase expects"""
+    logger.info(f"DEBUG: user_year={user_year}, user_semester={user_semester}")
+    
+    # Process year information for format: 1-1, 1-2, 2-1, 2-2, 3-1, 3-2, 4-1, 4-2
+    if user_year and str(user_year) in ['1', '2', '3', '4']:
+        year_to_use = str(user_year)  # Keep as string for consistency
+        logger.info(f"DEBUG: Using academic year: {year_to_use}")
+    else:
+        # save_to_firebase infers the year from the semester when it is Unknown
+        logger.warning(f"DEBUG: Invalid or missing year: {user_year}, using 'Unknown'")
+        year_to_use = "Unknown"
+    
+    semesters_to_use = [user_semester] if user_semester else [exam_type]
+    
+    # Extract semester number from user selection (e.g., "Semester 1" -> "1")
+    if user_semester and "Semester" in user_semester:
+        try:
+            sem_num = int(user_semester.split()[-1])
+            semesters_to_use = [f"Semester {sem_num}"]
+        except ValueError:
+            semesters_to_use = [user_semester]
+    
+    return year_to_use, semesters_to_use
+
+def build_results_json(format_type, exam_type, year, semester, original_filename, upload_id,
+                       total_students, students_saved, firebase_time, storage_url, json_filename):
+    """Summary sections of the JSON archive written to data/ for every processed upload (students via ResultsJsonWriter)"""
+    return {
+        "metadata": {
+            "format": format_type.lower(),
+            "exam_type": exam_type.lower(),
+            "year": year,
+            "semester": semester,
+            "processed_at": datetime.now().isoformat(),
+            "total_students": total_students,
+            "original_filename": original_filename,
+            "processing_status": "completed",
+            "upload_id": upload_id
+        },
+        "firebase_status": {
+            "firebase_available": FIREBASE_AVAILABLE,
+            "saved_count": students_saved,
+            "failed_count": total_students - students_saved if students_saved else total_students,
+            "errors": [],
+            "firebase_error": None,
+            "status": "success" if students_saved > 0 else ("failed" if FIREBASE_AVAILABLE else "disabled"),
+            "upload_time": firebase_time
+        },
+        "cloud_storage": {
+            "uploaded": storage_url is not None,
+            "url": storage_url or "",
+            "filename": json_filename,
+            "upload_completed_at": datetime.now().isoformat() if storage_url else ""
+        }
+    }
+
+class ResultsJsonWriter:
+    """
+    Writes a JSON archive while records arrive: the students array is streamed as batches
+    come in and the summary sections (metadata, firebase_status, ...) are appended on close.
+    The file only appears under its final name once complete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.partial"
+        self.count = 0
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        self.file.write('{\n  "students": [')
+
+    def add(self, records):
+        for record in records:
+            self.file.write(',\n    ' if self.count else '\n    ')
+            self.file.write(json.dumps(record, indent=2, ensure_ascii=False).replace('\n', '\n    '))
+            self.count += 1
+
+    def close(self, sections):
+        self.file.write('\n  ]' if self.count else ']')
+        for key, value in sections.items():
+            self.file.write(f',\n  {json.dumps(key)}: ' + json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  '))
+        self.file.write('\n}\n')
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def delete_stored_pdf(storage_filename):
+    """Remove a PDF uploaded by a job that ended without results"""
+    try:
+        bucket.blob(storage_filename).delete()
+        logger.info(f"Deleted stored PDF {storage_filename}")
+    except Exception as e:
+        logger.warning(f"Could not delete stored PDF {storage_filename}: {e}")
+
+def process_upload_background(file_path, format_type, exam_type, original_filename, upload_id, user_year=None, user_semester=None,
+                              college_codes=None, branch_codes=None, delta=False):
+    """
+    Background processing function for file uploads, as overlapping stages:
+    - storage: the PDF goes to Cloud Storage from a side thread as soon as the job starts
+    - parsing: a parser process streams finished students through a bounded queue
+    - firebase/json: this thread commits full Firestore batches and appends to the JSON
+      archive while parsing continues
+    Stage start offsets and durations are published in progress["stages"].
+    With delta, only students added or changed since the stored records are written.
+    """
+    cancel_check = cancellation_check(upload_id)
+    committed_refs = []  # Firestore documents to delete if the upload is cancelled
+    delta_state = delta_ingestion.new_delta() if delta else None
+    job_start = time.time()
+    stages = {}
+    
+    def stage_started(name):
+        stages[name] = {"status": "running", "started": round(time.time() - job_start, 2)}
+    
+    def stage_finished(name):
+        stages[name].update({"status": "completed", "seconds": round(time.time() - job_start - stages[name]["started"], 2)})
+    
+    # Generate document ID
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    doc_id = f"{format_type}_{exam_type}_{timestamp}"
+    storage_filename = f"pdfs/{format_type}_{exam_type}_{timestamp}_{original_filename}"
+    json_filename = f"parsed_results_{format_type}_{exam_type}_{timestamp}.json"
+    json_filepath = os.path.join("data", json_filename)
+    
+    # Use user-provided year and semester, or fall back to auto-detection
+    year_to_use, semesters_to_use = resolve_year_and_semesters(user_year, user_semester, exam_type)
+    
+    def storage_stage():
+        stage_started("storage")
         storage_url = None
         try:
-            with open(file_path, 'rb') as pdf_file:
-                storage_filename = f"pdfs/{format_type}_{exam_type}_{timestamp}_{original_filename}"
-                storage_url = upload_pdf_to_storage(pdf_file, storage_filename)
+            storage_url = upload_pdf_to_storage(file_path, storage_filename)
         except Exception as storage_error:
             logger.warning(f"PDF storage failed: {storage_error}")
-            
+        stage_finished("storage")
         if storage_url:
-            update_progress(upload_id, "storage_complete", storage={"status": "completed", "url": storage_url, "message": "PDF uploaded to cloud storage"})
+            update_progress(upload_id, "storage_complete", storage={"status": "completed", "url": storage_url, "message": "PDF uploaded to cloud storage"}, stages=stages)
         else:
-            update_progress(upload_id, "storage_complete", storage={"status": "skipped", "message": "PDF storage skipped"})
-        
-        # Step 4: Save to JSON
-        update_progress(upload_id, "json_saving", json={"status": "saving", "message": "Saving data to JSON file..."})
-        
-        # Prepare data for JSON file with Firebase status
-        json_filename = f"parsed_results_{format_type}_{exam_type}_{timestamp}.json"
-        json_filepath = os.path.join("data", json_filename)
-        
-        # Create data directory if it doesn't exist
-        os.makedirs("data", exist_ok=True)
-        
-        json_data = {
-            "metadata": {
-                "format": format_type.lower(),
-                "exam_type": exam_type.lower(),
-                "year": year_to_use,
-                "semester": user_semester,
-                "processed_at": datetime.now().isoformat(),
+            update_progress(upload_id, "storage_complete", storage={"status": "skipped", "message": "PDF storage skipped"}, stages=stages)
+        return storage_url
+    
+    results = RecordSpool(name=f"upload-{upload_id}")  # In memory up to the job's budget, then spilled to disk
+    pending = []  # Records waiting for a full Firestore batch
+    doc_ids = {}  # student_id -> Firestore document, so amended records overwrite their first write
+    journal_batches = []  # Write journal batches this upload waits on before reporting Firestore done
+    totals = {"saved": 0, "batches": 0}
+    os.makedirs("data", exist_ok=True)
+    json_writer = ResultsJsonWriter(json_filepath)
+    storage_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"storage-{upload_id}")
+    storage_future = None
+    
+    def commit_pending(flush=False):
+        while pending and (flush or len(pending) >= FIRESTORE_BATCH_LIMIT):
+            chunk = pending[:FIRESTORE_BATCH_LIMIT]
+            del pending[:FIRESTORE_BATCH_LIMIT]
+            totals["saved"] += save_to_firebase(chunk, year_to_use, semesters_to_use, [exam_type], format_type, doc_id, upload_id=None,
+                                                allow_duplicates=True, cancel_check=cancel_check, committed_refs=committed_refs, doc_ids=doc_ids,
+                                                journal_batches=journal_batches, delta=delta_state)
+            totals["batches"] += 1
+            update_progress(upload_id, "firebase_uploading", firebase={
+                "status": "uploading" if FIREBASE_AVAILABLE else "disabled",
+                "progress": min(99, totals["saved"] / max(len(results), 1) * 100),
+                "batches": totals["batches"],
+                "students_saved": totals["saved"],
                 "total_students": len(results),
-                "original_filename": original_filename,
-                "processing_status": "completed",
-                "upload_id": upload_id
-            },
-            "students": results,
-            "firebase_status": {
-                "firebase_available": FIREBASE_AVAILABLE,
-                "saved_count": students_saved,
-                "failed_count": len(results) - students_saved if students_saved else len(results),
-                "errors": [],
-                "firebase_error": None,
-                "status": "success" if students_saved > 0 else ("failed" if FIREBASE_AVAILABLE else "disabled"),
-                "upload_time": firebase_time
-            },
-            "cloud_storage": {
-                "uploaded": storage_url is not None,
-                "url": storage_url or "",
-                "filename": json_filename,
-                "upload_completed_at": datetime.now().isoformat() if storage_url else ""
-            }
-        }
+                "message": f"Batch {totals['batches']} uploaded: {totals['saved']} students saved"
+            }, stages=stages)
+    
+    try:
+        storage_future = storage_thread.submit(storage_stage)
+        
+        # Step 1: Parse PDF, writing each finished batch as it arrives
+        stage_started("parsing")
+        stage_started("firebase")
+        stage_started("json")
+        update_progress(upload_id, "parsing", parsing={"status": "parsing", "message": "Extracting student data from PDF..."},
+                        storage={"status": "uploading", "message": "Uploading PDF to cloud storage..."}, stages=stages)
+        if not FIREBASE_AVAILABLE or not db:
+            update_progress(upload_id, "parsing", firebase={"status": "disabled", "message": "Firebase not available"})
         
-        # Save to JSON file
-        with open(json_filepath, 'w', encoding='utf-8') as json_file:
-            json.dump(json_data, json_file, indent=2, ensure_ascii=False)
+        amended = []
+        for kind, records in stream_pdf_batches(file_path, format_type, college_codes, branch_codes, job_id=upload_id):
+            if kind == 'amended':
+                amended = records  # Students whose rows continued after they were written; rare
+                break
+            results.add(records)
+            json_writer.add(records)
+            pending.extend(records)
+            update_progress(upload_id, "parsing", parsing={
+                "status": "parsing",
+                "message": f"Extracted {len(results)} student records so far...",
+                "total_students": len(results)
+            })
+            commit_pending()
+        stage_finished("parsing")
+        
+        if not results:
+            json_writer.discard()
+            update_progress(upload_id, "error", parsing={"status": "error", "message": "No valid student results found in PDF"}, stages=stages)
+            if storage_future.result():
+                delete_stored_pdf(storage_filename)
+            return
         
-        update_progress(upload_id, "completed", json={"status": "completed", "file": json_filename, "message": "JSON file saved successfully"})
+        # Update parsing complete
+        update_progress(upload_id, "parsing_complete", parsing={
+            "status": "completed", 
+            "message": f"Extracted {len(results)} student records",
+            "total_students": len(results)
+        }, stages=stages)
+        
+        # Step 2: Remaining Firestore writes
+        commit_pending(flush=True)
+        overrides = {record['student_id']: record for record in amended}
+        if amended:
+            pending.extend(amended)
+            saved_before = totals["saved"]
+            commit_pending(flush=True)
+            totals["saved"] = saved_before  # Rewrites of documents already counted
+        committed = write_journal.wait(journal_batches, timeout=FIREBASE_COMMIT_WAIT_SECONDS)
+        firebase_time = time.time() - job_start - stages["firebase"]["started"]
+        stage_finished("firebase")
+        students_saved = totals["saved"]
+        delta_summary = delta_ingestion.summary(delta_state) if delta_state is not None else None
+        firebase_message = f"Firebase upload complete: {students_saved} students saved" if committed else \
+            f"{students_saved} students saved to the write journal; Firestore commits are still being retried"
+        if delta_summary:
+            firebase_message += (f" ({delta_summary['added']} added, {delta_summary['changed']} changed, "
+                                 f"{delta_summary['unchanged']} unchanged)")
+        update_progress(upload_id, "firebase_complete", firebase={
+            "status": ("completed" if committed else "queued") if FIREBASE_AVAILABLE else "disabled",
+            "progress": 100,
+            "batches": totals["batches"],
+            "students_saved": students_saved,
+            "total_students": len(results),
+            "delta": delta_summary,
+            "message": firebase_message
+        }, stages=stages)
+        cancel_check()
+        
+        # Step 3: Wait for the PDF storage upload that ran alongside
+        storage_url = storage_future.result()
+        cancel_check()
+        
+        # Step 4: Finish the JSON archive (records were written as they arrived)
+        update_progress(upload_id, "json_saving", json={"status": "saving", "message": "Saving data to JSON file..."}, stages=stages)
+        json_data = build_results_json(format_type, exam_type, year_to_use, user_semester, original_filename,
+                                       upload_id, len(results), students_saved, firebase_time, storage_url, json_filename)
+        if amended:
+            # Rewrite the archive from the spool with the amended records in place
+            json_writer.discard()
+            json_writer = ResultsJsonWriter(json_filepath)
+            for batch in results.iter_batches(FIRESTORE_BATCH_LIMIT, overrides):
+                json_writer.add(batch)
+        json_writer.close(json_data)
+        stage_finished("json")
         
         # Store final result in progress for frontend to retrieve
         final_result = {
@@ -2514,7 +3084,7 @@ def process_upload_background(file_path, format_type, exam_type, original_filena
             "json_file": json_filename,
             "file_id": json_filename.replace('.json', ''),
             "upload_id": upload_id,
-            "students": results,  # Include student data for metadata extraction
+            # Student records stay in json_file (loaded from there by get_upload_progress), not in the progress store
             "metadata": {
                 "format": format_type.lower(),
                 "exam_type": exam_type.lower(),
@@ -2527,38 +3097,289 @@ def process_upload_background(file_path, format_type, exam_type, original_filena
                 "students_saved": students_saved,
                 "students_total": len(results),
                 "upload_time": firebase_time,
-                "storage_url": storage_url
+                "storage_url": storage_url,
+                "delta": delta_summary
             },
             "data": {
                 "total_students": len(results),
                 "format": format_type.lower(),
                 "exam_type": exam_type.lower(),
                 "original_filename": original_filename
-            }
+            },
+            "stages": stages,
+            "records": results.stats(),
+            "total_seconds": round(time.time() - job_start, 2)
         }
         
-        # Store the final result in upload_progress for the frontend to access
-        upload_progress[upload_id]["final_result"] = final_result
+        # Mark completed together with the final result so readers never see one without the other
+        update_progress(upload_id, "completed", final_result=final_result, stages=stages,
+                        json={"status": "completed", "file": json_filename, "message": "JSON file saved successfully"})
         
         logger.info(f"Saved parsed data to {json_filepath}")
         logger.info(f"Firebase upload: {students_saved}/{len(results)} students saved")
+        logger.info(f"Upload {upload_id} stages: {stages}")
         
+    except IngestionLeaseLost:
+        # Another worker reclaimed the job and is running it again from the same temp file
+        logger.warning(f"Upload {upload_id} stopped: reclaimed by another worker")
+        json_writer.discard()
+        file_path = None
+        raise
+    except IngestionCancelled:
+        logger.info(f"Upload {upload_id} cancelled")
+        json_writer.discard()
+        if storage_future is not None and storage_future.result():
+            delete_stored_pdf(storage_filename)
+        finish_cancelled_upload(upload_id, committed_refs, journal_batches)
     except Exception as ex:
         logger.error(f"Background processing error: {ex}\n{traceback.format_exc()}")
+        json_writer.discard()
         update_progress(upload_id, "error", error={"status": "error", "message": f"Processing failed: {str(ex)}"})
     finally:
+        results.close()
+        # The storage stage reads the PDF, so let it finish before the temp file goes
+        storage_thread.shutdown(wait=True)
         # Clean up temp file
-        if os.path.exists(file_path):
+        if file_path and os.path.exists(file_path):
             try:
                 os.remove(file_path)
             except Exception as e:
                 logger.warning(f"Failed to delete temp file {file_path}: {e}")
 
+def process_multi_upload_background(file_entries, format_type, exam_type, upload_id, user_year=None, user_semester=None,
+                                    college_codes=None, branch_codes=None, delta=False):
+    """
+    Background processing for a multi-file upload.
+    PDFs are parsed in parallel across the parser process pool and stream their
+    finished students back while this thread acts as the single writer: records from
+    every file are coalesced into full Firestore batches instead of each file committing
+    its own partial batch, and spooled within the job's memory budget as they arrive.
+    With delta, only students added or changed since the stored records are written.
+    """
+    file_keys = unique_file_keys([name for _, name in file_entries])
+    file_paths = {key: path for key, (path, _) in zip(file_keys, file_entries)}
+    original_names = {key: name for key, (_, name) in zip(file_keys, file_entries)}
+    file_status = {key: {"status": "queued", "students": 0, "students_saved": 0} for key in file_keys}
+    file_results = {}  # file_key -> RecordSpool; the job's memory budget is split between its files
+    spool_budget = INGEST_MEMORY_BUDGET_MB * 1024 * 1024 / max(len(file_keys), 1)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    doc_id = f"{format_type}_{exam_type}_{timestamp}"
+    year_to_use, semesters_to_use = resolve_year_and_semesters(user_year, user_semester, exam_type)
+    
+    def files_snapshot():
+        # Copies, so progress readers never see a per-file dict mid-update
+        return {key: dict(status) for key, status in file_status.items()}
+    
+    pending = []  # (file_key, record) waiting for a full Firestore batch
+    doc_ids = {key: {} for key in file_keys}  # Per file, student_id -> Firestore document, for amended records
+    amended = {}  # file_key -> records that changed after they were written; rare
+    totals = {"parsed": 0, "saved": 0, "batches": 0}
+    cancel_check = cancellation_check(upload_id)
+    committed_refs = []  # Firestore documents to delete if the upload is cancelled
+    journal_batches = []
+    delta_state = delta_ingestion.new_delta() if delta else None
+    firebase_start_time = time.time()
+    
+    def commit_pending(flush=False):
+        while pending and (flush or len(pending) >= FIRESTORE_BATCH_LIMIT):
+            chunk = pending[:FIRESTORE_BATCH_LIMIT]
+            del pending[:FIRESTORE_BATCH_LIMIT]
+            written = []  # Positions in chunk of the students journaled (delta mode skips unchanged ones)
+            refs = []  # Their documents, in the same order
+            try:
+                saved = save_to_firebase([record for _, record in chunk], year_to_use, semesters_to_use, [exam_type],
+                                         format_type, doc_id, upload_id=None, allow_duplicates=True,
+                                         cancel_check=cancel_check, committed_refs=refs, journal_batches=journal_batches,
+                                         delta=delta_state, saved_indices=written)
+            finally:
+                committed_refs.extend(refs)
+            totals["batches"] += 1
+            totals["saved"] += saved
+            for index, ref in zip(written, refs):
+                key, record = chunk[index]
+                file_status[key]["students_saved"] += 1
+                doc_ids[key][record['student_id']] = ref.id
+            update_progress(upload_id, "firebase_uploading", firebase={
+                "status": "uploading" if FIREBASE_AVAILABLE else "disabled",
+                "batches": totals["batches"],
+                "students_saved": totals["saved"],
+                "total_students": totals["parsed"],
+                "message": f"Batch {totals['batches']} uploaded: {totals['saved']} students saved"
+            }, files=files_snapshot())
+    
+    try:
+        for key in file_keys:
+            file_status[key]["status"] = "parsing"
+        update_progress(upload_id, "parsing", parsing={"status": "parsing", "message": f"Extracting student data from {len(file_keys)} PDFs..."},
+                        files=files_snapshot())
+        
+        for key, kind, payload in stream_pdfs_parallel(file_paths.items(), format_type, college_codes, branch_codes, job_id=upload_id):
+            if kind == 'records':
+                if key not in file_results:
+                    file_results[key] = RecordSpool(spool_budget, name=f"upload-{upload_id}")
+                file_results[key].add(payload)
+                totals["parsed"] += len(payload)
+                file_status[key]["students"] = len(file_results[key])
+                pending.extend((key, record) for record in payload)
+                commit_pending()
+            elif kind == 'error' or key not in file_results:
+                # Students this file already streamed stay written; it gets no JSON archive
+                if key in file_results:
+                    file_results.pop(key).close()
+                file_status[key].update({"status": "error", "message": str(payload) if kind == 'error' else "No valid student results found in PDF"})
+            else:
+                file_status[key]["status"] = "parsed"
+                if payload:
+                    amended[key] = payload
+            update_progress(upload_id, "parsing", parsing={
+                "status": "parsing",
+                "message": f"Extracted {totals['parsed']} student records from {len(file_keys)} PDFs so far...",
+                "total_students": totals["parsed"]
+            }, files=files_snapshot())
+        
+        commit_pending(flush=True)
+        for key, records in amended.items():
+            if key in file_results:
+                # Rewrites of documents already counted, so neither the totals nor the file are credited again
+                save_to_firebase(records, year_to_use, semesters_to_use, [exam_type], format_type, doc_id, upload_id=None,
+                                 allow_duplicates=True, cancel_check=cancel_check, committed_refs=committed_refs,
+                                 doc_ids=doc_ids[key], journal_batches=journal_batches, delta=delta_state)
+        committed = write_journal.wait(journal_batches, timeout=FIREBASE_COMMIT_WAIT_SECONDS)
+        firebase_time = time.time() - firebase_start_time
+        cancel_check()
+        
+        if not file_results:
+            update_progress(upload_id, "error", parsing={"status": "error", "message": "No valid student results found in any PDF"},
+                            files=files_snapshot())
+            return
+        
+        update_progress(upload_id, "parsing_complete", parsing={
+            "status": "completed",
+            "message": f"Extracted {totals['parsed']} student records from {len(file_results)} PDFs",
+            "total_students": totals["parsed"]
+        }, firebase={
+            "status": ("completed" if committed else "queued") if FIREBASE_AVAILABLE else "disabled",
+            "progress": 100,
+            "batches": totals["batches"],
+            "students_saved": totals["saved"],
+            "total_students": totals["parsed"]
+        })
+        
+        # Per-file storage upload and JSON archive
+        update_progress(upload_id, "storage_uploading", storage={"status": "uploading", "message": "Uploading PDFs to cloud storage..."})
+        os.makedirs("data", exist_ok=True)
+        json_files = []
+        for index, key in enumerate(file_keys, 1):
+            if key not in file_results:
+                continue
+            storage_url = None
+            try:
+                storage_filename = f"pdfs/{format_type}_{exam_type}_{timestamp}_{original_names[key]}"
+                storage_url = upload_pdf_to_storage(file_paths[key], storage_filename)
+            except Exception as storage_error:
+                logger.warning(f"PDF storage failed for {key}: {storage_error}")
+            
+            json_filename = f"parsed_results_{format_type}_{exam_type}_{timestamp}_{index}.json"
+            json_data = build_results_json(format_type, exam_type, year_to_use, user_semester, original_names[key], upload_id,
+                                           len(file_results[key]), file_status[key]["students_saved"], firebase_time,
+                                           storage_url, json_filename)
+            json_writer = ResultsJsonWriter(os.path.join("data", json_filename))
+            overrides = {record['student_id']: record for record in amended.get(key, [])}
+            try:
+                for batch in file_results[key].iter_batches(FIRESTORE_BATCH_LIMIT, overrides):
+                    json_writer.add(batch)
+                json_writer.close(json_data)
+            except Exception:
+                json_writer.discard()
+                raise
+            file_results[key].close()
+            
+            json_files.append(json_filename)
+            file_status[key].update({"status": "completed", "json_file": json_filename, "storage_url": storage_url})
+            update_progress(upload_id, "json_saving", files=files_snapshot())
+        
+        update_progress(upload_id, "storage_complete", storage={"status": "completed", "message": "PDFs processed for cloud storage"})
+        update_progress(upload_id, "completed", json={"status": "completed", "files": json_files, "message": f"{len(json_files)} JSON files saved"},
+                        files=files_snapshot(), final_result={
+            "success": True,
+            "message": f"Successfully processed {totals['parsed']} result(s) from {len(file_results)} PDFs",
+            "processed_count": totals["parsed"],
+            "json_file": json_files[0],
+            "json_files": json_files,
+            "file_id": json_files[0].replace('.json', ''),
+            "upload_id": upload_id,
+            "files": files_snapshot(),
+            "metadata": {
+                "format": format_type.lower(),
+                "exam_type": exam_type.lower(),
+                "year": year_to_use,
+                "semester": user_semester,
+                "original_filenames": list(original_names.values())
+            },
+            "firebase": {
+                "enabled": FIREBASE_AVAILABLE,
+                "students_saved": totals["saved"],
+                "students_total": totals["parsed"],
+                "batches": totals["batches"],
+                "upload_time": firebase_time,
+                "delta": delta_ingestion.summary(delta_state) if delta_state is not None else None
+            },
+            "data": {
+                "total_students": totals["parsed"],
+                "format": format_type.lower(),
+                "exam_type": exam_type.lower(),
+                "files": len(file_results)
+            }
+        })
+        
+        logger.info(f"Multi-file upload {upload_id}: {totals['saved']}/{totals['parsed']} students saved from {len(file_results)} PDFs")
+        
+    except IngestionLeaseLost:
+        # Another worker reclaimed the job and is running it again from the same temp files
+        logger.warning(f"Multi-file upload {upload_id} stopped: reclaimed by another worker")
+        file_paths = {}
+        raise
+    except IngestionCancelled:
+        logger.info(f"Multi-file upload {upload_id} cancelled")
+        finish_cancelled_upload(upload_id, committed_refs, journal_batches, files_snapshot())
+    except Exception as ex:
+        logger.error(f"Background multi-file processing error: {ex}\n{traceback.format_exc()}")
+        update_progress(upload_id, "error", error={"status": "error", "message": f"Processing failed: {str(ex)}"}, files=files_snapshot())
+    finally:
+        for spool in file_results.values():
+            spool.close()
+        for file_path in file_paths.values():
+            if os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                except Exception as e:
+                    logger.warning(f"Failed to delete temp file {file_path}: {e}")
+
+
+def upload_job_handler(background_func):
+    """Wrap an upload background function as a job-store handler returning its final result"""
+    def run(payload):
+        upload_id = payload["upload_id"]
+        background_func(*payload["args"], **payload["kwargs"])
+        
+        progress = progress_store.get(upload_id) or {}
+        if progress.get("status") == "cancelled":
+            raise IngestionCancelled(f"Upload {upload_id} was cancelled")
+        if progress.get("status") == "error":
+            error = progress.get("error") or {}
+            raise RuntimeError(error.get("message") or progress.get("parsing", {}).get("message") or "Upload failed")
+        return progress.get("final_result")
+    return run
+
+register_job_handler('upload', upload_job_handler(process_upload_background))
+register_job_handler('multi_upload', upload_job_handler(process_multi_upload_background))
 
 # -----------------------------------------------------------------------------
 # Run server if script is run directly
 # -----------------------------------------------------------------------------
 if __name__ == "__main__":
+    start_job_runners()  # Under gunicorn this happens in post_worker_init (gunicorn.conf.py)
     app.run(host='0.0.0.0', port=5000, debug=True)
 
 
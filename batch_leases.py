@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Batch Leases
+Coordinates batch_pdf_processor runs on several nodes (VMs sharing a directory over NFS,
+or local processes) so each PDF is ingested by exactly one node at a time. A node claims
+a PDF by creating its lease file with O_EXCL, renews it with heartbeats (the file's
+mtime) while it works, and marks the PDF done when finished. A lease that has not been
+renewed for lease_seconds belongs to a dead node and is taken over by the next node.
+
+Coordination directory layout (PDFs are keyed by name and the batch manifest's SHA-256
+content hash, so nodes that mount the archive at different paths still agree, and the
+key matches what batch runs and the watch folder record):
+    <coord_dir>/leases/<key>.lease     current claim: {"node", "token", "claimed_at"}
+    <coord_dir>/done/<key>.json        outcome of a finished PDF
+    <coord_dir>/failed/<key>.json      failed attempts (retried up to MAX_NODE_ATTEMPTS)
+"""
+
+import os
+import json
+import time
+import socket
+import secrets
+import threading
+from datetime import datetime
+import batch_manifest
+
+LEASE_SECONDS = 120  # Heartbeats every third of this; a silent lease this old is expired
+MAX_NODE_ATTEMPTS = 3
+
+
+def pdf_key(conn, pdf_path):
+    """Lease key from the file name and its manifest content hash (conn: batch manifest)"""
+    stem = os.path.splitext(os.path.basename(pdf_path))[0].replace(' ', '_')
+    return f"{stem}_{batch_manifest.content_hash(conn, pdf_path)[:12]}"
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp-{socket.gethostname()}-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+class Lease:
+    """A claim on one PDF; renewed by a heartbeat thread until released"""
+
+    def __init__(self, coord_dir, key, node_id, lease_seconds=LEASE_SECONDS):
+        self.coord_dir = coord_dir
+        self.key = key
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.path = os.path.join(coord_dir, 'leases', f"{key}.lease")
+        self.token = secrets.token_hex(8)
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _take_over_expired(self):
+        """Remove an expired lease; True if the caller may try to claim again"""
+        current = _read_json(self.path)
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return True
+        if age < self.lease_seconds:
+            return False
+        # Rename first: only one node's rename of this file succeeds
+        tombstone = f"{self.path}.expired-{self.token}"
+        try:
+            os.rename(self.path, tombstone)
+        except FileNotFoundError:
+            return True
+        taken = _read_json(tombstone)
+        if current and taken and taken.get('token') != current.get('token'):
+            # A node re-claimed it between our check and the rename: put its lease back
+            try:
+                os.link(tombstone, self.path)
+            except FileExistsError:
+                pass
+            os.remove(tombstone)
+            return False
+        os.remove(tombstone)
+        print(f"⚠️ {self.node_id} taking over expired lease on {self.key} "
+              f"(held by {(current or {}).get('node', 'unknown')}, silent for {age:.0f}s)")
+        return True
+
+    def claim(self):
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._take_over_expired():
+                    return False
+                continue
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"node": self.node_id, "token": self.token, "claimed_at": datetime.now().isoformat()}, f)
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name=f"lease-{self.key}", daemon=True)
+            self._heartbeat.start()
+            return True
+        return False
+
+    def owned(self):
+        lease = _read_json(self.path)
+        return lease is not None and lease.get('token') == self.token
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            if not self.owned():
+                print(f"⚠️ {self.node_id} lost its lease on {self.key}")
+                self.lost.set()
+                return
+            os.utime(self.path)
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        if self.owned():
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def lease_status(coord_dir, keys):
+    """Count of done, failed (out of attempts), leased and pending PDFs among keys"""
+    status = {"total": len(keys), "done": 0, "failed": 0, "leased": 0, "pending": 0}
+    for key in keys:
+        if os.path.exists(os.path.join(coord_dir, 'done', f"{key}.json")):
+            status['done'] += 1
+        elif (_read_json(os.path.join(coord_dir, 'failed', f"{key}.json")) or {}).get('attempts', 0) >= MAX_NODE_ATTEMPTS:
+            status['failed'] += 1
+        elif os.path.exists(os.path.join(coord_dir, 'leases', f"{key}.lease")):
+            status['leased'] += 1
+        else:
+            status['pending'] += 1
+    return status
+
+
+def run_node(pdf_paths, coord_dir, process_pdf, node_id=None, lease_seconds=LEASE_SECONDS, manifest_path=None):
+    """
+    Take the next unclaimed PDF until every one is done (or out of attempts), running
+    process_pdf(pdf_path) -> result dict for each claimed file. Waits on PDFs leased by
+    other nodes so it can take them over if their node dies. Returns this node's results.
+    Content hashes come from this node's batch manifest (manifest_path).
+    """
+    node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+    for sub_dir in ('leases', 'done', 'failed'):
+        os.makedirs(os.path.join(coord_dir, sub_dir), exist_ok=True)
+
+    manifest = batch_manifest.get_connection(manifest_path)
+    try:
+        keys = {pdf_path: pdf_key(manifest, pdf_path) for pdf_path in sorted(pdf_paths)}
+    finally:
+        manifest.close()
+    results = {}
+    print(f"🛰️ Node {node_id}: {len(keys)} PDFs, coordination in {coord_dir}")
+    while True:
+        claimed = False
+        for pdf_path, key in keys.items():
+            done_path = os.path.join(coord_dir, 'done', f"{key}.json")
+            failed_path = os.path.join(coord_dir, 'failed', f"{key}.json")
+            failures = _read_json(failed_path) or {}
+            if os.path.exists(done_path) or failures.get('attempts', 0) >= MAX_NODE_ATTEMPTS:
+                continue
+
+            lease = Lease(coord_dir, key, node_id, lease_seconds)
+            if not lease.claim():
+                continue
+            claimed = True
+            try:
+                if os.path.exists(done_path):
+                    continue  # Finished by its previous owner just before our claim
+                print(f"📄 Node {node_id} processing {os.path.basename(pdf_path)}")
+                try:
+                    result = process_pdf(pdf_path)
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+                results[pdf_path] = result
+                if lease.lost.is_set():
+                    print(f"⚠️ {os.path.basename(pdf_path)} finished after the lease was lost; writes are idempotent")
+                outcome = {"node": node_id, "pdf": os.path.basename(pdf_path), "finished_at": datetime.now().isoformat(),
+                           "result": {k: v for k, v in (result or {}).items() if k != 'batch_sizing'}}
+                if result and result.get('success'):
+                    _write_json_atomic(done_path, outcome)
+                else:
+                    failures = _read_json(failed_path) or {}
+                    outcome["attempts"] = failures.get('attempts', 0) + 1
+                    _write_json_atomic(failed_path, outcome)
+            finally:
+                lease.release()
+
+        status = lease_status(coord_dir, list(keys.values()))
+        if status['done'] + status['failed'] == status['total']:
+            print(f"🏁 Node {node_id} finished: {len(results)} PDFs processed here, {status}")
+            return results
+        if not claimed:
+            time.sleep(lease_seconds / 3)  # Everything left is leased elsewhere; watch for expiry
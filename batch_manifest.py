@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Batch Manifest
+Remembers what batch_pdf_processor already ingested, keyed by (content hash, parser
+version, target collection), so later runs skip PDFs that have not changed and only
+reprocess files whose content or parser code changed. Content hashes are cached by
+(path, size, mtime), so an unchanged file costs a stat and two index lookups.
+
+Tables (SQLite at BATCH_MANIFEST_PATH):
+    outcomes(sha256, parser_version, collection, pdf_name, status, json_path, total_students, processed_at, result)
+    file_hashes(path, size, mtime_ns, sha256)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_MANIFEST_PATH = os.environ.get('BATCH_MANIFEST_PATH', os.path.join(BASE_DIR, 'data', 'batch_manifest.db'))
+PARSER_FILES = [os.path.join(BASE_DIR, 'parser', 'parser_jntuk.py'), os.path.join(BASE_DIR, 'parser', 'parser_autonomous.py')]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outcomes (
+    sha256 TEXT NOT NULL,
+    parser_version TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    pdf_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    json_path TEXT,
+    total_students INTEGER,
+    processed_at REAL NOT NULL,
+    result TEXT,
+    PRIMARY KEY (sha256, parser_version, collection)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+_parser_version = None
+
+
+def parser_version():
+    """Short digest of the parser sources: any parser change makes every PDF eligible again"""
+    global _parser_version
+    if _parser_version is None:
+        digest = hashlib.sha1()
+        for path in PARSER_FILES:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _parser_version = digest.hexdigest()[:12]
+    return _parser_version
+
+
+def get_connection(manifest_path=None):
+    manifest_path = manifest_path or BATCH_MANIFEST_PATH
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    # Not thread-bound: the watch folder opens its manifest before starting its loop thread
+    conn = sqlite3.connect(manifest_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def content_hash(conn, pdf_path):
+    """SHA-256 of the file, recomputed only when its size or mtime changed"""
+    path = os.path.abspath(pdf_path)
+    stat = os.stat(path)
+    row = conn.execute("SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?", (path,)).fetchone()
+    if row and row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+        return row['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    conn.execute(
+        "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+        (path, stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+    )
+    return digest.hexdigest()
+
+
+def manifest_key(conn, pdf_path, collection):
+    return (content_hash(conn, pdf_path), parser_version(), collection)
+
+
+def lookup(conn, key):
+    """Recorded outcome for a key, or None"""
+    row = conn.execute(
+        "SELECT * FROM outcomes WHERE sha256 = ? AND parser_version = ? AND collection = ?", key
+    ).fetchone()
+    if row is None:
+        return None
+    outcome = dict(row)
+    outcome['result'] = json.loads(outcome['result']) if outcome['result'] else None
+    return outcome
+
+
+def record(conn, key, pdf_path, result):
+    """Store a run's outcome; returns the JSON output it supersedes (same key), if any"""
+    previous = lookup(conn, key)
+    status = 'completed' if result.get('success') else 'failed'
+    conn.execute(
+        "INSERT OR REPLACE INTO outcomes (sha256, parser_version, collection, pdf_name, status, json_path, "
+        "total_students, processed_at, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        key + (os.path.basename(pdf_path), status, result.get('json_path'), result.get('total_students', 0),
+               time.time(), json.dumps({k: v for k, v in result.items() if k != 'batch_sizing'}, default=str))
+    )
+    if status == 'completed' and previous and previous['json_path'] and previous['json_path'] != result.get('json_path'):
+        return previous['json_path']
+    return None
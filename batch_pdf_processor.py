@@ -9,14 +9,25 @@ import glob
 import json
 import time
 from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from parser.parser_jntuk import parse_jntuk_pdf_generator
 from parser.parser_autonomous import parse_autonomous_pdf_generator
+from adaptive_batching import AdaptiveBatchController, adaptive_batches, MIN_BATCH_SIZE, MAX_QUEUED_RECORDS
+from watch_folder import WatchFolder, DEFAULT_WATCH_WORKERS
+from write_limiter import TokenBucket, FIRESTORE_WRITES_PER_SECOND
+from batch_leases import run_node
+import batch_manifest
+from pdf_shards import (split_pdf, shard_worker, run_local_workers, reduce_shards, load_manifest,
+                        shard_status, list_jobs, DEFAULT_PAGES_PER_SHARD)
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
 
 # Configuration Constants
-DEFAULT_BATCH_SIZE = 500  # Optimized for fast Firebase uploads
+DEFAULT_BATCH_SIZE = 500  # Optimized for fast Firebase uploads (starting size when batches adapt)
 MAX_BATCH_SIZE = 500  # Firestore batch limit
+PARSER_CHUNK_SIZE = 50  # Records per parser chunk handed to the writer queue
+STUDENT_COLLECTION = 'student_results'  # Firestore collection batch runs write to
 
 def create_json_file_header(original_filename, format_type, exam_types, year, semesters):
     """Create initial JSON file with metadata and return file path"""
@@ -52,8 +63,18 @@ def create_json_file_header(original_filename, format_type, exam_types, year, se
         "students": []
     }
     
+    # Parallel runs can start two PDFs of the same type within one second: never share a file
     json_file_path = os.path.join(data_dir, json_filename)
-    with open(json_file_path, 'w', encoding='utf-8') as f:
+    suffix = 1
+    while True:
+        try:
+            f = open(json_file_path, 'x', encoding='utf-8')
+            break
+        except FileExistsError:
+            suffix += 1
+            json_filename = f"parsed_results_{format_type}_{exam_type_str}_{timestamp}_{suffix}.json"
+            json_file_path = os.path.join(data_dir, json_filename)
+    with f:
         json.dump(json_data, f, indent=2, ensure_ascii=False)
     
     print(f"📁 Created JSON file: {json_filename}")
@@ -101,7 +122,7 @@ def find_existing_student_record(db, student_id, year, semester):
         ]
         
         for doc_id in query_patterns:
-            doc_ref = db.collection('student_results').document(doc_id)
+            doc_ref = db.collection(STUDENT_COLLECTION).document(doc_id)
             doc = doc_ref.get()
             if doc.exists:
                 existing_data = doc.to_dict()
@@ -583,7 +604,7 @@ def smart_batch_upload_to_firebase(batch_records, year, semesters, exam_types, f
                     })
                     
                     # Create new document
-                    doc_ref = db.collection('student_results').document(student_doc_id)
+                    doc_ref = db.collection(STUDENT_COLLECTION).document(student_doc_id)
                     doc_ref.set(firebase_student_data)
                     students_saved += 1
                     
@@ -1032,10 +1053,19 @@ def fallback_filename_detection(filename):
         'format': format_type
     }
 
-def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
-    """Process a single PDF with configurable batch processing and Firebase fallback"""
+def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE, metadata=None, record_batches=None, adaptive=True,
+                       write_limiter=None):
+    """
+    Process a single PDF with configurable batch processing and Firebase fallback.
+    metadata / record_batches let the shard reducer feed already-parsed records through
+    the same JSON + Firebase upload path.
+    The parser runs ahead of the writer through a bounded queue; with adaptive=True the
+    write batch size starts at batch_size and is tuned from commit latency and parse rate
+    (adaptive=False keeps it fixed). write_limiter (a TokenBucket shared by parallel runs)
+    is charged one token per record before each Firebase batch.
+    """
     print(f"\n🚀 Processing: {os.path.basename(pdf_path)}")
-    print(f"⚙️ Using batch size: {batch_size}")
+    print(f"⚙️ Using batch size: {batch_size}{' (adaptive)' if adaptive else ''}")
     
     # Check Firebase availability
     firebase_available = db is not None and bucket is not None
@@ -1047,7 +1077,8 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
     start_time = time.time()
     
     # Detect metadata
-    metadata = detect_pdf_metadata(pdf_path)
+    if metadata is None:
+        metadata = detect_pdf_metadata(pdf_path)
     print(f"📊 Detected: {metadata}")
     
     # Initialize JSON file and get timestamp
@@ -1067,19 +1098,28 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
     total_updated = 0
     total_skipped = 0
     batch_count = 0
+    rate_limited_seconds = 0.0
+    if adaptive:
+        controller = AdaptiveBatchController(batch_size, min_size=min(MIN_BATCH_SIZE, batch_size), max_size=MAX_BATCH_SIZE)
+    else:
+        controller = AdaptiveBatchController(batch_size, min_size=batch_size, max_size=batch_size)
     
     try:
-        print(f"🔍 Starting batch processing with {batch_size} records per batch...")
+        print(f"🔍 Starting batch processing with {controller.size} records per batch...")
         
         # Choose the appropriate parser based on format
-        if metadata['format'] == 'autonomous':
+        if record_batches is not None:
+            print(f"🧵 Using records stitched from PDF shards")
+            parser_generator = record_batches
+        elif metadata['format'] == 'autonomous':
             print(f"🏛️ Using Autonomous parser for {metadata['format']} format")
-            parser_generator = parse_autonomous_pdf_generator(pdf_path, batch_size=batch_size)
+            parser_generator = parse_autonomous_pdf_generator(pdf_path, batch_size=PARSER_CHUNK_SIZE)
         else:
             print(f"🎓 Using JNTUK parser for {metadata['format']} format")
-            parser_generator = parse_jntuk_pdf_generator(pdf_path, batch_size=batch_size)
+            parser_generator = parse_jntuk_pdf_generator(pdf_path, batch_size=PARSER_CHUNK_SIZE)
         
-        for batch_records in parser_generator:
+        # The parser keeps going while a batch is written, up to MAX_QUEUED_RECORDS ahead
+        for batch_records in adaptive_batches(parser_generator, controller, MAX_QUEUED_RECORDS):
             batch_count += 1
             current_batch_size = len(batch_records)
             total_students += current_batch_size
@@ -1087,6 +1127,9 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
             print(f"📦 Processing batch {batch_count}: {current_batch_size} students")
             
             # Upload to Firebase if available
+            if firebase_available and write_limiter is not None:
+                rate_limited_seconds += write_limiter.acquire(current_batch_size)
+            commit_started = time.time()
             if firebase_available:
                 saved, updated, skipped, errors = smart_batch_upload_to_firebase(
                     batch_records, 
@@ -1106,6 +1149,7 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
                 # Local-only mode
                 saved, updated, skipped, errors = 0, 0, 0, []
                 print("📝 Saving to JSON only (Firebase disabled)")
+            next_size = controller.record_commit(current_batch_size, time.time() - commit_started)
             
             # Always append to JSON with the results
             append_batch_to_json(json_path, batch_records, batch_count, saved, updated, skipped)
@@ -1121,6 +1165,8 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
                 print(f"✅ Batch {batch_count} complete: {saved} new, {updated} updated, {skipped} skipped")
             else:
                 print(f"✅ Batch {batch_count} complete: {current_batch_size} saved to JSON")
+            if next_size != current_batch_size and adaptive:
+                print(f"🎛️ Next batch size: {next_size} ({controller.decisions[-1]['reason']})")
         
         # Finalize JSON file
         try:
@@ -1158,6 +1204,11 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
         print(f"⚡ Records per second: {total_students/processing_time:.1f}")
         print(f"⏱️ Processing time: {processing_time:.2f} seconds")
         print(f"📁 JSON saved: {json_path}")
+        batch_sizing = controller.summary()
+        print(f"🎛️ Batch sizes: {batch_sizing['initial_size']} → {batch_sizing['final_size']} "
+              f"(used {batch_sizing['min_used']}-{batch_sizing['max_used']}), "
+              f"avg commit {batch_sizing['average_commit_seconds']}s, "
+              f"parser blocked {batch_sizing['parser_blocked_seconds']}s, writer idle {batch_sizing['writer_idle_seconds']}s")
         
         return {
             'success': True,
@@ -1169,6 +1220,8 @@ def process_single_pdf(pdf_path, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
             'json_path': json_path,
             'batch_size_used': batch_size,
             'batches_processed': batch_count,
+            'batch_sizing': batch_sizing,
+            'rate_limited_seconds': round(rate_limited_seconds, 2),
             'firebase_enabled': firebase_available
         }
         
@@ -1455,21 +1508,74 @@ def test_supply_processing():
 if __name__ == "__main__":
     test_supply_processing()
 
-def main(batch_size=DEFAULT_BATCH_SIZE):
-    """Main batch processing function with configurable batch size"""
-    print("🚀 Starting Optimized Batch PDF Processing")
-    print(f"⚙️ Configuration: Batch size = {batch_size}")
-    print("=" * 60)
-    
-    # Validate batch size
-    if batch_size > MAX_BATCH_SIZE:
-        print(f"⚠️ Warning: Batch size {batch_size} exceeds Firebase limit {MAX_BATCH_SIZE}")
-        batch_size = MAX_BATCH_SIZE
-        print(f"⚙️ Adjusted batch size to: {batch_size}")
-    
-    # Setup Firebase
-    db, bucket = setup_firebase()
-    
+def shard_pdf(pdf_path, work_dir, pages_per_shard=DEFAULT_PAGES_PER_SHARD):
+    """Split a PDF into page-range shards in a shared work directory for distributed parsing"""
+    metadata = detect_pdf_metadata(pdf_path)
+    print(f"📊 Detected: {metadata}")
+    return split_pdf(pdf_path, work_dir, metadata, pages_per_shard)
+
+def reduce_sharded_pdf(job_dir, db, bucket, batch_size=DEFAULT_BATCH_SIZE):
+    """Stitch a sharded job's partial outputs and upload them like a normal PDF run"""
+    manifest = load_manifest(job_dir)
+    records = reduce_shards(job_dir)
+    record_batches = (records[i:i + batch_size] for i in range(0, len(records), batch_size))
+    return process_single_pdf(manifest['source_name'], db, bucket, batch_size,
+                              metadata=manifest['metadata'], record_batches=record_batches)
+
+def process_sharded_pdf(pdf_path, work_dir, workers, db, bucket, batch_size=DEFAULT_BATCH_SIZE,
+                        pages_per_shard=DEFAULT_PAGES_PER_SHARD):
+    """Split, parse with local shard workers and reduce - the single-host version of a distributed run"""
+    job_dir = shard_pdf(pdf_path, work_dir, pages_per_shard)
+    run_local_workers(work_dir, workers)
+    print(f"📊 Shard status: {shard_status(job_dir)}")
+    return reduce_sharded_pdf(job_dir, db, bucket, batch_size)
+
+_worker_firebase = None  # (db, bucket) of this worker process
+_worker_write_limiter = None  # TokenBucket shared with the other workers of the run
+
+def init_pdf_worker(write_limiter=None):
+    """Process pool initializer: keep the run's shared write limiter"""
+    global _worker_write_limiter
+    _worker_write_limiter = write_limiter
+
+def process_pdf_in_worker(pdf_path, batch_size=DEFAULT_BATCH_SIZE):
+    """Pool worker (--jobs and --watch): process one PDF with this process's own Firebase clients"""
+    global _worker_firebase
+    if _worker_firebase is None:
+        _worker_firebase = setup_firebase()
+    db, bucket = _worker_firebase
+    return process_single_pdf(pdf_path, db, bucket, batch_size, write_limiter=_worker_write_limiter)
+
+def watch_drop_folder(drop_dir, workers=DEFAULT_WATCH_WORKERS):
+    """Run the watch-folder daemon on drop_dir until interrupted"""
+    print(f"🚀 Starting watch-folder ingestion on {drop_dir} with {workers} worker(s)")
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_pdf_worker, initargs=(TokenBucket(),))
+    WatchFolder(drop_dir, process_pdf_in_worker, workers=workers, executor=executor, collection=STUDENT_COLLECTION).run()
+
+def process_pdfs_in_parallel(pdf_paths, batch_size, jobs, writes_per_second=FIRESTORE_WRITES_PER_SECOND):
+    """
+    Process independent PDFs in a pool of `jobs` processes (each with its own Firestore
+    client and JSON output). One token bucket caps their combined write rate.
+    Returns results in pdf_paths order.
+    """
+    write_limiter = TokenBucket(writes_per_second, capacity=max(writes_per_second, MAX_BATCH_SIZE))
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_pdf_worker, initargs=(write_limiter,)) as pool:
+        futures = {pool.submit(process_pdf_in_worker, pdf_path, batch_size): pdf_path for pdf_path in pdf_paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            pdf_path = futures[future]
+            try:
+                results[pdf_path] = future.result()
+            except Exception as e:
+                results[pdf_path] = {'success': False, 'error': str(e), 'total_students': 0, 'processing_time': 0}
+            status = "✅" if results[pdf_path].get('success') else "❌"
+            print(f"{status} [{done}/{len(pdf_paths)}] {os.path.basename(pdf_path)} finished")
+    print(f"🪣 Write limiter: {writes_per_second:.0f} writes/s shared by {jobs} processes, "
+          f"{write_limiter.total_waited():.2f}s spent waiting for tokens")
+    return [results[pdf_path] for pdf_path in pdf_paths]
+
+def find_supported_pdfs(directory='.'):
+    """PDFs in directory whose names look like JNTUK or Autonomous result files"""
     # Find all PDF files and deduplicate
     pdf_files = []
     pdf_patterns = [
@@ -1477,7 +1583,7 @@ def main(batch_size=DEFAULT_BATCH_SIZE):
     ]
     
     for pattern in pdf_patterns:
-        pdf_files.extend(glob.glob(pattern, recursive=False))
+        pdf_files.extend(glob.glob(os.path.join(directory, pattern), recursive=False))
     
     # Remove duplicates by converting to set and back
     pdf_files = list(set(pdf_files))
@@ -1494,6 +1600,55 @@ def main(batch_size=DEFAULT_BATCH_SIZE):
         if (any(keyword in filename for keyword in jntuk_keywords) or 
             any(keyword in filename for keyword in autonomous_keywords)):
             supported_pdfs.append(pdf)
+    return supported_pdfs
+
+def run_batch_node(coord_dir, pdf_dir='.', batch_size=DEFAULT_BATCH_SIZE, node_id=None):
+    """
+    One node of a multi-node backfill: every node runs this against the same pdf_dir and
+    coord_dir (shared storage) and takes the next PDF no other node holds a lease on.
+    PDFs this host's manifest already has as ingested are skipped, and outcomes are
+    recorded there like a main() run.
+    """
+    supported_pdfs = find_supported_pdfs(pdf_dir)
+    manifest = batch_manifest.get_connection()
+    manifest_keys = {pdf: batch_manifest.manifest_key(manifest, pdf, STUDENT_COLLECTION) for pdf in supported_pdfs}
+    unchanged = [pdf for pdf in supported_pdfs
+                 if (batch_manifest.lookup(manifest, manifest_keys[pdf]) or {}).get('status') == 'completed']
+    supported_pdfs = [pdf for pdf in supported_pdfs if pdf not in unchanged]
+    print(f"🚀 Batch node over {len(supported_pdfs)} PDFs in {pdf_dir} ({len(unchanged)} already ingested)")
+    start_time = time.time()
+    results = run_node(supported_pdfs, coord_dir, partial(process_pdf_in_worker, batch_size=batch_size), node_id)
+    for pdf_path, result in results.items():
+        batch_manifest.record(manifest, manifest_keys[pdf_path], pdf_path, result)
+    manifest.close()
+    total_students = sum(r.get('total_students', 0) for r in results.values())
+    print(f"📊 This node: {len(results)} PDFs, {total_students} students in {time.time() - start_time:.2f}s")
+    for pdf_path, result in results.items():
+        status = "✅" if result.get('success') else "❌"
+        print(f"{status} {os.path.basename(pdf_path)}: {result.get('total_students', 0)} students")
+    return results
+
+def main(batch_size=DEFAULT_BATCH_SIZE, jobs=1, force=False):
+    """
+    Main batch processing function with configurable batch size (jobs > 1: PDFs in parallel processes).
+    PDFs already ingested with the same content, parser version and collection are skipped
+    unless force is set.
+    """
+    print("🚀 Starting Optimized Batch PDF Processing")
+    print(f"⚙️ Configuration: Batch size = {batch_size}, jobs = {jobs}")
+    print("=" * 60)
+    
+    # Validate batch size
+    if batch_size > MAX_BATCH_SIZE:
+        print(f"⚠️ Warning: Batch size {batch_size} exceeds Firebase limit {MAX_BATCH_SIZE}")
+        batch_size = MAX_BATCH_SIZE
+        print(f"⚙️ Adjusted batch size to: {batch_size}")
+    
+    # Setup Firebase (parallel workers set up their own clients)
+    if jobs <= 1:
+        db, bucket = setup_firebase()
+    
+    supported_pdfs = find_supported_pdfs()
     
     print(f"📁 Found {len(supported_pdfs)} supported PDF files (JNTUK + Autonomous):")
     for pdf in supported_pdfs:
@@ -1504,20 +1659,49 @@ def main(batch_size=DEFAULT_BATCH_SIZE):
         print("💡 Make sure your PDFs contain keywords like: btech, semester, result, autonomous, college, etc.")
         return
     
+    # Skip PDFs the manifest says were already ingested unchanged
+    manifest = batch_manifest.get_connection()
+    manifest_keys = {pdf: batch_manifest.manifest_key(manifest, pdf, STUDENT_COLLECTION) for pdf in supported_pdfs}
+    unchanged = []
+    if not force:
+        for pdf in supported_pdfs:
+            outcome = batch_manifest.lookup(manifest, manifest_keys[pdf])
+            if outcome and outcome['status'] == 'completed':
+                unchanged.append(pdf)
+                print(f"⏭️ Unchanged since {datetime.fromtimestamp(outcome['processed_at']).isoformat(timespec='seconds')}: "
+                      f"{os.path.basename(pdf)} ({outcome['total_students']} students)")
+        supported_pdfs = [pdf for pdf in supported_pdfs if pdf not in unchanged]
+        if not supported_pdfs:
+            print(f"✅ All {len(unchanged)} PDFs already ingested with parser {batch_manifest.parser_version()} "
+                  f"(use --force to reprocess)")
+            return
+    
     # Process each PDF
     results = []
     total_start_time = time.time()
     
-    for i, pdf_path in enumerate(supported_pdfs, 1):
-        print(f"\n{'='*60}")
-        print(f"📄 Processing PDF {i}/{len(supported_pdfs)}")
-        print(f"{'='*60}")
-        
-        result = process_single_pdf(pdf_path, db, bucket, batch_size)
+    if jobs > 1:
+        print(f"\n⚡ Processing {len(supported_pdfs)} PDFs with {jobs} parallel jobs")
+        pdf_results = process_pdfs_in_parallel(supported_pdfs, batch_size, jobs)
+    else:
+        pdf_results = []
+        for i, pdf_path in enumerate(supported_pdfs, 1):
+            print(f"\n{'='*60}")
+            print(f"📄 Processing PDF {i}/{len(supported_pdfs)}")
+            print(f"{'='*60}")
+            
+            pdf_results.append(process_single_pdf(pdf_path, db, bucket, batch_size))
+    
+    for pdf_path, result in zip(supported_pdfs, pdf_results):
         results.append({
             'pdf': os.path.basename(pdf_path),
             'result': result
         })
+        superseded = batch_manifest.record(manifest, manifest_keys[pdf_path], pdf_path, result)
+        if superseded and os.path.exists(superseded):
+            os.remove(superseded)  # Same input and parser: the new JSON replaces it
+            print(f"🧹 Removed superseded output {os.path.basename(superseded)}")
+    manifest.close()
     
     # Summary
     total_time = time.time() - total_start_time
@@ -1533,10 +1717,11 @@ def main(batch_size=DEFAULT_BATCH_SIZE):
     successful_pdfs = sum(1 for r in results if r['result'].get('success', False))
     
     print(f"📊 PDFs processed: {len(supported_pdfs)}")
+    print(f"⏭️ Skipped (unchanged): {len(unchanged)}")
     print(f"✅ Successful: {successful_pdfs}")
     print(f"❌ Failed: {len(supported_pdfs) - successful_pdfs}")
     print(f"📦 Total batches: {total_batches}")
-    print(f"⚙️ Batch size used: {batch_size}")
+    print(f"⚙️ Starting batch size: {batch_size} (adapted per PDF)")
     print(f"👥 Total students extracted: {total_students}")
     print(f"➕ New records created: {total_saved}")
     print(f"🔄 Records updated (smart merge): {total_updated}")
@@ -1544,6 +1729,11 @@ def main(batch_size=DEFAULT_BATCH_SIZE):
     print(f"⚡ Overall processing rate: {total_students/total_time:.1f} records/second")
     print(f"⏱️ Total processing time: {total_time:.2f} seconds")
     print(f"⚡ Average per PDF: {total_time/len(supported_pdfs):.2f} seconds")
+    if jobs > 1:
+        busy_time = sum(r['result'].get('processing_time', 0) for r in results)
+        print(f"🧮 Parallel jobs: {jobs} ({busy_time:.2f}s of PDF processing in {total_time:.2f}s wall time, "
+              f"{busy_time/total_time:.1f}x)")
+        print(f"🪣 Time waiting on the write limiter: {sum(r['result'].get('rate_limited_seconds', 0) for r in results):.2f}s")
     
     # Detailed results
     print(f"\n📋 Detailed Results:")
@@ -1558,6 +1748,11 @@ def main(batch_size=DEFAULT_BATCH_SIZE):
             updated_records = res.get('updated', 0)
             print(f"✅ {pdf_name}: {res.get('total_students', 0)} students, {batches} batches, {rate:.1f} rec/s")
             print(f"   📊 {new_records} new, {updated_records} updated ({firebase_status})")
+            sizing = res.get('batch_sizing')
+            if sizing:
+                reasons = sorted({d['reason'] for d in sizing['decisions']})
+                print(f"   🎛️ Batch sizes {sizing['min_used']}-{sizing['max_used']} (final {sizing['final_size']}, "
+                      f"{', '.join(reasons) or 'no commits'}), parser blocked {sizing['parser_blocked_seconds']}s")
         else:
             print(f"❌ {pdf_name}: FAILED - {res.get('error', 'Unknown error')}")
 
@@ -1565,12 +1760,64 @@ if __name__ == "__main__":
     # Allow command line batch size override
     import sys
     
+    # Distributed shard modes (work_dir is shared between hosts, e.g. over NFS):
+    #   python batch_pdf_processor.py --shard <pdf> <work_dir> [pages_per_shard]
+    #   python batch_pdf_processor.py --shard-worker <work_dir>          (run on any number of hosts)
+    #   python batch_pdf_processor.py --reduce <work_dir> [batch_size]   (every fully parsed job)
+    #   python batch_pdf_processor.py --sharded <pdf> <work_dir> <workers> [pages_per_shard]
+    # Multi-node backfill (run on every VM; coord_dir and pdf_dir on shared storage):
+    #   python batch_pdf_processor.py --node <coord_dir> [pdf_dir] [batch_size]
+    if len(sys.argv) > 2 and sys.argv[1] == '--node':
+        run_batch_node(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else '.',
+                       int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_BATCH_SIZE)
+        sys.exit(0)
+    # Watch-folder daemon (PDFs dropped into <drop_dir> are ingested once, by content hash):
+    #   python batch_pdf_processor.py --watch <drop_dir> [workers]
+    if len(sys.argv) > 2 and sys.argv[1] == '--watch':
+        watch_drop_folder(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_WATCH_WORKERS)
+        sys.exit(0)
+    if len(sys.argv) > 3 and sys.argv[1] == '--shard':
+        shard_pdf(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_PAGES_PER_SHARD)
+        sys.exit(0)
+    if len(sys.argv) > 2 and sys.argv[1] == '--shard-worker':
+        shard_worker(sys.argv[2])
+        sys.exit(0)
+    if len(sys.argv) > 2 and sys.argv[1] == '--reduce':
+        reduce_batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_BATCH_SIZE
+        db, bucket = setup_firebase()
+        for job_dir in list_jobs(sys.argv[2]):
+            status = shard_status(job_dir)
+            if status['parsed'] < status['total']:
+                print(f"⏳ Skipping {os.path.basename(job_dir)}: {status}")
+                continue
+            reduce_sharded_pdf(job_dir, db, bucket, reduce_batch_size)
+        sys.exit(0)
+    if len(sys.argv) > 4 and sys.argv[1] == '--sharded':
+        db, bucket = setup_firebase()
+        process_sharded_pdf(sys.argv[2], sys.argv[3], int(sys.argv[4]), db, bucket,
+                            pages_per_shard=int(sys.argv[5]) if len(sys.argv) > 5 else DEFAULT_PAGES_PER_SHARD)
+        sys.exit(0)
+    
+    # Parallel PDFs: python batch_pdf_processor.py [batch_size] --jobs N
+    # Reprocess PDFs the manifest has already seen: --force
+    args = sys.argv[1:]
+    force = '--force' in args
+    args = [arg for arg in args if arg != '--force']
+    jobs = 1
+    if '--jobs' in args:
+        index = args.index('--jobs')
+        try:
+            jobs = max(1, int(args[index + 1]))
+        except (IndexError, ValueError):
+            print("⚠️ --jobs needs a number, processing PDFs one at a time")
+        args = args[:index] + args[index + 2:]
+    
     batch_size = DEFAULT_BATCH_SIZE
-    if len(sys.argv) > 1:
+    if args:
         try:
-            batch_size = int(sys.argv[1])
+            batch_size = int(args[0])
             print(f"⚙️ Using command line batch size: {batch_size}")
         except ValueError:
             print(f"⚠️ Invalid batch size argument, using default: {DEFAULT_BATCH_SIZE}")
     
-    main(batch_size)
+    main(batch_size, jobs, force)
@@ -0,0 +1,197 @@
+"""
+Chunked Upload
+Resumable PDF uploads: the client opens a session, sends the file in chunks (each with
+its SHA-256) at the offset the server reports, and resumes from that offset after a
+dropped connection. Chunks are appended straight into one part file under temp/, which
+is renamed into place on completion, so the assembled PDF is never copied again.
+
+Session layout (shared by every gunicorn worker on the host):
+    temp/chunked/<session_id>/meta.json
+    temp/chunked/<session_id>/data.part
+    temp/chunked/<session_id>/lock
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import secrets
+import hashlib
+import logging
+import contextlib
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CHUNKED_UPLOAD_DIR = os.path.join("temp", "chunked")
+DEFAULT_CHUNK_SIZE = 2 * 1024 * 1024  # 2 MB
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+SESSION_TTL_SECONDS = 24 * 60 * 60  # Abandoned sessions are purged after a day
+
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadError(Exception):
+    """Rejected session or chunk; offset is the server's current offset for the client to resume from"""
+
+    def __init__(self, message, status_code=400, offset=None):
+        self.message = message
+        self.status_code = status_code
+        self.offset = offset
+        super().__init__(message)
+
+
+def _session_dir(session_id):
+    if not session_id or not SESSION_ID_PATTERN.match(session_id):
+        raise ChunkedUploadError("Unknown upload session", 404)
+    return os.path.join(CHUNKED_UPLOAD_DIR, session_id)
+
+
+def _write_meta(session_dir, meta):
+    tmp_path = os.path.join(session_dir, f"meta.json.tmp-{os.getpid()}")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(session_dir, 'meta.json'))
+
+
+@contextlib.contextmanager
+def _locked_session(session_id):
+    """Hold the session's lock (across workers) and yield (session_dir, meta)"""
+    session_dir = _session_dir(session_id)
+    try:
+        lock_file = open(os.path.join(session_dir, 'lock'), 'a')
+    except FileNotFoundError:
+        raise ChunkedUploadError("Unknown upload session", 404)
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        meta = load_session(session_id)
+        if meta is None:
+            raise ChunkedUploadError("Unknown upload session", 404)
+        yield session_dir, meta
+
+
+def create_session(filename, size, sha256=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Open an upload session for a file of the given size; returns its metadata"""
+    purge_stale_sessions()
+    session_id = secrets.token_hex(16)
+    session_dir = os.path.join(CHUNKED_UPLOAD_DIR, session_id)
+    os.makedirs(session_dir)
+    Path(os.path.join(session_dir, 'data.part')).touch()
+    Path(os.path.join(session_dir, 'lock')).touch()
+
+    meta = {
+        "session_id": session_id,
+        "filename": filename,
+        "size": size,
+        "sha256": sha256.lower() if sha256 else None,
+        "chunk_size": min(chunk_size, MAX_CHUNK_SIZE),
+        "offset": 0,
+        "chunks": 0,
+        "created_at": time.time(),
+        "updated_at": time.time()
+    }
+    _write_meta(session_dir, meta)
+    logger.info(f"Opened chunked upload {session_id} for {filename} ({size} bytes)")
+    return meta
+
+
+def load_session(session_id):
+    try:
+        with open(os.path.join(_session_dir(session_id), 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def append_chunk(session_id, offset, data, checksum=None):
+    """
+    Write one chunk at offset and return the new offset. The chunk must start exactly at
+    the session's current offset; anything else raises ChunkedUploadError (409) carrying
+    the offset to resume from. A chunk already received (a retried request) is accepted.
+    """
+    with _locked_session(session_id) as (session_dir, meta):
+        if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise ChunkedUploadError("Chunk checksum mismatch", 422, meta["offset"])
+        if offset + len(data) <= meta["offset"]:
+            return meta["offset"]  # Duplicate of a chunk that was stored before the response got lost
+        if offset != meta["offset"]:
+            raise ChunkedUploadError(f"Expected chunk at offset {meta['offset']}", 409, meta["offset"])
+        if len(data) > MAX_CHUNK_SIZE:
+            raise ChunkedUploadError(f"Chunk too large (max {MAX_CHUNK_SIZE} bytes)", 413, meta["offset"])
+        if offset + len(data) > meta["size"]:
+            raise ChunkedUploadError("Chunk runs past the declared file size", 400, meta["offset"])
+
+        with open(os.path.join(session_dir, 'data.part'), 'r+b') as part:
+            # Drop the tail of any earlier write that died before its offset was recorded
+            part.truncate(offset)
+            part.seek(offset)
+            part.write(data)
+            part.flush()
+            os.fsync(part.fileno())
+
+        meta["offset"] = offset + len(data)
+        meta["chunks"] += 1
+        meta["updated_at"] = time.time()
+        _write_meta(session_dir, meta)
+        return meta["offset"]
+
+
+def assemble(session_id, target_dir="temp"):
+    """
+    Verify a fully received session and move its part file into target_dir under a random
+    name (a rename, not a copy). Returns (file_path, original filename).
+    """
+    with _locked_session(session_id) as (session_dir, meta):
+        if meta["offset"] != meta["size"]:
+            raise ChunkedUploadError(f"Upload incomplete: {meta['offset']} of {meta['size']} bytes received", 409, meta["offset"])
+
+        part_path = os.path.join(session_dir, 'data.part')
+        with open(part_path, 'rb') as part:
+            if not part.read(5).startswith(b'%PDF-'):
+                raise ChunkedUploadError("Invalid PDF file format", 400, meta["offset"])
+            if meta["sha256"]:
+                part.seek(0)
+                digest = hashlib.sha256()
+                for block in iter(lambda: part.read(1024 * 1024), b''):
+                    digest.update(block)
+                if digest.hexdigest() != meta["sha256"]:
+                    raise ChunkedUploadError("File checksum mismatch", 422, meta["offset"])
+
+        os.makedirs(target_dir, exist_ok=True)
+        file_path = os.path.join(target_dir, f"{secrets.token_hex(16)}.pdf")
+        os.replace(part_path, file_path)
+        logger.info(f"Assembled chunked upload {session_id}: {meta['chunks']} chunks, {meta['size']} bytes")
+
+    discard_session(session_id)
+    return file_path, meta["filename"]
+
+
+def discard_session(session_id):
+    session_dir = _session_dir(session_id)
+    for name in ('data.part', 'meta.json', 'lock'):
+        try:
+            os.remove(os.path.join(session_dir, name))
+        except FileNotFoundError:
+            pass
+    try:
+        os.rmdir(session_dir)
+    except OSError:
+        pass
+
+
+def purge_stale_sessions(max_age=SESSION_TTL_SECONDS):
+    """Remove sessions with no chunk for max_age seconds; returns how many were removed"""
+    if not os.path.isdir(CHUNKED_UPLOAD_DIR):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for session_id in os.listdir(CHUNKED_UPLOAD_DIR):
+        if not SESSION_ID_PATTERN.match(session_id):
+            continue
+        meta = load_session(session_id)
+        last_update = meta["updated_at"] if meta else os.path.getmtime(os.path.join(CHUNKED_UPLOAD_DIR, session_id))
+        if last_update < cutoff:
+            discard_session(session_id)
+            removed += 1
+    return removed
@@ -0,0 +1,123 @@
+"""
+Shared pytest setup
+app opens the progress store, job store and write journal when it is imported, so their
+paths point at a scratch directory here, before any test module imports it. The fixtures
+give a test its own stores, working directory or fake Firestore; monkeypatch puts the
+module globals back afterwards.
+"""
+
+import os
+import time
+import tempfile
+import pytest
+
+_STORE_DIR = tempfile.mkdtemp(prefix='test-stores-')
+os.environ.setdefault('PROGRESS_STORE_PATH', os.path.join(_STORE_DIR, 'progress.db'))
+os.environ.setdefault('JOB_STORE_PATH', os.path.join(_STORE_DIR, 'jobs.db'))
+os.environ.setdefault('WRITE_JOURNAL_DIR', os.path.join(_STORE_DIR, 'write_journal'))
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id, self.data = doc_id, data
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+class FakeDb:
+    """
+    Firestore stand-in with equality queries; counts documents written and queries run.
+    Batch commits take commit_seconds.
+    """
+
+    def __init__(self, commit_seconds=0):
+        self.docs = {}
+        self.writes = 0
+        self.queries = 0
+        self.commit_seconds = commit_seconds
+
+    def batch(self):
+        db = self
+
+        class Batch:
+            def __init__(self):
+                self.ops = []
+
+            def set(self, ref, data):
+                self.ops.append((ref.id, data))
+
+            def delete(self, ref):
+                self.ops.append((ref.id, None))
+
+            def commit(self):
+                time.sleep(db.commit_seconds)
+                for doc_id, data in self.ops:
+                    if data is None:
+                        db.docs.pop(doc_id, None)
+                    else:
+                        db.docs[doc_id] = data
+                        db.writes += 1
+        return Batch()
+
+    def collection(self, name):
+        db = self
+
+        class Ref:
+            def __init__(self, doc_id):
+                self.id = doc_id
+
+        class Query:
+            def __init__(self, filters=()):
+                self.filters = filters
+
+            def document(self, doc_id):
+                return Ref(doc_id)
+
+            def where(self, field, op, value):
+                return Query(self.filters + ((field, value),))
+
+            def stream(self):
+                db.queries += 1
+                return [FakeDoc(doc_id, data) for doc_id, data in db.docs.items()
+                        if all(data.get(field) == value for field, value in self.filters)]
+        return Query()
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    """Empty job store used by job_store's default path"""
+    import job_store
+    path = str(tmp_path / "jobs.db")
+    monkeypatch.setattr(job_store, "JOB_STORE_PATH", path)
+    return path
+
+
+@pytest.fixture
+def progress_db(tmp_path, monkeypatch):
+    """Empty progress store used by progress_store's default path"""
+    import progress_store
+    path = str(tmp_path / "progress.db")
+    monkeypatch.setattr(progress_store, "PROGRESS_STORE_PATH", path)
+    return path
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """Run the test from an empty directory: uploads land in its temp/, JSON output in data/"""
+    path = tmp_path / "work"
+    (path / "temp").mkdir(parents=True)
+    monkeypatch.chdir(path)
+    return str(path)
+
+
+@pytest.fixture
+def fake_db(tmp_path, monkeypatch):
+    """FakeDb installed as app's Firestore client, with a write journal of its own"""
+    import app
+    from write_journal import WriteJournal
+    db = FakeDb()
+    monkeypatch.setattr(app, "db", db)
+    monkeypatch.setattr(app, "FIREBASE_AVAILABLE", True)
+    monkeypatch.setattr(app, "write_journal", WriteJournal(app.commit_journal_batch, str(tmp_path / "journal")))
+    return db
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Delta Ingestion
+Lets a re-upload of a corrected results PDF write only the students that changed.
+Existing student_results documents for each (year, year_semester, examType) the upload
+touches are fetched once, in bulk, and indexed by student_id and content hash:
+- unchanged students (same hash) are not written at all
+- changed students overwrite their existing document
+- new students get a new document
+The content hash covers what the parser extracted, not the metadata save_to_firebase or
+later merges add, so records written before delta mode existed compare correctly.
+"""
+
+import json
+import hashlib
+
+# Fields that are not part of a student's parsed results
+METADATA_FIELDS = frozenset({
+    'year', 'semester', 'year_semester', 'examType', 'availableSemesters', 'availableExamTypes',
+    'format', 'uploadId', 'lastUploadId', 'attempts', 'uploadedAt', 'upload_date', 'supplyExamTypes',
+    'isSupplyOnly', 'contentHash', 'batchProcessed', 'initialUpload', 'supplyProcessed',
+    'perfectMergeApplied', 'mergeTimestamp', 'mergeReport'
+})
+
+
+def content_hash(record):
+    """SHA-256 of a student's parsed results, ignoring metadata fields"""
+    content = {key: value for key, value in record.items() if key not in METADATA_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def new_delta():
+    """State for one delta upload: fetched indexes per key and each student's outcome"""
+    return {"existing": {}, "students": {}}
+
+
+def fetch_existing(db, year, year_semester, exam_type):
+    """student_id -> [(doc_id, content_hash, uploadedAt)] for one (year, year_semester, examType)"""
+    query = (db.collection('student_results')
+             .where('year', '==', year)
+             .where('year_semester', '==', year_semester)
+             .where('examType', '==', exam_type))
+    existing = {}
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        student_id = data.get('student_id')
+        if student_id:
+            existing.setdefault(student_id, []).append(
+                (doc.id, data.get('contentHash') or content_hash(data), data.get('uploadedAt')))
+    return existing
+
+
+def classify(delta, db, key, student_id, record_hash):
+    """
+    Outcome of writing one student under key = (year, year_semester, examType):
+    ('unchanged', doc_id), ('changed', doc_id to overwrite) or ('added', None).
+    Only the student's latest document counts: matching an older one (a reverted
+    correction) is a change, since the latest record is the one readers see.
+    """
+    if key not in delta["existing"]:
+        delta["existing"][key] = fetch_existing(db, *key)
+    docs = delta["existing"][key].get(student_id)
+    if not docs:
+        outcome, doc_id = 'added', None
+    else:
+        doc_id, latest_hash, _ = max(docs, key=lambda doc: str(doc[2] or ''))
+        outcome = 'unchanged' if latest_hash == record_hash else 'changed'
+    # A student seen again (an amended record) keeps its first write's outcome unless it now changes
+    if delta["students"].get(student_id) in (None, 'unchanged'):
+        delta["students"][student_id] = outcome
+    return outcome, doc_id
+
+
+def summary(delta, sample_size=20):
+    """Diff counts of a delta upload, with a sample of the affected student ids"""
+    outcomes = {"added": [], "changed": [], "unchanged": []}
+    for student_id, outcome in delta["students"].items():
+        outcomes[outcome].append(student_id)
+    missing = sorted({student_id for existing in delta["existing"].values() for student_id in existing}
+                     - set(delta["students"]))
+    return {
+        "added": len(outcomes["added"]),
+        "changed": len(outcomes["changed"]),
+        "unchanged": len(outcomes["unchanged"]),
+        "missing": len(missing),  # In Firestore but not in this upload; left untouched
+        "writes": len(outcomes["added"]) + len(outcomes["changed"]),
+        "existing_fetched": sum(len(docs) for existing in delta["existing"].values() for docs in existing.values()),
+        "sample": {
+            "added": sorted(outcomes["added"])[:sample_size],
+            "changed": sorted(outcomes["changed"])[:sample_size],
+            "missing": missing[:sample_size]
+        }
+    }
@@ -0,0 +1,60 @@
+"""
+Firestore Gate
+Bounds the Firestore calls bulk ingestion (batch commits, delta fetches, duplicate checks)
+has in flight in this process to INGEST_FIRESTORE_CONCURRENCY.
+- INGEST_MODE=threads: job runners share the web worker's Firestore client, and the cap
+  keeps the rest of its connections free for the worker's request handlers
+- INGEST_MODE=process: jobs run in the ingestion process with its own client, so request
+  handlers never queue behind them here; the cap only limits that process's Firestore load
+The gate is per process (a threading condition), not a limit shared across processes, so
+request handlers are not gated: in process mode there would be no bulk calls to wait for.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+INGEST_FIRESTORE_CONCURRENCY = int(os.environ.get('INGEST_FIRESTORE_CONCURRENCY', 4))
+
+
+class FirestoreGate:
+    def __init__(self, limit=None):
+        self.limit = max(1, limit or INGEST_FIRESTORE_CONCURRENCY)
+        self.in_flight = 0
+        self.waiting = 0
+        self.waited = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def bulk(self):
+        """Slot for a Firestore call made by ingestion"""
+        start = time.time()
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    self._cond.wait()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.waited += time.time() - start
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "bulk_limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "waited_seconds": round(self.waited, 3)
+            }
+
+
+# Shared by every thread of this process
+gate = FirestoreGate()
@@ -0,0 +1,10 @@
+"""
+Gunicorn settings read from the working directory by `gunicorn app:app`
+Each worker starts its ingestion job runners once the app is loaded (with INGEST_MODE=process,
+the supervisor of the host's ingestion process instead)
+"""
+
+
+def post_worker_init(worker):
+    from ingestion import start_job_runners
+    start_job_runners()
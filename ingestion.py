@@ -0,0 +1,404 @@
+"""
+Ingestion helpers shared by the upload endpoints
+Parses PDFs in a process pool so concurrent uploads don't fight over the GIL,
+and runs uploads through a bounded, SQLite-backed job queue with queue position, ETA
+and cooperative cancellation
+"""
+
+import os
+import time
+import queue
+import socket
+import logging
+import threading
+import multiprocessing
+import job_store
+from concurrent.futures import ProcessPoolExecutor
+from parser.parser_jntuk import parse_jntuk_pdf
+from parser.parser_autonomous import parse_autonomous_pdf
+
+logger = logging.getLogger(__name__)
+
+# Number of parser processes shared by every upload in this worker
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Ingestion runs below request handling in CPU priority: parser processes always, and the
+# job runners too with INGEST_MODE=process (a dedicated process, see ingestion_process.py)
+INGEST_NICE = int(os.environ.get('INGEST_NICE', 10))
+INGEST_MODE = os.environ.get('INGEST_MODE', 'threads')
+
+_parse_pool = None
+_stream_manager = None
+_parse_pool_lock = threading.Lock()
+
+# Parser processes start from a fork server, not by forking this process: its runner,
+# heartbeat and flusher threads may hold a lock (logging, progress_store) at fork time,
+# which a forked child would inherit held forever
+PARSE_START_METHOD = os.environ.get('PARSE_START_METHOD', 'forkserver')
+
+
+def parser_context():
+    """multiprocessing context for parser processes (the fork server preloads the parsers)"""
+    context = multiprocessing.get_context(PARSE_START_METHOD)
+    if PARSE_START_METHOD == 'forkserver':
+        context.set_forkserver_preload(['ingestion'])
+    return context
+
+
+class IngestionCancelled(Exception):
+    """Raised inside a job (parser pages, Firestore batches) once its cancellation was requested"""
+
+
+class IngestionLeaseLost(IngestionCancelled):
+    """Raised inside a job whose lease another worker reclaimed; that worker carries the job on"""
+
+
+_lost_leases = set()  # Job ids this process's heartbeats lost
+
+
+def cancellation_check(job_id):
+    """Callable that raises IngestionCancelled when the job was cancelled from any worker"""
+    def check():
+        if job_id in _lost_leases:
+            raise IngestionLeaseLost(f"Job {job_id} was reclaimed by another worker")
+        if job_store.is_cancel_requested(job_id):
+            raise IngestionCancelled(f"Job {job_id} was cancelled")
+    return check
+
+
+def parse_pdf_file(file_path, format_type, college_codes=None, branch_codes=None, job_id=None, batch_callback=None):
+    """
+    Parse one PDF with the parser for its format (runs inside a pool process).
+    batch_callback receives finished records during the parse where the parser supports it (JNTUK).
+    """
+    cancel_check = cancellation_check(job_id) if job_id else None
+    if format_type.lower() == 'autonomous':
+        return parse_autonomous_pdf(file_path, cancel_check=cancel_check)
+    return parse_jntuk_pdf(file_path, college_codes=college_codes, branch_codes=branch_codes, cancel_check=cancel_check,
+                           batch_callback=batch_callback)
+
+
+def lower_priority():
+    """Drop this process to niceness INGEST_NICE (no-op if it is already that low)"""
+    try:
+        current = os.nice(0)
+        if current < INGEST_NICE:
+            os.nice(INGEST_NICE - current)
+    except OSError as e:
+        logger.warning(f"Could not lower ingestion priority: {e}")
+
+
+def get_parse_pool():
+    """Lazily create the shared parser process pool"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=parser_context(),
+                                              initializer=lower_priority)
+            logger.info(f"Started parser process pool with {PARSE_WORKERS} workers")
+        return _parse_pool
+
+
+def parse_pdf_in_pool(file_path, format_type, college_codes=None, branch_codes=None, job_id=None):
+    """Parse one PDF in the shared process pool and wait for its records"""
+    return get_parse_pool().submit(parse_pdf_file, file_path, format_type, college_codes, branch_codes, job_id).result()
+
+
+# Parsed batches waiting for the writer; a full queue blocks the parser (backpressure)
+STREAM_QUEUE_BATCHES = int(os.environ.get('STREAM_QUEUE_BATCHES', 8))
+
+
+def get_stream_manager():
+    """Lazily start the manager whose queues carry streamed batches back from pool processes"""
+    global _stream_manager
+    with _parse_pool_lock:
+        if _stream_manager is None:
+            _stream_manager = parser_context().Manager()
+        return _stream_manager
+
+
+def _stream_parse_worker(batch_queue, stop, file_key, file_path, format_type, college_codes, branch_codes, job_id):
+    """
+    Pool task for stream_pdfs_parallel. Sends (file_key, 'records', batch) as students finish,
+    then (file_key, 'done', amended) where amended lists records that changed after they were
+    sent (a student whose rows weren't contiguous), or (file_key, 'error', exception). Stops
+    with IngestionCancelled once the reader has gone (stop is set), freeing its pool process.
+    """
+    sent = {}  # student_id -> (subjects, sgpa) when sent
+
+    def put(kind, payload):
+        while True:
+            if stop.is_set():
+                raise IngestionCancelled(f"Stream of {file_path} was abandoned by its reader")
+            try:
+                batch_queue.put((file_key, kind, payload), timeout=JOB_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def send(records):
+        for record in records:
+            sent[record['student_id']] = (len(record['subjectGrades']), record['sgpa'])
+        put('records', records)  # Pickled by the manager call itself, before the parser moves on
+
+    try:
+        results = parse_pdf_file(file_path, format_type, college_codes, branch_codes, job_id, batch_callback=send)
+        unsent = [record for record in results if record['student_id'] not in sent]
+        if unsent:
+            send(unsent)  # Parsers without batch support deliver everything at the end
+        amended = [record for record in results
+                   if sent[record['student_id']] != (len(record['subjectGrades']), record['sgpa'])]
+        put('done', amended)
+    except Exception as e:
+        if not stop.is_set():
+            put('error', e)
+
+
+def stream_pdfs_parallel(file_keys_and_paths, format_type, college_codes=None, branch_codes=None, job_id=None):
+    """
+    Parse several PDFs concurrently in the shared process pool and yield (file_key, kind, payload)
+    as their students are finished: ('records', batch) while a file parses, then ('done', amended)
+    or ('error', exception) once per file. All files share one queue of at most
+    STREAM_QUEUE_BATCHES batches, so a slow writer throttles every parser and the job never
+    holds more than that in transit. Cancelling the job raises IngestionCancelled here.
+    """
+    manager = get_stream_manager()
+    batch_queue = manager.Queue(maxsize=STREAM_QUEUE_BATCHES)
+    stop = manager.Event()
+    pool = get_parse_pool()
+    futures = {
+        pool.submit(_stream_parse_worker, batch_queue, stop, file_key, file_path, format_type,
+                    college_codes, branch_codes, job_id): file_key
+        for file_key, file_path in file_keys_and_paths
+    }
+    streaming = set(futures.values())
+    try:
+        while streaming:
+            try:
+                file_key, kind, payload = batch_queue.get(timeout=JOB_POLL_SECONDS)
+            except queue.Empty:
+                stopped = [future for future, file_key in futures.items() if future.done() and file_key in streaming]
+                if not stopped:
+                    continue  # Waiting for pool processes, or for the parsers' next batches
+                try:
+                    file_key, kind, payload = batch_queue.get_nowait()  # Sent just before a task returned
+                except queue.Empty:
+                    for future in stopped:
+                        # The pool process went away mid-parse (BrokenProcessPool)
+                        file_key = futures[future]
+                        streaming.discard(file_key)
+                        yield file_key, 'error', future.exception() or RuntimeError(
+                            f"Parser for {file_key} stopped without finishing its stream")
+                    continue
+            if kind == 'error' and isinstance(payload, IngestionCancelled):
+                raise payload
+            if kind != 'records':
+                streaming.discard(file_key)
+            if kind == 'error':
+                logger.error(f"Parsing failed for {file_key}: {payload}")
+            yield file_key, kind, payload
+    finally:
+        stop.set()
+        for future in futures:
+            future.cancel()
+
+
+def stream_pdf_batches(file_path, format_type, college_codes=None, branch_codes=None, job_id=None):
+    """
+    Parse one PDF in the shared process pool and yield ('records', batch) as students are
+    finished, then ('amended', records) if any sent record changed later (see
+    stream_pdfs_parallel). Parser errors (including IngestionCancelled) are re-raised here.
+    """
+    for _, kind, payload in stream_pdfs_parallel([(file_path, file_path)], format_type, college_codes, branch_codes, job_id):
+        if kind == 'records':
+            yield 'records', payload
+        elif kind == 'error':
+            raise payload
+        elif payload:
+            yield 'amended', payload
+
+
+# -----------------------------------------------------------------------------
+# Ingestion job queue: uploads are persisted in the SQLite job store and run by
+# a fixed number of runner threads in every gunicorn worker, so any worker can
+# pick up (or reclaim) a job accepted by another. At most MAX_RUNNING_JOBS run at
+# once across all of them: the runners only compete for those slots
+# -----------------------------------------------------------------------------
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', PARSE_WORKERS))
+MAX_RUNNING_JOBS = int(os.environ.get('MAX_RUNNING_JOBS', INGEST_WORKERS))
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', 20))
+DEFAULT_JOB_SECONDS = 60.0  # ETA estimate until real jobs have finished
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1.0))
+
+_job_handlers = {}
+_job_runners = []
+_job_runners_lock = threading.Lock()
+_job_wakeup = threading.Event()
+
+
+class IngestionQueueFull(Exception):
+    """Raised when an upload arrives while MAX_QUEUED_JOBS jobs are already waiting"""
+
+
+def register_job_handler(kind, handler):
+    """handler(payload) runs a job of this kind and returns a JSON-serialisable result"""
+    _job_handlers[kind] = handler
+
+
+def queue_status(job_id):
+    """Queue state of one job as seen from any worker: position and ETA while pending"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return {"state": "unknown"}
+    if job['state'] == 'running':
+        return {"state": "running", "position": 0, "eta_seconds": 0, "worker": job['lease_owner']}
+    if job['state'] != 'pending':
+        return {"state": job['state']}
+
+    position = job_store.pending_position(job_id) or 1
+    average_seconds = job_store.average_job_seconds(DEFAULT_JOB_SECONDS)
+    running = job_store.running_jobs()
+    slots = MAX_RUNNING_JOBS
+    if len(running) < slots:
+        first_free_slot = 0
+    else:
+        now = time.time()
+        first_free_slot = max(0, average_seconds - max(now - running_job['started_at'] for running_job in running))
+    eta_seconds = first_free_slot + average_seconds * ((position - 1) // slots)
+    return {
+        "state": "queued",
+        "position": position,
+        "queued_jobs": job_store.count_jobs('pending'),
+        "eta_seconds": round(eta_seconds),
+        "eta_completion_seconds": round(eta_seconds + average_seconds)
+    }
+
+
+def queue_stats():
+    """Snapshot of the ingestion queue for health/admin endpoints"""
+    return {
+        "workers_per_process": INGEST_WORKERS,
+        "max_running": MAX_RUNNING_JOBS,
+        "running": len(job_store.running_jobs()),
+        "queued": job_store.count_jobs('pending'),
+        "finished": job_store.count_jobs('finished'),
+        "failed": job_store.count_jobs('failed'),
+        "capacity": MAX_QUEUED_JOBS,
+        "average_job_seconds": round(job_store.average_job_seconds(DEFAULT_JOB_SECONDS), 1)
+    }
+
+
+def _heartbeat_loop(job_id, owner, stop_event):
+    """Renew the job's lease until it finishes; a lost lease means another worker took over"""
+    while not stop_event.wait(job_store.LEASE_SECONDS / 3):
+        try:
+            if not job_store.heartbeat(job_id, owner):
+                logger.warning(f"Lost lease on job {job_id}; another worker reclaimed it, stopping at its next check")
+                _lost_leases.add(job_id)
+                return
+        except Exception as e:
+            logger.error(f"Heartbeat failed for job {job_id}: {e}")
+
+
+def run_claimed_job(job, owner):
+    """Run one claimed job with heartbeats and record its outcome; False if the lease was lost meanwhile"""
+    stop_heartbeat = threading.Event()
+    heartbeat_thread = threading.Thread(target=_heartbeat_loop, args=(job['job_id'], owner, stop_heartbeat), daemon=True)
+    heartbeat_thread.start()
+    try:
+        handler = _job_handlers.get(job['kind'])
+        if handler is None:
+            raise RuntimeError(f"No handler registered for job kind '{job['kind']}'")
+        result = handler(job['payload'])
+        recorded = job_store.finish_job(job['job_id'], owner, result)
+    except IngestionLeaseLost:
+        logger.warning(f"Ingestion job {job['job_id']} stopped: its lease moved to another worker")
+        recorded = True  # The new owner records the outcome
+    except IngestionCancelled:
+        logger.info(f"Ingestion job {job['job_id']} cancelled")
+        recorded = job_store.cancel_job(job['job_id'], owner)
+    except Exception as e:
+        logger.error(f"Ingestion job {job['job_id']} failed: {e}")
+        recorded = job_store.fail_job(job['job_id'], owner, e)
+    finally:
+        stop_heartbeat.set()
+        _lost_leases.discard(job['job_id'])
+    if not recorded:
+        # The lease expired and another worker reclaimed the job; its outcome is the one that counts
+        logger.warning(f"Outcome of ingestion job {job['job_id']} not recorded: {owner} no longer holds its lease")
+    return recorded
+
+
+def _job_runner(owner):
+    """Runner thread: claim the oldest pending (or stalled) job, when a global slot is free, and run it to completion"""
+    while True:
+        try:
+            job = job_store.claim_next_job(owner, max_running=MAX_RUNNING_JOBS)
+        except Exception as e:
+            logger.error(f"Job store unavailable for {owner}: {e}")
+            job = None
+        if job is None:
+            _job_wakeup.wait(JOB_POLL_SECONDS)
+            _job_wakeup.clear()
+            continue
+        logger.info(f"{owner} running job {job['job_id']} (attempt {job['attempts']})")
+        run_claimed_job(job, owner)
+
+
+def _supervise_ingestion_process():
+    """Web worker side of INGEST_MODE=process: keep the host's ingestion process running"""
+    import ingestion_process
+    while True:
+        try:
+            ingestion_process.ensure_running(os.environ.get('INGEST_APP_MODULE', 'app'))
+        except Exception as e:
+            logger.error(f"Could not start the ingestion process: {e}")
+        time.sleep(ingestion_process.INGEST_SUPERVISE_SECONDS)
+
+
+def start_job_runners():
+    """
+    Start this process's runner threads (idempotent); called when a server process starts
+    (gunicorn's post_worker_init, app.py's __main__) and on submit. Importing the app alone
+    starts nothing, so scripts and tests never pick up queued jobs.
+    With INGEST_MODE=process a web worker runs no jobs itself and only supervises the
+    dedicated ingestion process, which calls this again as INGEST_ROLE=ingester.
+    """
+    with _job_runners_lock:
+        if INGEST_MODE == 'process' and os.environ.get('INGEST_ROLE') != 'ingester':
+            if not _job_runners:
+                supervisor = threading.Thread(target=_supervise_ingestion_process, name="ingest-supervisor", daemon=True)
+                supervisor.start()
+                _job_runners.append(supervisor)
+            return
+        while len(_job_runners) < INGEST_WORKERS:
+            owner = f"{socket.gethostname()}:{os.getpid()}:{len(_job_runners)}"
+            runner = threading.Thread(target=_job_runner, args=(owner,), name=f"ingest-runner-{len(_job_runners)}", daemon=True)
+            runner.start()
+            _job_runners.append(runner)
+
+
+def cancel_ingestion_job(job_id):
+    """
+    Request cancellation of a job; returns its state before the request ('pending' jobs
+    are cancelled immediately, 'running' ones stop at their next check) or None if unknown.
+    """
+    previous_state = job_store.request_cancel(job_id)
+    if previous_state is not None:
+        logger.info(f"Cancellation requested for {previous_state} job {job_id}")
+    return previous_state
+
+
+def submit_ingestion_job(job_id, kind, payload):
+    """
+    Persist a job for the registered handler of its kind. Raises IngestionQueueFull
+    when MAX_QUEUED_JOBS jobs are already waiting across all workers.
+    """
+    if job_store.create_job(job_id, kind, payload, max_pending=MAX_QUEUED_JOBS) is None:
+        raise IngestionQueueFull(f"Ingestion queue is full ({MAX_QUEUED_JOBS} uploads waiting)")
+    start_job_runners()
+    _job_wakeup.set()
+
+    status = queue_status(job_id)
+    logger.info(f"Queued ingestion job {job_id}: {status}")
+    return status
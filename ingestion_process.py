@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Ingestion Process
+With INGEST_MODE=process, queued uploads run in one dedicated process per host instead
+of as threads inside the gunicorn workers, so parsing and Firestore writes don't compete
+with request handling for the workers' GIL. The process runs at lower CPU priority
+(ingestion.INGEST_NICE, inherited by its parser processes) and has its own Firestore client and
+concurrency limit (firestore_gate).
+
+Every web worker checks every INGEST_SUPERVISE_SECONDS that the process is alive and starts
+it if not; an exclusive flock on INGEST_PROCESS_LOCK keeps it to one per host. It is a
+separate session, so recycling a worker (--max-requests) does not stop it, and it exits
+once the gunicorn master is gone. Jobs it was running when it died are reclaimed through
+their job_store leases.
+
+Usage: python ingestion_process.py [app_module] [master_pid]
+"""
+
+import os
+import sys
+import time
+import fcntl
+import logging
+import importlib
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INGEST_PROCESS_LOCK = os.environ.get('INGEST_PROCESS_LOCK', os.path.join(BASE_DIR, 'data', 'ingest_process.lock'))
+INGEST_SUPERVISE_SECONDS = 10
+LOCK_WAIT_SECONDS = 5  # A worker's liveness check holds the lock for a moment only
+
+
+def _open_lock():
+    os.makedirs(os.path.dirname(INGEST_PROCESS_LOCK) or '.', exist_ok=True)
+    return open(INGEST_PROCESS_LOCK, 'a+')
+
+
+def running_pid():
+    """PID of this host's ingestion process, or None when it is not running"""
+    with _open_lock() as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.seek(0)
+            content = lock_file.read().strip()
+            return int(content) if content.isdigit() else -1
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return None
+
+
+def ensure_running(app_module='app', master_pid=None):
+    """Start the ingestion process unless one is already running; returns its PID if known"""
+    pid = running_pid()
+    if pid is not None:
+        return pid
+    env = dict(os.environ, INGEST_ROLE='ingester')
+    process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'ingestion_process.py'), app_module,
+                                str(master_pid or os.getppid())], cwd=os.getcwd(), env=env, start_new_session=True)
+    logger.info(f"Started ingestion process {process.pid}")
+    return process.pid
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def serve(app_module='app', master_pid=None):
+    """Run the ingestion job runners of app_module in this process until the master exits"""
+    lock_file = _open_lock()
+    deadline = time.time() + LOCK_WAIT_SECONDS
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            if time.time() >= deadline:
+                print("ℹ️ Another ingestion process is running on this host")
+                return
+            time.sleep(0.1)
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+
+    os.environ['INGEST_ROLE'] = 'ingester'
+    import ingestion
+    ingestion.lower_priority()
+    sys.path.insert(0, os.getcwd())
+    importlib.import_module(app_module)  # Registers the job handlers
+    ingestion.start_job_runners()
+    print(f"🏭 Ingestion process {os.getpid()} running {app_module} jobs at nice {os.nice(0)}")
+
+    while master_pid is None or _alive(master_pid):
+        time.sleep(INGEST_SUPERVISE_SECONDS / 2)
+    print(f"🛑 Ingestion process {os.getpid()} exiting: master {master_pid} is gone")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    module_arg = sys.argv[1] if len(sys.argv) > 1 else 'app'
+    master_arg = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    serve(module_arg, master_arg)
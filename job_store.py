@@ -0,0 +1,262 @@
+"""
+Job Store
+Durable ingestion job table in SQLite (WAL mode) shared by every gunicorn worker.
+Jobs move pending -> running -> finished/failed/cancelled. A running job holds a lease
+that its worker renews with heartbeats; when a worker dies the lease expires and any
+other worker reclaims the job. Cancellation is a flag the running job polls.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ingestion_jobs.db'))
+LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+MAX_JOB_ATTEMPTS = int(os.environ.get('MAX_JOB_ATTEMPTS', 3))
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    cancel_requested_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state_created ON jobs (state, created_at);
+"""
+
+
+def get_connection(db_path=None):
+    """One connection per thread and database file (sqlite3 connections aren't thread-safe)"""
+    db_path = db_path or JOB_STORE_PATH
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        # Never reuse a connection inherited across fork (parser pool processes poll for cancellation)
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    if db_path not in connections:
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if 'cancel_requested_at' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested_at REAL")  # Stores created before cancellation
+        connections[db_path] = conn
+    return connections[db_path]
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def create_job(job_id, kind, payload, db_path=None, max_pending=None):
+    """
+    Insert a pending job. With max_pending, the pending count is checked in the same
+    write transaction (so concurrent workers can't overshoot it) and None is returned
+    instead of inserting when the queue is full.
+    """
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if max_pending is not None:
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'pending'").fetchone()[0]
+            if pending >= max_pending:
+                conn.execute("COMMIT")
+                return None
+        conn.execute(
+            "INSERT INTO jobs (job_id, kind, payload, state, created_at) VALUES (?, ?, ?, 'pending', ?)",
+            (job_id, kind, json.dumps(payload), time.time())
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(job_id, db_path)
+
+
+def get_job(job_id, db_path=None):
+    row = get_connection(db_path).execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+
+def claim_next_job(owner, lease_seconds=LEASE_SECONDS, db_path=None, max_running=None):
+    """
+    Atomically take the oldest pending job, or a running job whose lease has expired
+    (its worker died). Jobs that already used MAX_JOB_ATTEMPTS are failed instead.
+    With max_running, nothing is claimed while that many jobs hold a live lease, counted
+    in the same write transaction, so the limit holds across every worker and host.
+    """
+    conn = get_connection(db_path)
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', finished_at = ?, lease_owner = NULL, "
+            "error = 'Worker lease expired ' || attempts || ' times' "
+            "WHERE state = 'running' AND lease_expires < ? AND attempts >= ?",
+            (now, now, MAX_JOB_ATTEMPTS)
+        )
+        if max_running is not None:
+            running = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'running' AND lease_expires >= ?", (now,)
+            ).fetchone()[0]
+            if running >= max_running:
+                conn.execute("COMMIT")
+                return None
+        row = conn.execute(
+            "SELECT job_id, state, lease_owner FROM jobs "
+            "WHERE state = 'pending' OR (state = 'running' AND lease_expires < ?) "
+            "ORDER BY created_at LIMIT 1",
+            (now,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        if row['state'] == 'running':
+            logger.warning(f"Reclaiming stalled job {row['job_id']} from {row['lease_owner']}")
+        conn.execute(
+            "UPDATE jobs SET state = 'running', lease_owner = ?, lease_expires = ?, heartbeat_at = ?, "
+            "started_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+            (owner, now + lease_seconds, now, now, row['job_id'])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(row['job_id'], db_path)
+
+
+def heartbeat(job_id, owner, lease_seconds=LEASE_SECONDS, db_path=None):
+    """Extend the lease; False means the job was reclaimed by another worker"""
+    now = time.time()
+    cursor = get_connection(db_path).execute(
+        "UPDATE jobs SET lease_expires = ?, heartbeat_at = ? WHERE job_id = ? AND lease_owner = ? AND state = 'running'",
+        (now + lease_seconds, now, job_id, owner)
+    )
+    return cursor.rowcount == 1
+
+
+def finish_job(job_id, owner, result=None, db_path=None):
+    cursor = get_connection(db_path).execute(
+        "UPDATE jobs SET state = 'finished', finished_at = ?, lease_owner = NULL, result = ? "
+        "WHERE job_id = ? AND lease_owner = ?",
+        (time.time(), json.dumps(result, default=str), job_id, owner)
+    )
+    return cursor.rowcount == 1
+
+
+def fail_job(job_id, owner, error, db_path=None):
+    cursor = get_connection(db_path).execute(
+        "UPDATE jobs SET state = 'failed', finished_at = ?, lease_owner = NULL, error = ? "
+        "WHERE job_id = ? AND lease_owner = ?",
+        (time.time(), str(error), job_id, owner)
+    )
+    return cursor.rowcount == 1
+
+
+def request_cancel(job_id, db_path=None):
+    """
+    Flag a job for cancellation. A pending job is cancelled on the spot; a running one
+    stops at its worker's next check. Returns the job's state before the request, or None.
+    """
+    conn = get_connection(db_path)
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        if row['state'] == 'pending':
+            conn.execute(
+                "UPDATE jobs SET state = 'cancelled', cancel_requested_at = ?, finished_at = ? WHERE job_id = ?",
+                (now, now, job_id)
+            )
+        elif row['state'] == 'running':
+            conn.execute("UPDATE jobs SET cancel_requested_at = ? WHERE job_id = ?", (now, job_id))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row['state']
+
+
+def is_cancel_requested(job_id, db_path=None):
+    row = get_connection(db_path).execute("SELECT cancel_requested_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return row is not None and row['cancel_requested_at'] is not None
+
+
+def cancel_job(job_id, owner, db_path=None):
+    """Record that the owning worker stopped a job after a cancel request"""
+    cursor = get_connection(db_path).execute(
+        "UPDATE jobs SET state = 'cancelled', finished_at = ?, lease_owner = NULL WHERE job_id = ? AND lease_owner = ?",
+        (time.time(), job_id, owner)
+    )
+    return cursor.rowcount == 1
+
+
+def count_jobs(state, db_path=None):
+    return get_connection(db_path).execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+
+
+def pending_position(job_id, db_path=None):
+    """1-based position of a pending job among all pending jobs, or None"""
+    row = get_connection(db_path).execute(
+        "SELECT COUNT(*) FROM jobs WHERE state = 'pending' AND created_at <= "
+        "(SELECT created_at FROM jobs WHERE job_id = ? AND state = 'pending')",
+        (job_id,)
+    ).fetchone()
+    return row[0] or None
+
+
+def running_jobs(db_path=None):
+    rows = get_connection(db_path).execute(
+        "SELECT job_id, lease_owner, started_at FROM jobs WHERE state = 'running' AND lease_expires >= ?",
+        (time.time(),)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def average_job_seconds(default, sample=20, db_path=None):
+    """Mean duration of the most recent finished jobs"""
+    row = get_connection(db_path).execute(
+        "SELECT AVG(finished_at - started_at) FROM "
+        "(SELECT finished_at, started_at FROM jobs WHERE state = 'finished' ORDER BY finished_at DESC LIMIT ?)",
+        (sample,)
+    ).fetchone()
+    return row[0] if row[0] is not None else default
+
+
+def purge_finished_jobs(older_than_seconds, db_path=None):
+    """Delete finished/failed/cancelled jobs older than the given age; returns rows removed"""
+    cursor = get_connection(db_path).execute(
+        "DELETE FROM jobs WHERE state IN ('finished', 'failed', 'cancelled') AND finished_at < ?",
+        (time.time() - older_than_seconds,)
+    )
+    return cursor.rowcount
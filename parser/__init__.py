@@ -0,0 +1,14 @@
+"""
+Result PDF parsers
+PARSER_ENGINES maps an engine name to its batch generator, called as
+engine(pdf_path, batch_size=...) and yielding lists of student records.
+"""
+
+from parser.parser_jntuk import parse_jntuk_pdf_generator, parse_grade_column_pdf_generator
+from parser.parser_autonomous import parse_autonomous_pdf_generator
+
+PARSER_ENGINES = {
+    'jntuk': parse_jntuk_pdf_generator,
+    'grade_column': parse_grade_column_pdf_generator,
+    'autonomous': parse_autonomous_pdf_generator,
+}
@@ -3,8 +3,12 @@ import re
 from datetime import datetime
 import time
 
-def parse_autonomous_pdf_generator(file_path, semester="Unknown", university="Autonomous", batch_size=50):
-    """Generator version that yields batches of student records for real-time processing"""
+def parse_autonomous_pdf_generator(file_path, semester="Unknown", university="Autonomous", batch_size=50, row_pages=None):
+    """
+    Generator version that yields batches of student records for real-time processing.
+    row_pages (page indexes) limits student rows to those pages; every page still feeds
+    semester and subject detection.
+    """
     print(f"🚀 Starting optimized batch autonomous parsing of: {file_path}")
     start_time = time.time()
     
@@ -16,15 +20,20 @@ def parse_autonomous_pdf_generator(file_path, semester="Unknown", university="Au
     with pdfplumber.open(file_path) as pdf:
         print(f"📄 PDF has {len(pdf.pages)} pages")
         text_parts = []
+        row_text_parts = []
         
         for i, page in enumerate(pdf.pages):
-            if page.extract_text():
-                text_parts.append(page.extract_text())
+            page_text = page.extract_text()
+            if page_text:
+                text_parts.append(page_text)
+                if row_pages is None or i in row_pages:
+                    row_text_parts.append(page_text)
             
             if i > 0 and i % 10 == 0:
                 print(f"📊 Processed {i+1}/{len(pdf.pages)} pages...")
         
         text = "\n".join(text_parts)
+        row_text = text if row_pages is None else "\n".join(row_text_parts)
     
     # Fast semester detection
     semester_search_text = text[:5000]
@@ -59,7 +68,7 @@ def parse_autonomous_pdf_generator(file_path, semester="Unknown", university="Au
     # Try patterns until we find matches
     matches = []
     for pattern in student_patterns:
-        potential_matches = list(pattern.finditer(text))
+        potential_matches = list(pattern.finditer(row_text))
         if potential_matches:
             print(f"🔍 Pattern found {len(potential_matches)} matches")
             matches = potential_matches
@@ -73,7 +82,7 @@ def parse_autonomous_pdf_generator(file_path, semester="Unknown", university="Au
             re.compile(r'(\d{7,11}[A-Z]*)\s+([A-FS\-\s]+)\s+(\d+\.\d+)', re.MULTILINE)
         ]
         for pattern in general_patterns:
-            potential_matches = list(pattern.finditer(text))
+            potential_matches = list(pattern.finditer(row_text))
             if potential_matches:
                 print(f"🎯 General pattern found {len(potential_matches)} matches")
                 matches = potential_matches
@@ -172,7 +181,8 @@ def parse_autonomous_pdf_generator(file_path, semester="Unknown", university="Au
     total_time = time.time() - start_time
     print(f"✅ Completed batch parsing in {total_time:.2f} seconds - {students_processed} total students")
 
-def parse_autonomous_pdf(file_path, semester="Unknown", university="Autonomous", streaming_callback=None):
+def parse_autonomous_pdf(file_path, semester="Unknown", university="Autonomous", streaming_callback=None, cancel_check=None):
+    """cancel_check, if given, is called before every page and raises to abort the parse"""
     print(f"🚀 Starting real-time parsing of: {file_path}")
     start_time = time.time()
     
@@ -186,6 +196,8 @@ def parse_autonomous_pdf(file_path, semester="Unknown", university="Autonomous",
         
         # Extract text more efficiently - limit to first few pages for metadata, then all for data
         for i, page in enumerate(pdf.pages):
+            if cancel_check:
+                cancel_check()
             if page.extract_text():
                 text_parts.append(page.extract_text())
                 if i < 3:  # First 3 pages for semester detection
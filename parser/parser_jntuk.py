@@ -1,11 +1,318 @@
 import pdfplumber
+import fitz  # PyMuPDF
 import re
+import bisect
 from datetime import datetime
 from collections import defaultdict
 import time
+import contextlib
+
+# Grade points used by parse_jntuk_pdf's SGPA (streaming and final records)
+SGPA_GRADE_POINTS = {
+    'S': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6,
+    'C': 5, 'D': 4, 'F': 0, 'MP': 0, 'ABSENT': 0
+}
+
+# Grade points used by parse_jntuk_pdf_generator (and its grade-column fast path)
+BATCH_GRADE_POINTS = {
+    'S': 10, 'A+': 10, 'A': 9, 'A-': 8.5, 'B+': 8, 'B': 7, 'B-': 6.5,
+    'C+': 6, 'C': 5, 'C-': 4.5, 'D+': 4, 'D': 3, 'E': 2, 'F': 0,
+    'MP': 0, 'ABSENT': 0, 'AB': 0, 'MALPRACTICE': 0, 'WITHHELD': 0,
+    'INCOMPLETE': 0, 'REVALUATION': 0, 'DETAINED': 0
+}
+
+def _new_student_accumulator():
+    """Per-student state with running SGPA totals so each subject row costs O(1)"""
+    return {
+        "subjectGrades": [],
+        "totalCredits": 0,
+        "totalPoints": 0
+    }
+
+def _add_subject(student, subject):
+    """Append a subject row and fold it into the student's running totals"""
+    student['subjectGrades'].append(subject)
+    credits = subject['credits']
+    student['totalCredits'] += credits
+    student['totalPoints'] += SGPA_GRADE_POINTS.get(subject['grade'], 0) * credits
+
+def _student_sgpa(student):
+    """SGPA read straight from the accumulator's running totals"""
+    total_credits = student['totalCredits']
+    return round(student['totalPoints'] / total_credits, 2) if total_credits > 0 else 0.0
+
+def _student_record(student):
+    return {
+        "student_id": student['student_id'],
+        "semester": student['semester'],
+        "university": student['university'],
+        "upload_date": student['upload_date'],
+        "sgpa": _student_sgpa(student),
+        # A snapshot matching sgpa: later rows for this student append to the accumulator, not to emitted records
+        "subjectGrades": list(student['subjectGrades'])
+    }
+
+def _detect_semester(text):
+    """Semester label from a page's text using the batch parser's patterns, or None"""
+    # Pattern 1: Standard format
+    semester_match = re.search(r"([I|II|III|IV]+)\s+B\.Tech\s+([I|II|III|IV|V|VI|VII|VIII]+)\s+Semester", text, re.IGNORECASE)
+    if not semester_match:
+        # Pattern 2: Alternative formats
+        semester_match = re.search(r"B\.?Tech\s+([I|II|III|IV|V|VI|VII|VIII]+)\s+Sem", text, re.IGNORECASE)
+    if not semester_match:
+        # Pattern 3: Simple semester detection
+        semester_match = re.search(r"(\d+)\s*(st|nd|rd|th)?\s*Sem", text, re.IGNORECASE)
+    if not semester_match:
+        # Pattern 4: Roman numeral only
+        semester_match = re.search(r"Semester\s*([I|II|III|IV|V|VI|VII|VIII]+)", text, re.IGNORECASE)
+    if not semester_match:
+        return None
+
+    sem_str = semester_match.group(1)
+    # Handle both roman numerals and regular numbers
+    roman_to_num = {'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6, 'VII': 7, 'VIII': 8}
+    if sem_str in roman_to_num:
+        sem_num = roman_to_num[sem_str]
+    else:
+        try:
+            sem_num = int(sem_str)
+        except:
+            sem_num = 1
+    return f"Semester {sem_num}"
+
+def parse_code_list(codes):
+    """Normalise college/branch codes given as a set, list or comma-separated string"""
+    if not codes:
+        return None
+    if isinstance(codes, str):
+        codes = codes.split(',')
+    codes = {str(code).strip().upper() for code in codes if str(code).strip()}
+    return codes or None
+
+def make_htno_filter(college_codes=None, branch_codes=None):
+    """
+    Row filter on HTNO positions: characters 3-4 are the college code and 7-8 the branch
+    code (e.g. B9 / 05 in 20B91A0501). Returns None when no codes are given.
+    """
+    college_codes = parse_code_list(college_codes)
+    branch_codes = parse_code_list(branch_codes)
+    if not college_codes and not branch_codes:
+        return None
+
+    def htno_matches(htno):
+        return ((not college_codes or htno[2:4] in college_codes) and
+                (not branch_codes or htno[6:8] in branch_codes))
+    return htno_matches
+
+HTNO_SCAN_PATTERN = re.compile(r'\b\d{2}[A-Z0-9]{8}\b')
+
+def _pages_with_matching_htnos(file_path, htno_filter, doc=None):
+    """Indexes of pages holding at least one matching HTNO, from a cheap PyMuPDF text scan (of doc if already open)"""
+    with (fitz.open(file_path) if doc is None else contextlib.nullcontext(doc)) as doc:
+        return {
+            page_num for page_num, page in enumerate(doc)
+            if any(htno_filter(htno) for htno in HTNO_SCAN_PATTERN.findall(page.get_text()))
+        }
+
+def _grade_column_credits(subject_code):
+    """Credits guessed from a grade-column subject code (the sheet doesn't print them)"""
+    credits = 3.0  # Most subjects are 3 credits
+    if 'LAB' in subject_code.upper() or 'L' in subject_code[-1:]:
+        credits = 1.5
+    elif 'WORKSHOP' in subject_code.upper():
+        credits = 2.0
+    return credits
+
+# HTNO / subject code cell; the digit lookahead keeps footer words (CONTROLLER, PRINCIPAL) out
+GRADE_COLUMN_HTNO = re.compile(r'^(?=.*\d)[A-Z0-9]{8,15}$')
+
+def _grade_column_headers(words):
+    """
+    Find grade-column headers (S.No, HTNO, subject codes..., SGPA) among a page's words.
+
+    Each header is parsed once into column descriptors: the subject code, its
+    precomputed credits and the x-range of its grade cells.
+    """
+    headers = []
+    for sgpa_word in words:
+        if sgpa_word[4] != 'SGPA':
+            continue
+        y_mid = (sgpa_word[1] + sgpa_word[3]) / 2
+        code_words = sorted(
+            (w for w in words if w[0] < sgpa_word[0] and w[1] <= y_mid <= w[3] and GRADE_COLUMN_HTNO.match(w[4])),
+            key=lambda w: w[0]
+        )
+        # Same threshold as the table check: S.No + HTNO + codes + SGPA > 10 columns
+        if len(code_words) + 3 <= 10:
+            continue
+
+        centers = [(w[0] + w[2]) / 2 for w in code_words] + [(sgpa_word[0] + sgpa_word[2]) / 2]
+        first_width = centers[1] - centers[0]
+        edges = [centers[0] - first_width / 2] + [(a + b) / 2 for a, b in zip(centers, centers[1:])]
+        headers.append({
+            'y': sgpa_word[3],
+            'codes': [w[4] for w in code_words],
+            'credits': [_grade_column_credits(w[4]) for w in code_words],
+            'edges': edges  # column i spans edges[i]..edges[i+1]; the last edge starts SGPA
+        })
+    return sorted(headers, key=lambda h: h['y'])
+
+def _is_grade_column_doc(doc):
+    return len(doc) > 0 and bool(_grade_column_headers(doc[0].get_text('words')))
+
+def is_grade_column_pdf(file_path):
+    """Cheap check (first page, PyMuPDF words) for the CR24 grade-column results layout"""
+    with fitz.open(file_path) as doc:
+        return _is_grade_column_doc(doc)
+
+def _grade_column_rows(words, headers, previous_header, htno_filter=None):
+    """
+    Decode a page's student rows into (htno, grades) in one pass over its words.
+
+    Grades are placed by column position, so an empty cell stays an empty slot
+    instead of shifting the later subjects.
+    """
+    rows = []
+    for word in words:
+        if not GRADE_COLUMN_HTNO.match(word[4]):
+            continue
+        if htno_filter and not htno_filter(word[4]):
+            continue
+        header = previous_header
+        for candidate in headers:
+            if candidate['y'] < word[1]:
+                header = candidate
+        if header is None or word[2] > header['edges'][0]:
+            continue  # subject codes and anything right of the HTNO column
+        rows.append((word[4], header, [[] for _ in header['codes']], word[1], word[3]))
+
+    if not rows:
+        return []
+    rows.sort(key=lambda r: r[3])
+    row_mids = [(r[3] + r[4]) / 2 for r in rows]
+
+    for word in words:
+        x_mid = (word[0] + word[2]) / 2
+        y_mid = (word[1] + word[3]) / 2
+        index = bisect.bisect_left(row_mids, y_mid)
+        nearest = min(
+            (i for i in (index - 1, index) if 0 <= i < len(rows)),
+            key=lambda i: abs(row_mids[i] - y_mid)
+        )
+        _, header, cells, top, bottom = rows[nearest]
+        if abs(row_mids[nearest] - y_mid) > (bottom - top) / 2:
+            continue
+        column = bisect.bisect_right(header['edges'], x_mid) - 1
+        if 0 <= column < len(cells):
+            cells[column].append(word[4])
+
+    return [(htno, header, [' '.join(cell).strip().upper() for cell in cells]) for htno, header, cells, _, _ in rows]
+
+def parse_grade_column_pdf_generator(file_path, batch_size=50, college_codes=None, branch_codes=None, row_pages=None,
+                                    doc=None):
+    """
+    Fast path for grade-column results (CR24 layout: one row per student, one column per subject).
+
+    Reads words with PyMuPDF instead of running pdfplumber table detection twice per
+    page, and yields the same records as parse_jntuk_pdf_generator's table path.
+    doc is an already open PyMuPDF document of file_path (the caller keeps ownership).
+    """
+    htno_filter = make_htno_filter(college_codes, branch_codes)
+    print(f"🚀 Starting grade-column parsing of: {file_path}")
+    start_time = time.time()
+
+    results = {}
+    current_semester = None
+    upload_date = datetime.now().strftime("%Y-%m-%d")
+    header = None
+
+    with (fitz.open(file_path) if doc is None else contextlib.nullcontext(doc)) as doc:
+        print(f"📄 Grade-column PDF has {len(doc)} pages")
+
+        for page_num, page in enumerate(doc):
+            words = page.get_text('words')
+            if not words:
+                continue
+
+            if not current_semester or page_num < 5:
+                detected_semester = _detect_semester(page.get_text())
+                if detected_semester:
+                    current_semester = detected_semester
+                    print(f"🎯 Detected semester: {current_semester}")
+
+            headers = _grade_column_headers(words)
+            page_rows = _grade_column_rows(words, headers, header, htno_filter) if row_pages is None or page_num in row_pages else []
+            for htno, row_header, grades in page_rows:
+                student = results.get(htno)
+                if student is None:
+                    student = results[htno] = {
+                        "student_id": htno,
+                        "university": "JNTUK",
+                        "upload_date": upload_date,
+                        "subjectGrades": []
+                    }
+                student['semester'] = current_semester or "Unknown"
+
+                for code, credits, grade in zip(row_header['codes'], row_header['credits'], grades):
+                    if not grade or grade == '-':
+                        continue
+                    student['subjectGrades'].append({
+                        "code": code,
+                        "subject": code,  # Sheet only prints codes (names are in the footer legend)
+                        "internals": 0,  # Not available in this format
+                        "grade": grade,
+                        "credits": credits
+                    })
+            if headers:
+                header = headers[-1]
+
+    students = [student for student in results.values() if student['subjectGrades']]
+    print(f"🔍 Found {len(students)} total students with subject grades")
+
+    for i in range(0, len(students), batch_size):
+        batch_records = []
+        for student in students[i:i + batch_size]:
+            total_points = 0
+            total_credits = 0
+            for subject in student['subjectGrades']:
+                total_points += BATCH_GRADE_POINTS.get(subject['grade'], 0) * subject['credits']
+                total_credits += subject['credits']
+
+            batch_records.append({
+                "student_id": student['student_id'],
+                "semester": student['semester'],
+                "university": student['university'],
+                "upload_date": student['upload_date'],
+                "sgpa": round(total_points / total_credits, 2) if total_credits > 0 else 0.0,
+                "subjectGrades": student['subjectGrades']
+            })
+        yield batch_records
+
+    total_time = time.time() - start_time
+    print(f"✅ Completed grade-column parsing in {total_time:.2f} seconds - {len(students)} total students")
+
+def parse_jntuk_pdf_generator(file_path, batch_size=50, college_codes=None, branch_codes=None, row_pages=None,
+                              layout=None):
+    """
+    Generator version that yields batches of student records for real-time processing.
+
+    college_codes / branch_codes (sets or comma-separated strings) keep only matching
+    HTNOs; rows are dropped as soon as their HTNO is read and pages without a match skipped.
+    row_pages (page indexes) limits row extraction to those pages; the others are only
+    read for semester/exam type detection (used for the context pages of PDF shards).
+    layout is 'grade_column' (CR24 fast path) or 'table' (pdfplumber tables and lines);
+    None detects it from the first page.
+    """
+    htno_filter = make_htno_filter(college_codes, branch_codes)
+    # One PyMuPDF open serves the layout check and then the fast path or the HTNO page scan
+    with fitz.open(file_path) as doc:
+        if layout is None:
+            layout = 'grade_column' if _is_grade_column_doc(doc) else 'table'
+        if layout == 'grade_column':
+            yield from parse_grade_column_pdf_generator(file_path, batch_size, college_codes, branch_codes, row_pages, doc=doc)
+            return
+        matching_pages = _pages_with_matching_htnos(file_path, htno_filter, doc) if htno_filter else None
 
-def parse_jntuk_pdf_generator(file_path, batch_size=50):
-    """Generator version that yields batches of student records for real-time processing"""
     print(f"🚀 Starting optimized batch JNTUK parsing of: {file_path}")
     start_time = time.time()
     
@@ -22,17 +329,19 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
     batch_count = 0
     
     # Enhanced Grade points for SGPA calculation - supports all possible variations
-    grade_points = {
-        'S': 10, 'A+': 10, 'A': 9, 'A-': 8.5, 'B+': 8, 'B': 7, 'B-': 6.5,
-        'C+': 6, 'C': 5, 'C-': 4.5, 'D+': 4, 'D': 3, 'E': 2, 'F': 0, 
-        'MP': 0, 'ABSENT': 0, 'AB': 0, 'MALPRACTICE': 0, 'WITHHELD': 0,
-        'INCOMPLETE': 0, 'REVALUATION': 0, 'DETAINED': 0
-    }
+    grade_points = BATCH_GRADE_POINTS
     
     with pdfplumber.open(file_path) as pdf:
         print(f"📄 JNTUK PDF has {len(pdf.pages)} pages")
+        if matching_pages is not None:
+            print(f"🏫 {len(matching_pages)}/{len(pdf.pages)} pages have matching HTNOs")
         
         for page_num, page in enumerate(pdf.pages):
+            skip_rows = ((matching_pages is not None and page_num not in matching_pages) or
+                         (row_pages is not None and page_num not in row_pages))
+            if skip_rows and current_semester and page_num >= 5:
+                continue  # No matching HTNOs and nothing left to detect on this page
+
             text = page.extract_text()
             if not text:
                 continue
@@ -43,30 +352,9 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
 
             # Enhanced semester detection - multiple pattern support
             if not current_semester or page_num < 5:
-                # Pattern 1: Standard format
-                semester_match = re.search(r"([I|II|III|IV]+)\s+B\.Tech\s+([I|II|III|IV|V|VI|VII|VIII]+)\s+Semester", text, re.IGNORECASE)
-                if not semester_match:
-                    # Pattern 2: Alternative formats
-                    semester_match = re.search(r"B\.?Tech\s+([I|II|III|IV|V|VI|VII|VIII]+)\s+Sem", text, re.IGNORECASE)
-                if not semester_match:
-                    # Pattern 3: Simple semester detection
-                    semester_match = re.search(r"(\d+)\s*(st|nd|rd|th)?\s*Sem", text, re.IGNORECASE)
-                if not semester_match:
-                    # Pattern 4: Roman numeral only
-                    semester_match = re.search(r"Semester\s*([I|II|III|IV|V|VI|VII|VIII]+)", text, re.IGNORECASE)
-                
-                if semester_match:
-                    sem_str = semester_match.group(1)
-                    # Handle both roman numerals and regular numbers
-                    roman_to_num = {'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6, 'VII': 7, 'VIII': 8}
-                    if sem_str in roman_to_num:
-                        sem_num = roman_to_num[sem_str]
-                    else:
-                        try:
-                            sem_num = int(sem_str)
-                        except:
-                            sem_num = 1
-                    current_semester = f"Semester {sem_num}"
+                detected_semester = _detect_semester(text)
+                if detected_semester:
+                    current_semester = detected_semester
                     print(f"🎯 Detected semester: {current_semester}")
             
             # Enhanced exam type detection - check once per PDF
@@ -74,6 +362,9 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
                 if re.search(r"supply|supplementary|supple", text, re.IGNORECASE):
                     current_exam_type = "supply"
 
+            if skip_rows:
+                continue
+
             # Process students from this page
             page_students = []
             
@@ -150,6 +441,8 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
                                     if row_idx < 3:
                                         print(f"❌ Empty HTNO in row {row_idx}")
                                     continue
+                                if htno_filter and not htno_filter(htno_str):
+                                    continue
                                 
                                 # Support comprehensive JNTUK student ID formats
                                 valid_patterns = [
@@ -269,6 +562,8 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
                                 htno_str = str(row[1]).strip() if len(row) > 1 else ""
                                 if not htno_str or not re.match(r'^[A-Z0-9]{8,15}$', htno_str):
                                     continue
+                                if htno_filter and not htno_filter(htno_str):
+                                    continue
                                 
                                 print(f"🔍 Processing grade-column student: {htno_str}")
                                 
@@ -289,12 +584,7 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
                                         if not grade or grade in ['-', 'None', '']:
                                             continue
                                             
-                                        # Default credits (can be refined based on subject type)
-                                        credits = 3.0  # Most subjects are 3 credits
-                                        if 'LAB' in subject_code.upper() or 'L' in subject_code[-1:]:
-                                            credits = 1.5
-                                        elif 'WORKSHOP' in subject_code.upper():
-                                            credits = 2.0
+                                        credits = _grade_column_credits(subject_code)
                                         
                                         student['subjectGrades'].append({
                                             "code": subject_code,
@@ -330,6 +620,8 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
                                 
                                 if htno in processed_students:
                                     continue
+                                if htno_filter and not htno_filter(htno):
+                                    continue
                                     
                                 subcode = parts[2] if len(parts) > 2 else ""
                                 credits = parts[-1]
@@ -499,33 +791,53 @@ def parse_jntuk_pdf_generator(file_path, batch_size=50):
     total_time = time.time() - start_time
     print(f"✅ Completed batch parsing in {total_time:.2f} seconds - {students_processed} total students")
 
-def parse_jntuk_pdf(file_path, streaming_callback=None):
+def parse_jntuk_pdf(file_path, streaming_callback=None, college_codes=None, branch_codes=None, cancel_check=None,
+                    batch_callback=None):
+    """
+    cancel_check, if given, is called before every page and raises to abort the parse.
+    batch_callback, if given, receives lists of finished student records as the parse goes:
+    a student is finished once a later page had none of their rows (rows are grouped by HTNO).
+    The return value is unchanged and holds every record, in the same order.
+    """
     print(f"🚀 Starting real-time JNTUK parsing of: {file_path}")
     start_time = time.time()
+
+    htno_filter = make_htno_filter(college_codes, branch_codes)
+    matching_pages = _pages_with_matching_htnos(file_path, htno_filter) if htno_filter else None
     
-    results = defaultdict(lambda: {
-        "subjectGrades": [],
-        "totalCredits": 0
-    })
+    results = defaultdict(_new_student_accumulator)
 
     current_semester = None
     current_exam_type = "regular"
     upload_date = datetime.now().strftime("%Y-%m-%d")  # Calculate once
     students_processed = 0
     processed_students = set()  # Track processed students for streaming
-    
-    # Enhanced Grade points for SGPA calculation - supports all possible variations
-    grade_points = {
-        'S': 10, 'A+': 10, 'A': 9, 'A-': 8.5, 'B+': 8, 'B': 7, 'B-': 6.5,
-        'C+': 6, 'C': 5, 'C-': 4.5, 'D+': 4, 'D': 3, 'E': 2, 'F': 0, 
-        'MP': 0, 'ABSENT': 0, 'AB': 0, 'MALPRACTICE': 0, 'WITHHELD': 0,
-        'INCOMPLETE': 0, 'REVALUATION': 0, 'DETAINED': 0
-    }
+    last_seen_page = {}  # HTNO -> last page with one of its rows
+    emitted = 0  # Students (in first-seen order) already passed to batch_callback
+
+    def emit_finished(before_page):
+        nonlocal emitted
+        student_ids = list(results)
+        end = emitted
+        while end < len(student_ids) and last_seen_page[student_ids[end]] < before_page:
+            end += 1
+        batch = [_student_record(results[htno]) for htno in student_ids[emitted:end] if results[htno].get('subjectGrades')]
+        emitted = end
+        if batch:
+            batch_callback(batch)
     
     with pdfplumber.open(file_path) as pdf:
         print(f"📄 JNTUK PDF has {len(pdf.pages)} pages")
         
         for page_num, page in enumerate(pdf.pages):
+            if cancel_check:
+                cancel_check()
+            if batch_callback and page_num > 1:
+                emit_finished(page_num - 1)
+            skip_rows = matching_pages is not None and page_num not in matching_pages
+            if skip_rows and current_semester and page_num >= 3:
+                continue  # No matching HTNOs and nothing left to detect on this page
+
             text = page.extract_text()
             if not text:
                 continue
@@ -549,6 +861,9 @@ def parse_jntuk_pdf(file_path, streaming_callback=None):
                 if re.search(r"supply|supplementary|supple", text, re.IGNORECASE):
                     current_exam_type = "supply"
 
+            if skip_rows:
+                continue
+
             # Optimized table extraction
             try:
                 tables = page.extract_tables()
@@ -571,59 +886,33 @@ def parse_jntuk_pdf(file_path, streaming_callback=None):
 
                                 if not htno or not re.match(r'\d{2}[A-Z0-9]{8}', str(htno)):
                                     continue
+                                if htno_filter and not htno_filter(str(htno)):
+                                    continue
 
                                 internals_val = 0 if str(internals).strip() == 'ABSENT' else int(internals or 0)
                                 credits_val = float(credits or 0)
 
                                 student = results[htno]
+                                last_seen_page[htno] = page_num
                                 student['student_id'] = htno
                                 student['university'] = "JNTUK"
                                 student['semester'] = current_semester or "Unknown"
                                 student['examType'] = current_exam_type
                                 student['upload_date'] = upload_date
 
-                                student['subjectGrades'].append({
+                                _add_subject(student, {
                                     "code": str(subcode or "").strip(),
                                     "subject": str(subname or "").strip(),
                                     "internals": internals_val,
                                     "grade": str(grade or "").strip(),
                                     "credits": credits_val
                                 })
-
-                                student['totalCredits'] += credits_val
                                 
                                 # Send real-time update if callback provided
                                 if streaming_callback and htno not in processed_students:
                                     processed_students.add(htno)
                                     students_processed += 1
-                                    
-                                    # Calculate and send complete student record
-                                    grade_points = {
-                                        'S': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6, 
-                                        'C': 5, 'D': 4, 'F': 0, 'MP': 0, 'ABSENT': 0
-                                    }
-                                    
-                                    total_points = 0
-                                    total_credits = 0
-                                    for subject in student['subjectGrades']:
-                                        grade = subject.get('grade', 'F')
-                                        credits = subject.get('credits', 0)
-                                        points = grade_points.get(grade, 0)
-                                        total_points += points * credits
-                                        total_credits += credits
-                                    
-                                    sgpa = round(total_points / total_credits, 2) if total_credits > 0 else 0.0
-                                    
-                                    complete_record = {
-                                        "student_id": student['student_id'],
-                                        "semester": student['semester'],
-                                        "university": student['university'],
-                                        "upload_date": student['upload_date'],
-                                        "sgpa": sgpa,
-                                        "subjectGrades": student['subjectGrades'].copy()
-                                    }
-                                    
-                                    streaming_callback(complete_record, students_processed)
+                                    streaming_callback(_student_record(student), students_processed)
                             except (ValueError, TypeError, AttributeError):
                                 continue
             except Exception:
@@ -641,6 +930,8 @@ def parse_jntuk_pdf(file_path, streaming_callback=None):
                         try:
                             if len(parts) > 1 and len(str(parts[1])) == 10 and re.match(r'\d{2}[A-Z0-9]{8}', str(parts[1])):
                                 htno = parts[1]
+                                if htno_filter and not htno_filter(htno):
+                                    continue
                                 subcode = parts[2] if len(parts) > 2 else ""
                                 credits = parts[-1]
                                 grade = parts[-2]
@@ -656,89 +947,40 @@ def parse_jntuk_pdf(file_path, streaming_callback=None):
                                     subname = ' '.join(subname_parts)
 
                                     student = results[htno]
+                                    last_seen_page[htno] = page_num
                                     student['student_id'] = htno
                                     student['university'] = "JNTUK"
                                     student['semester'] = current_semester or "Unknown"
                                     student['examType'] = current_exam_type
                                     student['upload_date'] = upload_date
 
-                                    student['subjectGrades'].append({
+                                    _add_subject(student, {
                                         "code": str(subcode).strip(),
                                         "subject": subname.strip(),
                                         "internals": internals_val,
                                         "grade": str(grade).strip(),
                                         "credits": credits_val
                                     })
-
-                                    student['totalCredits'] += credits_val
                                     
                                     # Send real-time update if callback provided
                                     if streaming_callback and htno not in processed_students:
                                         processed_students.add(htno)
                                         students_processed += 1
-                                        
-                                        # Calculate and send complete student record
-                                        grade_points = {
-                                            'S': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6, 
-                                            'C': 5, 'D': 4, 'F': 0, 'MP': 0, 'ABSENT': 0
-                                        }
-                                        
-                                        total_points = 0
-                                        total_credits = 0
-                                        for subject in student['subjectGrades']:
-                                            grade = subject.get('grade', 'F')
-                                            credits = subject.get('credits', 0)
-                                            points = grade_points.get(grade, 0)
-                                            total_points += points * credits
-                                            total_credits += credits
-                                        
-                                        sgpa = round(total_points / total_credits, 2) if total_credits > 0 else 0.0
-                                        
-                                        complete_record = {
-                                            "student_id": student['student_id'],
-                                            "semester": student['semester'],
-                                            "university": student['university'],
-                                            "upload_date": student['upload_date'],
-                                            "sgpa": sgpa,
-                                            "subjectGrades": student['subjectGrades'].copy()
-                                        }
-                                        
-                                        streaming_callback(complete_record, students_processed)
+                                        streaming_callback(_student_record(student), students_processed)
                         except (ValueError, IndexError, AttributeError):
                             continue
             except Exception:
                 pass
 
-    # Convert results to final format with SGPA calculation
-    final_results = []
-    grade_points = {
-        'S': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6, 
-        'C': 5, 'D': 4, 'F': 0, 'MP': 0, 'ABSENT': 0
-    }
-    
-    for htno, student_data in results.items():
-        if student_data.get('subjectGrades'):
-            # Calculate SGPA
-            total_points = 0
-            total_credits = 0
-            
-            for subject in student_data['subjectGrades']:
-                grade = subject.get('grade', 'F')
-                credits = subject.get('credits', 0)
-                points = grade_points.get(grade, 0)
-                total_points += points * credits
-                total_credits += credits
-            
-            sgpa = round(total_points / total_credits, 2) if total_credits > 0 else 0.0
-            
-            final_results.append({
-                "student_id": student_data['student_id'],
-                "semester": student_data['semester'],
-                "university": student_data['university'],
-                "upload_date": student_data['upload_date'],
-                "sgpa": sgpa,
-                "subjectGrades": student_data['subjectGrades']
-            })
+    if batch_callback:
+        emit_finished(float('inf'))
+
+    # Convert results to final format - SGPA is already accumulated per student
+    final_results = [
+        _student_record(student_data)
+        for student_data in results.values()
+        if student_data.get('subjectGrades')
+    ]
 
     total_time = time.time() - start_time
     print(f"✅ Extracted {len(final_results)} JNTUK student records in {total_time:.2f} seconds")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Parser Benchmark
+Measures parse time, peak memory and time-to-first-batch for the PDF parsers,
+on real PDFs or on synthetic PDFs of increasing page count (scaling curves), and the
+speedup of the JNTUK grade-column fast path over the table path on one PDF
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+from parser import PARSER_ENGINES
+from synthetic_results_pdf import generate_results_pdf, LAYOUTS
+
+# Engine each synthetic layout is ingested with in production
+DEFAULT_ENGINE_FOR_LAYOUT = {
+    'jntuk': 'jntuk',
+    'cr24': 'jntuk',
+    'autonomous': 'autonomous',
+}
+
+DEFAULT_PAGE_COUNTS = [2, 4, 8, 16, 32]
+MIN_GRADE_COLUMN_SPEEDUP = 5  # Expected table-path / grade-column time on CR24 result PDFs
+
+
+def _run_parser(pdf_path, engine, batch_size, parser_kwargs=None):
+    """Runs inside a fresh child process so peak RSS belongs to this parse only"""
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    parser_generator = PARSER_ENGINES[engine](pdf_path, batch_size=batch_size, **(parser_kwargs or {}))
+
+    records = []
+    batches = 0
+    first_batch_time = None
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for batch_records in parser_generator:
+            if first_batch_time is None:
+                first_batch_time = time.perf_counter() - start_time
+            batches += 1
+            records.extend(batch_records)
+    parse_time = time.perf_counter() - start_time
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        'parse_time': parse_time,
+        'time_to_first_batch': first_batch_time if first_batch_time is not None else parse_time,
+        'peak_memory_mb': max(peak_rss - baseline_rss, 0) / 1024,  # ru_maxrss is KB on Linux
+        'batches': batches,
+        'records': records
+    }
+
+
+def compare_with_truth(records, truth):
+    """Score parsed records against generator ground truth"""
+    expected = {s['student_id']: [g['grade'] for g in s['subjectGrades']] for s in truth['students']}
+    parsed = {}
+    for record in records:
+        parsed.setdefault(record['student_id'], []).extend(
+            str(g.get('grade', '')).strip() for g in record.get('subjectGrades', [])
+        )
+
+    found = [sid for sid in expected if sid in parsed]
+    grades_match = sum(1 for sid in found if parsed[sid] == expected[sid])
+    return {
+        'expected_students': len(expected),
+        'students_found': len(found),
+        'unexpected_students': len(set(parsed) - set(expected)),
+        'recall': len(found) / len(expected) if expected else 1.0,
+        'grade_accuracy': grades_match / len(expected) if expected else 1.0
+    }
+
+
+def benchmark_pdf(pdf_path, engine='jntuk', batch_size=500, truth=None, layout=None, return_records=False):
+    """
+    Benchmark one parser engine on one PDF in an isolated child process
+    (layout: force the jntuk engine's 'grade_column' or 'table' path)
+    """
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Must be one of {sorted(PARSER_ENGINES)}")
+
+    parser_kwargs = {'layout': layout} if layout else None
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        run = pool.apply(_run_parser, (pdf_path, engine, batch_size, parser_kwargs))
+
+    result = {
+        'pdf': os.path.basename(pdf_path),
+        'engine': engine,
+        'pages': _count_pages(pdf_path),
+        'students': len({r['student_id'] for r in run['records']}),
+        'batches': run['batches'],
+        'parse_time': round(run['parse_time'], 3),
+        'time_to_first_batch': round(run['time_to_first_batch'], 3),
+        'peak_memory_mb': round(run['peak_memory_mb'], 1),
+    }
+    result['pages_per_second'] = round(result['pages'] / run['parse_time'], 2) if run['parse_time'] else 0
+    if layout:
+        result['layout'] = layout
+    if truth is not None:
+        result['accuracy'] = compare_with_truth(run['records'], truth)
+    if return_records:
+        result['records'] = run['records']
+    return result
+
+
+def compare_layouts(pdf_path, batch_size=500):
+    """
+    Time the jntuk engine's grade-column fast path against its table path on one
+    grade-column PDF. Both must produce the same records; returns both results and the
+    speedup (table time / grade-column time).
+    """
+    fast = benchmark_pdf(pdf_path, 'jntuk', batch_size, layout='grade_column', return_records=True)
+    table = benchmark_pdf(pdf_path, 'jntuk', batch_size, layout='table', return_records=True)
+    identical = [dict(r, upload_date=None) for r in fast.pop('records')] == \
+                [dict(r, upload_date=None) for r in table.pop('records')]
+    speedup = table['parse_time'] / fast['parse_time'] if fast['parse_time'] else 0
+    print(f"⚡ {fast['pdf']}: grade-column {fast['parse_time']:.2f}s, table path {table['parse_time']:.2f}s "
+          f"({speedup:.1f}x, expected >= {MIN_GRADE_COLUMN_SPEEDUP}x), "
+          f"output {'identical' if identical else 'DIFFERS'}")
+    return {'grade_column': fast, 'table': table, 'speedup': round(speedup, 2), 'identical': identical}
+
+
+def _count_pages(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def scaling_curve(layout, page_counts=None, rows_per_page=None, engine=None, batch_size=500, work_dir=None):
+    """
+    Generate synthetic PDFs of increasing page count and benchmark each one.
+
+    Returns one result dict per page count (time, memory and time-to-first-batch vs pages).
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'. Must be one of {LAYOUTS}")
+
+    page_counts = page_counts or DEFAULT_PAGE_COUNTS
+    engine = engine or DEFAULT_ENGINE_FOR_LAYOUT[layout]
+    # Realistic density per layout: ~45 subject rows, 20 grade-column rows, 50 text rows
+    rows_per_page = rows_per_page or {'jntuk': 45, 'cr24': 20, 'autonomous': 50}[layout]
+    subjects_per_student = 6 if layout == 'jntuk' else 1
+
+    curve = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        for pages in page_counts:
+            num_students = max(1, (pages * rows_per_page - 1) // subjects_per_student)
+            pdf_path = os.path.join(tmp_dir, f"synthetic_{layout}_{pages}p.pdf")
+            truth = generate_results_pdf(pdf_path, layout, num_students, num_pages=pages, write_truth=False)
+            result = benchmark_pdf(pdf_path, engine, batch_size, truth=truth)
+            result['layout'] = layout
+            curve.append(result)
+            print(f"📈 {layout} {pages:>5} pages: {result['parse_time']:.2f}s, "
+                  f"first batch {result['time_to_first_batch']:.2f}s, "
+                  f"{result['peak_memory_mb']:.1f} MB, recall {result['accuracy']['recall']:.1%}")
+    return curve
+
+
+def print_curve(curve):
+    print(f"\n{'pages':>7} {'students':>9} {'time(s)':>9} {'first(s)':>9} {'mem(MB)':>9} {'pages/s':>8} {'recall':>7} {'grades':>7}")
+    for point in curve:
+        accuracy = point.get('accuracy', {})
+        print(f"{point['pages']:>7} {point['students']:>9} {point['parse_time']:>9.2f} "
+              f"{point['time_to_first_batch']:>9.2f} {point['peak_memory_mb']:>9.1f} "
+              f"{point['pages_per_second']:>8.2f} {accuracy.get('recall', 0):>7.1%} "
+              f"{accuracy.get('grade_accuracy', 0):>7.1%}")
+
+
+if __name__ == "__main__":
+    # Usage:
+    #   python parser_benchmark.py <pdf> [<pdf> ...] [--engine jntuk]
+    #   python parser_benchmark.py --synthetic <jntuk|cr24|autonomous> [--pages 2,4,8] [--engine jntuk] [--json out.json]
+    #   python parser_benchmark.py --compare-layouts <pdf>   (grade-column fast path vs table path)
+    args = sys.argv[1:]
+
+    def option(name, default=None):
+        if name in args:
+            index = args.index(name)
+            value = args[index + 1]
+            del args[index:index + 2]
+            return value
+        return default
+
+    engine_arg = option('--engine')
+    json_out = option('--json')
+    layout_arg = option('--synthetic')
+    pages_arg = option('--pages')
+    compare_arg = option('--compare-layouts')
+
+    if compare_arg:
+        results = compare_layouts(compare_arg)
+        if not results['identical'] or results['speedup'] < MIN_GRADE_COLUMN_SPEEDUP:
+            sys.exit(1)
+    elif layout_arg:
+        pages = [int(p) for p in pages_arg.split(',')] if pages_arg else None
+        results = scaling_curve(layout_arg, pages, engine=engine_arg)
+        print_curve(results)
+    elif args:
+        results = []
+        for pdf_path in args:
+            result = benchmark_pdf(pdf_path, engine_arg or 'jntuk')
+            results.append(result)
+            print(f"📄 {result['pdf']}: {result['students']} students, {result['pages']} pages, "
+                  f"{result['parse_time']:.2f}s (first batch {result['time_to_first_batch']:.2f}s), "
+                  f"{result['peak_memory_mb']:.1f} MB")
+    else:
+        print("Usage: python parser_benchmark.py <pdf> [...] | --synthetic <layout> [--pages 2,4,8] | --compare-layouts <pdf>")
+        sys.exit(1)
+
+    if json_out:
+        with open(json_out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"📁 Results written to {json_out}")
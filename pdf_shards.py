@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+PDF Shards
+Splits a large results PDF into page-range shard files in a shared work directory.
+Any number of workers (on this host or on others mounting the same directory) claim
+shards through lock files and parse them to partial JSONL outputs; a reducer then
+stitches the partial student records back together in shard order.
+
+Work directory layout (one job per source PDF):
+    <work_dir>/<pdf stem>_<sha1>/manifest.json
+    <work_dir>/<pdf stem>_<sha1>/shards/shard_0000.pdf
+    <work_dir>/<pdf stem>_<sha1>/locks/shard_0000.lock
+    <work_dir>/<pdf stem>_<sha1>/partials/shard_0000.jsonl
+"""
+
+import os
+import json
+import time
+import socket
+import hashlib
+import multiprocessing
+from datetime import datetime
+import fitz  # PyMuPDF
+from parser.parser_jntuk import parse_jntuk_pdf_generator, BATCH_GRADE_POINTS
+from parser.parser_autonomous import parse_autonomous_pdf_generator
+
+DEFAULT_PAGES_PER_SHARD = 20
+DEFAULT_CONTEXT_PAGES = 1  # Leading pages copied into every shard (college/semester header)
+STALE_LOCK_SECONDS = 15 * 60  # A claim older than this with no output is taken over
+SHARD_PARSE_BATCH_SIZE = 500
+
+
+def _file_digest(pdf_path):
+    digest = hashlib.sha1()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    """Write to a temp file and rename so readers on other hosts never see half a file"""
+    tmp_path = f"{path}.tmp-{socket.gethostname()}-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(job_dir):
+    with open(os.path.join(job_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def split_pdf(pdf_path, work_dir, metadata, pages_per_shard=DEFAULT_PAGES_PER_SHARD,
+              context_pages=DEFAULT_CONTEXT_PAGES):
+    """
+    Split a PDF into page-range shard files and write the job manifest.
+
+    Every shard after the first starts with the document's first context_pages pages, so
+    the parser sees the same header text it would on an unsplit run; only the shard's own
+    page range is parsed for student rows. Returns the job directory.
+    """
+    digest = _file_digest(pdf_path)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0].replace(' ', '_')
+    job_dir = os.path.join(work_dir, f"{stem}_{digest[:12]}")
+    manifest_path = os.path.join(job_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        print(f"♻️ Shards already exist for {os.path.basename(pdf_path)}: {job_dir}")
+        return job_dir
+
+    for sub_dir in ('shards', 'locks', 'partials'):
+        os.makedirs(os.path.join(job_dir, sub_dir), exist_ok=True)
+
+    shards = []
+    with fitz.open(pdf_path) as source:
+        total_pages = len(source)
+        for index, start in enumerate(range(0, total_pages, pages_per_shard)):
+            end = min(start + pages_per_shard, total_pages)
+            context = [page for page in range(min(context_pages, total_pages)) if page < start]
+            shard_id = f"shard_{index:04d}"
+            shard_file = os.path.join('shards', f"{shard_id}.pdf")
+
+            with fitz.open() as shard_doc:
+                for page in context:
+                    shard_doc.insert_pdf(source, from_page=page, to_page=page)
+                shard_doc.insert_pdf(source, from_page=start, to_page=end - 1)
+                shard_doc.save(os.path.join(job_dir, shard_file), garbage=3, deflate=True)
+
+            shards.append({
+                "id": shard_id,
+                "file": shard_file,
+                "start_page": start,
+                "end_page": end,
+                "context_pages": context,
+                # Page indexes inside the shard file whose rows belong to this shard
+                "row_pages": list(range(len(context), len(context) + end - start))
+            })
+
+    # Written last: workers only pick up jobs whose manifest exists
+    _write_json_atomic(manifest_path, {
+        "source": os.path.abspath(pdf_path),
+        "source_name": os.path.basename(pdf_path),
+        "sha1": digest,
+        "total_pages": total_pages,
+        "pages_per_shard": pages_per_shard,
+        "metadata": metadata,
+        "created_at": datetime.now().isoformat(),
+        "shards": shards
+    })
+    print(f"✂️ Split {os.path.basename(pdf_path)} ({total_pages} pages) into {len(shards)} shards: {job_dir}")
+    return job_dir
+
+
+def _partial_path(job_dir, shard):
+    return os.path.join(job_dir, 'partials', f"{shard['id']}.jsonl")
+
+
+def _lock_path(job_dir, shard):
+    return os.path.join(job_dir, 'locks', f"{shard['id']}.lock")
+
+
+def claim_shard(job_dir, shard, worker_id):
+    """
+    Claim a shard by creating its lock file with O_EXCL (atomic on local disks and NFS).
+    Stale claims from crashed workers are removed and retried once.
+    """
+    if os.path.exists(_partial_path(job_dir, shard)):
+        return False
+
+    lock_path = _lock_path(job_dir, shard)
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                lock_age = time.time() - os.path.getmtime(lock_path)
+            except FileNotFoundError:
+                continue  # Released between our open and stat
+            if lock_age < STALE_LOCK_SECONDS:
+                return False
+            print(f"⚠️ Taking over stale claim on {shard['id']} ({lock_age:.0f}s old)")
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            continue
+
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"worker": worker_id, "claimed_at": datetime.now().isoformat()}, f)
+        # The previous owner may have finished between our existence check and the claim
+        if os.path.exists(_partial_path(job_dir, shard)):
+            release_shard(job_dir, shard)
+            return False
+        return True
+    return False
+
+
+def release_shard(job_dir, shard):
+    try:
+        os.remove(_lock_path(job_dir, shard))
+    except FileNotFoundError:
+        pass
+
+
+def parse_shard(job_dir, shard, manifest):
+    """Parse one shard's own pages and return its student records in parser order"""
+    shard_path = os.path.join(job_dir, shard['file'])
+    row_pages = set(shard['row_pages'])
+
+    if manifest['metadata'].get('format') == 'autonomous':
+        return [
+            record
+            for batch in parse_autonomous_pdf_generator(shard_path, batch_size=SHARD_PARSE_BATCH_SIZE, row_pages=row_pages)
+            for record in batch
+        ]
+
+    # The JNTUK generator can yield a student again in its final pass; the later record
+    # shares the same subjectGrades list, so keep first position with the latest record
+    records = {}
+    for batch in parse_jntuk_pdf_generator(shard_path, batch_size=SHARD_PARSE_BATCH_SIZE, row_pages=row_pages):
+        for record in batch:
+            records[record['student_id']] = record
+    return list(records.values())
+
+
+def run_shard(job_dir, shard, manifest, worker_id):
+    """Parse a claimed shard into its partial JSONL output, then release the claim"""
+    start_time = time.time()
+    try:
+        records = parse_shard(job_dir, shard, manifest)
+
+        partial_path = _partial_path(job_dir, shard)
+        tmp_path = f"{partial_path}.tmp-{socket.gethostname()}-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, partial_path)
+
+        print(f"✅ {worker_id} parsed {shard['id']} (pages {shard['start_page']}-{shard['end_page'] - 1}): "
+              f"{len(records)} records in {time.time() - start_time:.2f}s")
+        return len(records)
+    finally:
+        release_shard(job_dir, shard)
+
+
+def list_jobs(work_dir):
+    """Job directories in work_dir that have a complete manifest"""
+    if not os.path.isdir(work_dir):
+        return []
+    return sorted(
+        os.path.join(work_dir, name) for name in os.listdir(work_dir)
+        if os.path.exists(os.path.join(work_dir, name, 'manifest.json'))
+    )
+
+
+def shard_worker(work_dir, worker_id=None):
+    """
+    Claim and parse pending shards of every job in work_dir until none are left.
+    Safe to run any number of times in parallel, on one host or several.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    shards_done = 0
+    for job_dir in list_jobs(work_dir):
+        manifest = load_manifest(job_dir)
+        for shard in manifest['shards']:
+            if claim_shard(job_dir, shard, worker_id):
+                run_shard(job_dir, shard, manifest, worker_id)
+                shards_done += 1
+    print(f"🏁 Worker {worker_id} finished: {shards_done} shards parsed")
+    return shards_done
+
+
+def run_local_workers(work_dir, workers):
+    """Run several shard workers as local processes (one-box equivalent of several hosts)"""
+    processes = [
+        multiprocessing.Process(target=shard_worker, args=(work_dir, f"{socket.gethostname()}:local{i}"))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return [process.exitcode for process in processes]
+
+
+def shard_status(job_dir):
+    """Count of parsed, claimed and pending shards for a job"""
+    manifest = load_manifest(job_dir)
+    status = {"total": len(manifest['shards']), "parsed": 0, "claimed": 0, "pending": 0}
+    for shard in manifest['shards']:
+        if os.path.exists(_partial_path(job_dir, shard)):
+            status['parsed'] += 1
+        elif os.path.exists(_lock_path(job_dir, shard)):
+            status['claimed'] += 1
+        else:
+            status['pending'] += 1
+    return status
+
+
+def _recompute_sgpa(subject_grades):
+    total_points = 0
+    total_credits = 0
+    for subject in subject_grades:
+        credits = subject.get('credits', 0)
+        total_points += BATCH_GRADE_POINTS.get(subject.get('grade', 'F'), 0) * credits
+        total_credits += credits
+    return round(total_points / total_credits, 2) if total_credits > 0 else 0.0
+
+
+def reduce_shards(job_dir):
+    """
+    Stitch partial outputs back into one record list, independent of which worker
+    finished first: shards are read in page order and records kept in first-seen order.
+
+    JNTUK students whose rows straddle a shard boundary are merged (subjects concatenated
+    in page order, SGPA recomputed); autonomous rows are one record each and kept as-is.
+    """
+    manifest = load_manifest(job_dir)
+    missing = [shard['id'] for shard in manifest['shards'] if not os.path.exists(_partial_path(job_dir, shard))]
+    if missing:
+        raise RuntimeError(f"{len(missing)} shards not parsed yet: {', '.join(missing[:5])}")
+
+    merge_students = manifest['metadata'].get('format') != 'autonomous'
+    records = []
+    by_student = {}
+    split_students = set()
+
+    for shard in manifest['shards']:
+        with open(_partial_path(job_dir, shard), 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                existing = by_student.get(record['student_id']) if merge_students else None
+                if existing is None:
+                    records.append(record)
+                    if merge_students:
+                        by_student[record['student_id']] = record
+                    continue
+
+                existing['subjectGrades'].extend(record['subjectGrades'])
+                existing['semester'] = record['semester']
+                split_students.add(record['student_id'])
+
+    for student_id in split_students:
+        by_student[student_id]['sgpa'] = _recompute_sgpa(by_student[student_id]['subjectGrades'])
+
+    print(f"🧵 Reduced {len(manifest['shards'])} shards into {len(records)} records "
+          f"({len(split_students)} students stitched across shard boundaries)")
+    return records
@@ -0,0 +1,240 @@
+"""
+Progress Store
+Upload progress records shared by every gunicorn worker, in a SQLite table keyed by
+upload_id. Partial updates are applied atomically inside SQLite with json_patch, so
+workers never overwrite each other's fields, and bursts of intermediate updates
+from one worker are coalesced into at most one write per PROGRESS_FLUSH_SECONDS.
+Finished entries expire after PROGRESS_TTL_SECONDS, and the table is kept under
+PROGRESS_MAX_BYTES by evicting the oldest finished entries first.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STORE_PATH = os.environ.get('PROGRESS_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'upload_progress.db'))
+PROGRESS_FLUSH_SECONDS = float(os.environ.get('PROGRESS_FLUSH_SECONDS', 0.25))
+TERMINAL_STATUSES = {'completed', 'error', 'cancelled'}
+PROGRESS_TTL_SECONDS = int(os.environ.get('PROGRESS_TTL_SECONDS', 60 * 60))  # After completion/error
+PROGRESS_STALE_SECONDS = int(os.environ.get('PROGRESS_STALE_SECONDS', 24 * 60 * 60))  # No update at all (dead upload)
+PROGRESS_MAX_BYTES = int(os.environ.get('PROGRESS_MAX_BYTES', 16 * 1024 * 1024))  # Total size of stored records
+PROGRESS_EVICT_INTERVAL = 60  # Seconds between eviction sweeps in each process
+
+# Fields update_progress accepts (the sections of the initial record plus the final result)
+PROGRESS_FIELDS = {'parsing', 'firebase', 'storage', 'json', 'files', 'queue', 'error', 'stages', 'final_result'}
+
+_local = threading.local()
+_pending = {}  # upload_id -> coalesced patch not yet written
+_last_flush = {}  # upload_id -> (time, status) of the last write from this process
+_pending_lock = threading.Lock()
+_flusher = None
+_last_eviction = 0
+eviction_stats = {"sweeps": 0, "expired": 0, "stale": 0, "over_budget": 0, "bytes_freed": 0, "last_sweep": None}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    upload_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_updated ON progress (updated_at);
+"""
+
+
+def new_progress_record():
+    return {
+        "status": "starting",
+        "timestamp": time.time(),
+        "parsing": {"status": "pending", "progress": 0},
+        "firebase": {"status": "pending", "progress": 0, "batches": 0, "students_saved": 0},
+        "storage": {"status": "pending"},
+        "json": {"status": "pending"},
+        "files": {},
+        "queue": {},
+        "stages": {},
+        "error": {}
+    }
+
+
+def get_connection():
+    """One connection per thread, reopened if PROGRESS_STORE_PATH changes"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != PROGRESS_STORE_PATH:
+        os.makedirs(os.path.dirname(PROGRESS_STORE_PATH) or '.', exist_ok=True)
+        conn = sqlite3.connect(PROGRESS_STORE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+        _local.path = PROGRESS_STORE_PATH
+    return conn
+
+
+def merge_patch(target, patch):
+    """In-memory equivalent of SQLite's json_patch (RFC 7396) for coalescing"""
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_patch(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def _write(upload_id, patch):
+    """Apply one patch atomically: insert a fresh record or json_patch the stored one"""
+    patch_json = json.dumps(patch, default=str)
+    now = time.time()
+    get_connection().execute(
+        "INSERT INTO progress (upload_id, data, updated_at) VALUES (?, json_patch(?, ?), ?) "
+        "ON CONFLICT(upload_id) DO UPDATE SET data = json_patch(data, ?), updated_at = ?",
+        (upload_id, json.dumps(new_progress_record()), patch_json, now, patch_json, now)
+    )
+
+
+def flush(upload_id=None):
+    """Write coalesced patches (all, or one upload's) to the shared table"""
+    with _pending_lock:
+        upload_ids = [upload_id] if upload_id is not None else list(_pending)
+        patches = [(uid, _pending.pop(uid)) for uid in upload_ids if uid in _pending]
+        for uid, patch in patches:
+            _last_flush[uid] = (time.time(), patch.get('status'))
+    for uid, patch in patches:
+        try:
+            _write(uid, patch)
+        except Exception as e:
+            logger.error(f"Progress write failed for {uid}: {e}")
+
+
+def _flusher_loop():
+    while True:
+        time.sleep(PROGRESS_FLUSH_SECONDS)
+        flush()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flusher_loop, name="progress-flusher", daemon=True)
+        _flusher.start()
+
+
+def update(upload_id, status, **fields):
+    """
+    Record a status change and partial field updates for an upload.
+
+    Status changes and terminal statuses are written straight away; repeated updates
+    within the same status are coalesced and written by the flusher thread.
+    """
+    patch = {"status": status, "timestamp": time.time()}
+    patch.update({key: value for key, value in fields.items() if key in PROGRESS_FIELDS})
+
+    with _pending_lock:
+        merge_patch(_pending.setdefault(upload_id, {}), patch)
+        last_time, last_status = _last_flush.get(upload_id, (0, None))
+        write_now = (status != last_status or status in TERMINAL_STATUSES or
+                     time.time() - last_time >= PROGRESS_FLUSH_SECONDS)
+    if write_now:
+        flush(upload_id)
+    else:
+        _ensure_flusher()
+
+    if status in TERMINAL_STATUSES:
+        with _pending_lock:
+            _last_flush.pop(upload_id, None)
+        if time.time() - _last_eviction >= PROGRESS_EVICT_INTERVAL:
+            evict()
+
+
+def get(upload_id):
+    """Current progress record (including this process's unflushed updates), or None"""
+    row = get_connection().execute("SELECT data FROM progress WHERE upload_id = ?", (upload_id,)).fetchone()
+    with _pending_lock:
+        pending = _pending.get(upload_id)
+        pending = json.loads(json.dumps(pending, default=str)) if pending else None
+    if row is None:
+        return merge_patch(new_progress_record(), pending) if pending else None
+    record = json.loads(row[0])
+    return merge_patch(record, pending) if pending else record
+
+
+def delete(upload_id):
+    with _pending_lock:
+        _pending.pop(upload_id, None)
+        _last_flush.pop(upload_id, None)
+    get_connection().execute("DELETE FROM progress WHERE upload_id = ?", (upload_id,))
+
+
+def evict(now=None):
+    """
+    Drop finished entries older than PROGRESS_TTL_SECONDS and entries with no update for
+    PROGRESS_STALE_SECONDS, then evict the oldest finished entries while the stored records
+    exceed PROGRESS_MAX_BYTES. Uploads still in progress are never evicted for size.
+    """
+    global _last_eviction
+    now = now or time.time()
+    _last_eviction = now
+    conn = get_connection()
+    terminal = "json_extract(data, '$.status') IN ('completed', 'error', 'cancelled')"
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        freed = 0
+        counts = {}
+        for reason, condition, cutoff in (("expired", terminal, now - PROGRESS_TTL_SECONDS),
+                                          ("stale", "1", now - PROGRESS_STALE_SECONDS)):
+            freed += conn.execute(
+                f"SELECT COALESCE(SUM(length(data)), 0) FROM progress WHERE {condition} AND updated_at < ?", (cutoff,)
+            ).fetchone()[0]
+            counts[reason] = conn.execute(f"DELETE FROM progress WHERE {condition} AND updated_at < ?", (cutoff,)).rowcount
+
+        total_bytes = conn.execute("SELECT COALESCE(SUM(length(data)), 0) FROM progress").fetchone()[0]
+        counts["over_budget"] = 0
+        if total_bytes > PROGRESS_MAX_BYTES:
+            candidates = conn.execute(
+                f"SELECT upload_id, length(data) FROM progress WHERE {terminal} ORDER BY updated_at"
+            ).fetchall()
+            for upload_id, size in candidates:
+                if total_bytes <= PROGRESS_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM progress WHERE upload_id = ?", (upload_id,))
+                total_bytes -= size
+                freed += size
+                counts["over_budget"] += 1
+            if total_bytes > PROGRESS_MAX_BYTES:
+                logger.warning(f"Progress store still at {total_bytes} bytes (budget {PROGRESS_MAX_BYTES}) with only active uploads left")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    for reason, count in counts.items():
+        eviction_stats[reason] += count
+    eviction_stats["bytes_freed"] += freed
+    eviction_stats["sweeps"] += 1
+    eviction_stats["last_sweep"] = now
+    if any(counts.values()):
+        logger.info(f"Evicted progress entries: {counts} ({freed} bytes)")
+    return counts
+
+
+def stats():
+    """Size of the shared progress table plus this process's eviction counters"""
+    entries, total_bytes = get_connection().execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(data)), 0) FROM progress"
+    ).fetchone()
+    with _pending_lock:
+        pending = len(_pending)
+    return {
+        "entries": entries,
+        "bytes": total_bytes,
+        "max_bytes": PROGRESS_MAX_BYTES,
+        "ttl_seconds": PROGRESS_TTL_SECONDS,
+        "pending_updates": pending,
+        "evictions": dict(eviction_stats)
+    }
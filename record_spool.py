@@ -0,0 +1,92 @@
+"""
+Record Spool
+Holds the parsed student records of one ingestion job within a memory budget. Records are
+kept in memory until their serialized size reaches the budget; everything after that is
+appended to a temporary JSONL file, so a 30k-student upload costs at most the budget in
+memory however large the PDF. Readers stream the records back in order.
+"""
+
+import os
+import json
+import tempfile
+
+# Serialized (JSON) size of parsed records one job may keep in memory
+INGEST_MEMORY_BUDGET_MB = float(os.environ.get('INGEST_MEMORY_BUDGET_MB', 32))
+INGEST_SPOOL_DIR = os.environ.get('INGEST_SPOOL_DIR') or None  # None: the system temp dir
+
+
+class RecordSpool:
+    def __init__(self, budget_bytes=None, spool_dir=None, name='records'):
+        self.budget_bytes = INGEST_MEMORY_BUDGET_MB * 1024 * 1024 if budget_bytes is None else budget_bytes
+        self.spool_dir = spool_dir or INGEST_SPOOL_DIR
+        self.name = name
+        self.memory = []
+        self.memory_bytes = 0
+        self.count = 0
+        self.spilled_count = 0
+        self.path = None
+        self._file = None
+
+    def add(self, records):
+        for record in records:
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            if self._file is None and self.memory_bytes + len(line) > self.budget_bytes:
+                fd, self.path = tempfile.mkstemp(prefix=f"{self.name}-", suffix='.jsonl', dir=self.spool_dir)
+                self._file = os.fdopen(fd, 'w', encoding='utf-8')
+            if self._file is None:
+                self.memory.append(record)
+                self.memory_bytes += len(line)
+            else:
+                self._file.write(line + '\n')
+                self.spilled_count += 1
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def iter_records(self, overrides=None):
+        """Records in the order added; overrides (student_id -> record) replace matching ones"""
+        overrides = overrides or {}
+        for record in self.memory:
+            yield overrides.get(record.get('student_id'), record)
+        if self._file is not None:
+            self._file.flush()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    yield overrides.get(record.get('student_id'), record)
+
+    def iter_batches(self, batch_size=500, overrides=None):
+        batch = []
+        for record in self.iter_records(overrides):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def stats(self):
+        return {
+            "records": self.count,
+            "memory_records": len(self.memory),
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "spilled_records": self.spilled_count,
+            "spilled": self.spilled
+        }
+
+    def close(self):
+        """Drop the records and remove the spill file"""
+        self.memory = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
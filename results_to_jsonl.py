@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Results to JSONL
+Parses result PDFs without Firebase and streams one student record per line (JSONL)
+to stdout or a file as soon as each batch is parsed. Parser logging goes to stderr so
+the output can be piped straight into other tools.
+
+Usage:
+    python results_to_jsonl.py <pdf> [<pdf> ...] [--jobs 4] [--format auto|jntuk|autonomous]
+                               [--engine jntuk|grade_column|autonomous] [--college-code B8,B9]
+                               [--branch-code 05] [--output results.jsonl]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import contextlib
+import multiprocessing
+import fitz  # PyMuPDF
+from parser import PARSER_ENGINES
+from parser.parser_jntuk import make_htno_filter
+
+FORMATS = ('auto', 'jntuk', 'autonomous')
+STREAM_BATCH_SIZE = 50
+WORKER_POLL_SECONDS = 1  # How often a waiting reader checks that the parse processes are alive
+JNTUK_KEYWORDS = ('jntuk', 'b.tech', 'btech', 'jawaharlal nehru technological university')
+
+
+def detect_format(pdf_path):
+    """Cheap JNTUK/autonomous check on the first pages' text (same keywords as batch_pdf_processor)"""
+    with fitz.open(pdf_path) as doc:
+        text = " ".join(doc[i].get_text() for i in range(min(3, len(doc)))).lower()
+    text += " " + os.path.basename(pdf_path).lower()
+    return 'jntuk' if any(keyword in text for keyword in JNTUK_KEYWORDS) else 'autonomous'
+
+
+def iter_pdf_records(pdf_path, format_type='auto', engine=None, college_codes=None, branch_codes=None):
+    """Yield batches of student records from one PDF, tagged with the source file name"""
+    if engine is None:
+        engine = detect_format(pdf_path) if format_type == 'auto' else format_type
+
+    if engine == 'autonomous':
+        # The autonomous text parser has no row filter; drop other colleges per record instead
+        htno_filter = make_htno_filter(college_codes, branch_codes)
+        batches = PARSER_ENGINES[engine](pdf_path, batch_size=STREAM_BATCH_SIZE)
+    else:
+        htno_filter = None
+        batches = PARSER_ENGINES[engine](pdf_path, batch_size=STREAM_BATCH_SIZE,
+                                         college_codes=college_codes, branch_codes=branch_codes)
+
+    source_file = os.path.basename(pdf_path)
+    for batch in batches:
+        records = [record for record in batch if not htno_filter or htno_filter(record['student_id'])]
+        for record in records:
+            record['source_file'] = source_file
+        if records:
+            yield records
+
+
+def _parse_worker(task_queue, result_queue, options):
+    """Pool process: parse PDFs from the task queue, sending each batch back as it's yielded"""
+    while True:
+        pdf_path = task_queue.get()
+        if pdf_path is None:
+            break
+        try:
+            for records in iter_pdf_records(pdf_path, **options):
+                result_queue.put(('records', pdf_path, records))
+            result_queue.put(('done', pdf_path, None))
+        except Exception as e:
+            result_queue.put(('done', pdf_path, str(e)))
+
+
+def iter_parsed_batches(pdf_paths, jobs=1, **options):
+    """
+    Yield (pdf_path, records, error) as batches come in. records is None on the final
+    item for each PDF, which carries the error message if parsing failed. Raises
+    RuntimeError if a parse process dies (OOM kill, crash in PyMuPDF) before finishing.
+    """
+    if jobs <= 1:
+        for pdf_path in pdf_paths:
+            try:
+                for records in iter_pdf_records(pdf_path, **options):
+                    yield pdf_path, records, None
+                yield pdf_path, None, None
+            except Exception as e:
+                yield pdf_path, None, str(e)
+        return
+
+    context = multiprocessing.get_context('fork')
+    task_queue = context.Queue()
+    result_queue = context.Queue()
+    for pdf_path in pdf_paths:
+        task_queue.put(pdf_path)
+    workers = [
+        context.Process(target=_parse_worker, args=(task_queue, result_queue, options), daemon=True)
+        for _ in range(min(jobs, len(pdf_paths)))
+    ]
+    for worker in workers:
+        task_queue.put(None)
+        worker.start()
+
+    remaining = len(pdf_paths)
+    finished = set()
+    try:
+        while remaining:
+            try:
+                kind, pdf_path, payload = result_queue.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                crashed = [worker.exitcode for worker in workers if worker.exitcode not in (None, 0)]
+                if crashed or not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError(f"Parse process exited with code {crashed[0] if crashed else 0} before finishing: "
+                                       f"{', '.join(os.path.basename(path) for path in pdf_paths if path not in finished)}")
+                continue
+            if kind == 'records':
+                yield pdf_path, payload, None
+            else:
+                remaining -= 1
+                finished.add(pdf_path)
+                yield pdf_path, None, payload
+    finally:
+        for worker in workers:
+            if remaining and worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+
+def write_jsonl(pdf_paths, output, jobs=1, **options):
+    """
+    Stream records for all PDFs to an open text file; returns (records, failed PDFs).
+    Parser logging (and anything else printed meanwhile, pool processes included) goes to stderr.
+    """
+    total_records = 0
+    failed = {}
+    start_time = time.time()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        for pdf_path, records, error in iter_parsed_batches(pdf_paths, jobs, **options):
+            if records is not None:
+                for record in records:
+                    output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+                total_records += len(records)
+            elif error:
+                failed[pdf_path] = error
+                print(f"❌ {os.path.basename(pdf_path)}: {error}")
+            else:
+                print(f"✅ {os.path.basename(pdf_path)} parsed")
+
+        print(f"🎯 {total_records} records from {len(pdf_paths) - len(failed)}/{len(pdf_paths)} PDFs "
+              f"in {time.time() - start_time:.2f}s")
+    return total_records, failed
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default=None):
+        if name in args:
+            index = args.index(name)
+            value = args[index + 1]
+            del args[index:index + 2]
+            return value
+        return default
+
+    jobs = int(option('--jobs', 1))
+    format_type = option('--format', 'auto')
+    engine = option('--engine')
+    college_codes = option('--college-code')
+    branch_codes = option('--branch-code')
+    output_path = option('--output') or option('-o')
+
+    if format_type not in FORMATS:
+        print(f"❌ Unknown format '{format_type}'. Must be one of {FORMATS}", file=sys.stderr)
+        sys.exit(2)
+    if engine is not None and engine not in PARSER_ENGINES:
+        print(f"❌ Unknown engine '{engine}'. Must be one of {sorted(PARSER_ENGINES)}", file=sys.stderr)
+        sys.exit(2)
+    if not args:
+        print(__doc__, file=sys.stderr)
+        sys.exit(2)
+
+    missing = [path for path in args if not os.path.isfile(path)]
+    if missing:
+        print(f"❌ PDF not found: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(2)
+
+    options = {'format_type': format_type, 'engine': engine,
+               'college_codes': college_codes, 'branch_codes': branch_codes}
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as output:
+            _, failed = write_jsonl(args, output, jobs, **options)
+    else:
+        try:
+            _, failed = write_jsonl(args, sys.stdout, jobs, **options)
+        except BrokenPipeError:
+            # Downstream tool (e.g. head) closed the pipe early
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Synthetic Results PDF Generator
+Renders JNTUK subject-per-row, CR24 grade-column and autonomous result sheets
+at arbitrary student/page counts, together with the ground truth records
+"""
+
+import os
+import sys
+import json
+import math
+import random
+import fitz  # PyMuPDF
+
+LAYOUTS = ('jntuk', 'cr24', 'autonomous')
+
+# 10-point scale printed on JNTUK/CR24 result sheets
+GRADE_POINTS = {'S': 10, 'A': 9, 'B': 8, 'C': 7, 'D': 6, 'E': 5, 'F': 0}
+GRADES = ['S', 'A', 'B', 'C', 'D', 'E', 'F']
+GRADE_WEIGHTS = [8, 16, 20, 18, 14, 10, 14]
+
+# (code, name, credits) - modelled on the R23 and CR24 sheets in the repo root
+JNTUK_SUBJECTS = [
+    ("R2321011", "PROBABILITY AND STATISTICS", 3.0),
+    ("R2321022", "ELECTRICAL MACHINES-I", 3.0),
+    ("R2321026", "MANAGERIAL ECONOMICS & FINANCIAL ANALYSI", 3.0),
+    ("R2321032", "MECHANICS OF SOLIDS", 3.0),
+    ("R2321041", "ELECTRONIC DEVICES AND CIRCUITS", 3.0),
+    ("R2321053", "PYTHON PROGRAMMING", 3.0),
+    ("R2321058", "PYTHON PROGRAMMING LAB", 1.5),
+    ("R232105L", "DATA STRUCTURES LAB", 1.5),
+    ("R2321099", "ENVIRONMENTAL SCIENCE", 0.0),
+]
+
+CR24_SUBJECTS = [
+    ("24BS1003", "Communicative English", 2.0),
+    ("24BS1107", "Engineering Chemistry", 3.0),
+    ("24BS1101", "Linear Algebra & Calculus", 3.0),
+    ("24CE1104", "Building materials and construction", 3.0),
+    ("24CS1102", "Introduction to Programming", 3.0),
+    ("24BS1004", "Communicative English Lab", 1.0),
+    ("24BS1108", "Engineering Chemistry Lab", 1.0),
+    ("24ME1003", "Engineering Workshop", 1.5),
+    ("24CS1101", "Computer Programming Lab", 1.5),
+    ("24AC1001", "Health and Wellness Yoga and Sports", 0.5),
+]
+
+BRANCH_CODES = ['01', '02', '03', '04', '05', '12', '42', '43', '44', '61']
+ENTRY_CODES = ['1A', '5A']
+YEAR_PREFIXES = ['24', '23', '22', '21', '20']
+HTNO_SERIALS = [f"{n:02d}" for n in range(1, 100)] + [
+    f"{letter}{digit}" for letter in "ABCDEFGHJKLMNPQRTUVWXYZ" for digit in range(10)
+]
+
+
+def make_htno(index, college_codes=('B8',)):
+    """Deterministic, unique HTNO for the index-th synthetic student"""
+    college = college_codes[index % len(college_codes)]
+    slot = index // len(college_codes)
+    slot, serial = divmod(slot, len(HTNO_SERIALS))
+    slot, branch = divmod(slot, len(BRANCH_CODES))
+    slot, entry = divmod(slot, len(ENTRY_CODES))
+    year = YEAR_PREFIXES[slot % len(YEAR_PREFIXES)]
+    return f"{year}{college}{ENTRY_CODES[entry]}{BRANCH_CODES[branch]}{HTNO_SERIALS[serial]}"
+
+
+def generate_students(num_students, subjects, college_codes=('B8',), seed=42):
+    """Build ground-truth student records (same shape the parsers emit)"""
+    rng = random.Random(seed)
+    students = []
+
+    for i in range(num_students):
+        student_id = make_htno(i, college_codes)
+
+        subject_grades = []
+        total_points = 0
+        total_credits = 0
+        for code, name, credits in subjects:
+            grade = rng.choices(GRADES, weights=GRADE_WEIGHTS)[0]
+            subject_grades.append({
+                "code": code,
+                "subject": name,
+                "internals": rng.randint(8, 30),
+                "grade": grade,
+                "credits": credits
+            })
+            total_points += GRADE_POINTS[grade] * credits
+            total_credits += credits
+
+        failed = any(s['grade'] == 'F' for s in subject_grades)
+        sgpa = 0.0 if failed or not total_credits else round(total_points / total_credits, 2)
+
+        students.append({
+            "student_id": student_id,
+            "sgpa": sgpa,
+            "subjectGrades": subject_grades
+        })
+
+    students.sort(key=lambda s: s['student_id'])
+    return students
+
+
+def _rows_per_page(total_rows, num_pages, default_rows):
+    if num_pages:
+        return max(1, math.ceil(total_rows / num_pages))
+    return default_rows
+
+
+def _draw_grid(page, columns, top, row_height, rows):
+    """Rule a table so pdfplumber's default 'lines' strategy finds every cell"""
+    shape = page.new_shape()
+    bottom = top + row_height * rows
+    for x in columns:
+        shape.draw_line((x, top), (x, bottom))
+    for r in range(rows + 1):
+        y = top + r * row_height
+        shape.draw_line((columns[0], y), (columns[-1], y))
+    shape.finish(color=(0, 0, 0), width=0.5)
+    shape.commit()
+
+
+def _write_row(writer, font, columns, y, row_height, cells):
+    fontsize = min(7.0, row_height * 0.7)
+    baseline = y + (row_height + fontsize) / 2 - 1
+    for x, cell in zip(columns, cells):
+        if cell:
+            writer.append((x + 2, baseline), str(cell), font=font, fontsize=fontsize)
+
+
+def _render_jntuk(doc, font, students, num_pages):
+    rows = []
+    sno = 0
+    for student in students:
+        for subject in student['subjectGrades']:
+            sno += 1
+            credits = 0 if subject['grade'] == 'F' else subject['credits']
+            rows.append([
+                sno, student['student_id'], subject['code'], subject['subject'][:40],
+                subject['internals'], subject['grade'], f"{credits:g}"
+            ])
+
+    per_page = _rows_per_page(len(rows) + 1, num_pages, 45)
+    columns = [20, 50, 120, 180, 420, 475, 525, 575]
+    top, usable = 110, 715
+    row_height = min(16.0, usable / (per_page + 1))
+    header = ['Sno', 'Htno', 'Subcode', 'Subname', 'Internals', 'Grade', 'Credits']
+
+    for start in range(0, max(len(rows), 1), per_page):
+        page = doc.new_page(width=595, height=842)
+        writer = fitz.TextWriter(page.rect)
+        writer.append((20, 40), "JAWAHARLAL NEHRU TECHNOLOGICAL UNIVERSITY KAKINADA", font=font, fontsize=10)
+        writer.append((20, 56), "Results of II B.Tech I Semester (R23) Regular Examinations, Nov-2024",
+                      font=font, fontsize=9)
+        writer.append((20, 72), "College name: SIR C R REDDY COLLEGE OF ENGINEERING:B8", font=font, fontsize=9)
+
+        page_rows = [header] + rows[start:start + per_page]
+        for r, cells in enumerate(page_rows):
+            _write_row(writer, font, columns, top + r * row_height, row_height, cells)
+        _draw_grid(page, columns, top, row_height, len(page_rows))
+        writer.write_text(page)
+
+
+def _render_cr24(doc, font, students, num_pages):
+    codes = [code for code, _, _ in CR24_SUBJECTS]
+    per_page = _rows_per_page(len(students), num_pages, 20)
+    columns = [30, 60, 130] + [130 + 58 * (i + 1) for i in range(len(codes))]
+    columns.append(columns[-1] + 45)
+    top, usable = 200, 380
+    row_height = min(18.0, usable / (per_page + 1))
+    header = ['', ''] + codes + ['SGPA']
+
+    for page_index, start in enumerate(range(0, max(len(students), 1), per_page)):
+        page = doc.new_page(width=842, height=595)
+        writer = fitz.TextWriter(page.rect)
+        writer.append((300, 30), "SIR C.R.REDDY COLLEGE OF ENGINEERING [B8]", font=font, fontsize=11)
+        writer.append((380, 44), "(AUTONOMOUS)", font=font, fontsize=9)
+        writer.append((380, 58), "Results Sheet", font=font, fontsize=9)
+        writer.append((30, 76), "Programme : I B.Tech. ( I Semester) (CR24) Regular Exam Month & Year : Dec 24 / Jan 25",
+                      font=font, fontsize=8)
+        writer.append((30, 90), "Branch :CIVIL", font=font, fontsize=8)
+        if page_index == 0:
+            for i, (code, name, _) in enumerate(CR24_SUBJECTS):
+                x = 30 if i < 5 else 420
+                y = 106 + (i % 5) * 12
+                writer.append((x, y), f"{i % 5 + 1}) {code}-{name}", font=font, fontsize=7)
+
+        page_rows = [header]
+        for offset, student in enumerate(students[start:start + per_page]):
+            grades = [s['grade'] for s in student['subjectGrades']]
+            page_rows.append([start + offset + 1, student['student_id']] + grades + [f"{student['sgpa']:.2f}"])
+        for r, cells in enumerate(page_rows):
+            _write_row(writer, font, columns, top + r * row_height, row_height, cells)
+        _draw_grid(page, columns, top, row_height, len(page_rows))
+        writer.write_text(page)
+
+
+def _render_autonomous(doc, font, students, num_pages, subjects):
+    per_page = _rows_per_page(len(students), num_pages, 50)
+    line_height = min(14.0, 700 / (per_page + 1))
+    fontsize = min(8.0, line_height * 0.75)
+
+    for page_index, start in enumerate(range(0, max(len(students), 1), per_page)):
+        page = doc.new_page(width=595, height=842)
+        writer = fitz.TextWriter(page.rect)
+        y = 40
+        if page_index == 0:
+            writer.append((30, y), "SIR C.R.REDDY COLLEGE OF ENGINEERING (AUTONOMOUS)", font=font, fontsize=10)
+            y += 14
+            writer.append((30, y), "B.Tech 1st Semester Regular Examinations Results", font=font, fontsize=9)
+            for i, (code, name, _) in enumerate(subjects, 1):
+                y += 12
+                writer.append((30, y), f"{i}) {code} - {name}", font=font, fontsize=7)
+            y += 8
+        for student in students[start:start + per_page]:
+            y += line_height
+            grades = " ".join(s['grade'] for s in student['subjectGrades'])
+            writer.append((30, y), f"{student['student_id']} {grades} {student['sgpa']:.2f}",
+                          font=font, fontsize=fontsize)
+        writer.write_text(page)
+
+
+def generate_results_pdf(output_path, layout='jntuk', num_students=100, num_pages=None,
+                         college_codes=('B8',), seed=42, write_truth=True):
+    """
+    Render a synthetic results PDF and return its ground truth.
+
+    Args:
+        output_path: Where to write the PDF
+        layout: 'jntuk' (subject per row), 'cr24' (grade columns) or 'autonomous' (plain text)
+        num_students: Number of students to render
+        num_pages: Spread the rows over exactly this many pages (default: realistic rows per page)
+        college_codes: College codes (HTNO characters 3-4) to distribute students across
+        seed: RNG seed so repeated runs render identical documents
+        write_truth: Also write <output_path>.truth.json next to the PDF
+
+    Returns:
+        Dict with layout, page count and the expected student records
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'. Must be one of {LAYOUTS}")
+
+    if layout == 'jntuk':
+        subjects = JNTUK_SUBJECTS[:6]
+    elif layout == 'cr24':
+        subjects = CR24_SUBJECTS
+    else:
+        subjects = [(code, name, 3.0) for code, name, _ in CR24_SUBJECTS[:8]]
+
+    students = generate_students(num_students, subjects, college_codes=college_codes, seed=seed)
+
+    doc = fitz.open()
+    font = fitz.Font('helv')
+    if layout == 'jntuk':
+        _render_jntuk(doc, font, students, num_pages)
+    elif layout == 'cr24':
+        _render_cr24(doc, font, students, num_pages)
+    else:
+        _render_autonomous(doc, font, students, num_pages, subjects)
+
+    page_count = len(doc)
+    doc.save(output_path, garbage=1, deflate=True)
+    doc.close()
+
+    truth = {
+        "layout": layout,
+        "pages": page_count,
+        "total_students": len(students),
+        "college_codes": list(college_codes),
+        "seed": seed,
+        "students": students
+    }
+    if write_truth:
+        with open(f"{output_path}.truth.json", 'w', encoding='utf-8') as f:
+            json.dump(truth, f, ensure_ascii=False)
+
+    return truth
+
+
+if __name__ == "__main__":
+    # Usage: python synthetic_results_pdf.py <layout> <num_students> [num_pages] [output.pdf]
+    if len(sys.argv) < 3:
+        print("Usage: python synthetic_results_pdf.py <jntuk|cr24|autonomous> <num_students> [num_pages] [output.pdf]")
+        sys.exit(1)
+
+    layout = sys.argv[1]
+    num_students = int(sys.argv[2])
+    num_pages = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3].isdigit() else None
+    output_path = sys.argv[-1] if sys.argv[-1].lower().endswith('.pdf') else f"synthetic_{layout}_{num_students}.pdf"
+
+    truth = generate_results_pdf(output_path, layout, num_students, num_pages)
+    print(f"📄 Wrote {output_path}: {truth['total_students']} students on {truth['pages']} pages")
+    print(f"🎯 Ground truth: {os.path.basename(output_path)}.truth.json")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test adaptive batch sizing between the parser and the Firestore writer
+(latency-driven sizing, parse-rate caps, backpressure and error propagation)
+"""
+
+import time
+from adaptive_batching import AdaptiveBatchController, adaptive_batches
+
+def make_chunks(chunks, chunk_size, delay=0.0):
+    for c in range(chunks):
+        if delay:
+            time.sleep(delay)
+        yield [{"student_id": f"S{c * chunk_size + i:05d}"} for i in range(chunk_size)]
+
+def test_fast_writer_grows_batches_under_backpressure():
+    print("🧪 Testing batch growth with a fast writer and a bounded queue")
+    controller = AdaptiveBatchController(50, min_size=10, max_size=500, target_seconds=0.2)
+    received = []
+    sizes = []
+    for batch in adaptive_batches(make_chunks(80, 50), controller, max_queued_records=600):
+        # Round-trip overhead dominates: bigger batches cost little more than small ones
+        seconds = 0.02 + 0.00005 * len(batch)
+        time.sleep(seconds)
+        received.extend(batch)
+        sizes.append(len(batch))
+        controller.record_commit(len(batch), seconds)
+
+    summary = controller.summary()
+    print(f"📊 Sizes: {sizes[:8]}... peak queued {summary['peak_queued_records']}")
+    assert [r["student_id"] for r in received] == [f"S{i:05d}" for i in range(4000)]
+    assert sizes[0] == 50 and max(sizes) == 500
+    assert summary["final_size"] == 500
+    assert summary["peak_queued_records"] <= 600
+    assert summary["parser_blocked_seconds"] > 0  # The writer set the pace
+    assert all(d["reason"] == "commit latency" for d in summary["decisions"])
+    print("✅ Batches grew to the Firestore limit while the queue stayed capped")
+
+def test_slow_writer_shrinks_batches():
+    print("🧪 Testing batch shrinking with a slow writer")
+    controller = AdaptiveBatchController(500, min_size=10, max_size=500, target_seconds=0.1)
+    controller.record_fill(0.0, 1000)
+    assert controller.record_commit(500, 1.0) == 250  # At most halves per step
+    controller.record_fill(0.0, 1000)
+    assert controller.record_commit(250, 0.5) == 125
+    controller.record_fill(0.0, 1000)
+    assert controller.record_commit(125, 0.25) == 62
+    print("✅ Slow commits shrink the batch size step by step")
+
+def test_slow_parser_caps_batches_at_parse_rate():
+    print("🧪 Testing batch caps when the parser is the bottleneck")
+    controller = AdaptiveBatchController(400, min_size=10, max_size=500, target_seconds=0.2)
+    sizes = []
+    for batch in adaptive_batches(make_chunks(60, 20, delay=0.02), controller):
+        controller.record_commit(len(batch), 0.001)
+        sizes.append(len(batch))
+
+    summary = controller.summary()
+    print(f"📊 Sizes: {sizes}, parse rate {summary['parse_rate']}/s")
+    assert sum(sizes) == 1200
+    assert any(d["reason"] == "parse rate" for d in summary["decisions"])
+    assert max(sizes[1:]) < 400  # Capped at what the parser produces in one commit interval
+    assert summary["writer_idle_seconds"] > 0
+    print("✅ Batch size follows the parse rate")
+
+def test_parser_errors_reach_the_writer():
+    print("🧪 Testing parser error propagation")
+    def failing_source():
+        yield [{"student_id": "S1"}]
+        raise ValueError("bad page")
+
+    controller = AdaptiveBatchController(10, min_size=1)
+    try:
+        for batch in adaptive_batches(failing_source(), controller):
+            controller.record_commit(len(batch), 0.01)
+        assert False, "Parser error was swallowed"
+    except ValueError as e:
+        assert str(e) == "bad page"
+    print("✅ Parser error re-raised in the writer")
+
+if __name__ == "__main__":
+    test_fast_writer_grows_batches_under_backpressure()
+    test_slow_writer_shrinks_batches()
+    test_slow_parser_caps_batches_at_parse_rate()
+    test_parser_errors_reach_the_writer()
+    print("\n🎉 All adaptive batching tests passed!")
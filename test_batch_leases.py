@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test lease-based coordination of batch runs across nodes
+(local processes stand in for VMs: exclusive claims, heartbeats, crash takeover)
+"""
+
+import os
+import time
+import json
+import tempfile
+import multiprocessing
+import batch_manifest
+from batch_leases import Lease, run_node, lease_status, pdf_key
+
+LEASE_SECONDS = 1.0
+MANIFEST_PATH = os.path.join(tempfile.mkdtemp(), "manifest.db")
+
+def make_pdfs(count):
+    pdf_dir = tempfile.mkdtemp()
+    paths = []
+    for i in range(count):
+        path = os.path.join(pdf_dir, f"results_{i}.pdf")
+        with open(path, 'wb') as f:
+            f.write(b"%%PDF-1.4 semester %d\n" % i)
+        paths.append(path)
+    return paths
+
+def log_processing(log_path, node_id, pdf_path):
+    # O_APPEND writes of one short line are atomic across processes
+    with open(log_path, 'a') as f:
+        f.write(json.dumps({"node": node_id, "pdf": os.path.basename(pdf_path)}) + "\n")
+
+def node_process(pdf_paths, coord_dir, log_path, node_id, crash_on=None):
+    def process_pdf(pdf_path):
+        log_processing(log_path, node_id, pdf_path)
+        if crash_on and pdf_path.endswith(crash_on):
+            os._exit(1)  # Node dies mid-file: no release, no heartbeat
+        time.sleep(LEASE_SECONDS * 1.5)  # Longer than the lease: heartbeats must keep it alive
+        return {"success": True, "total_students": 10}
+    run_node(pdf_paths, coord_dir, process_pdf, node_id, lease_seconds=LEASE_SECONDS, manifest_path=MANIFEST_PATH)
+
+def lease_keys(pdf_paths):
+    manifest = batch_manifest.get_connection(MANIFEST_PATH)
+    keys = [pdf_key(manifest, p) for p in pdf_paths]
+    manifest.close()
+    return keys
+
+def read_log(log_path):
+    with open(log_path) as f:
+        return [json.loads(line) for line in f]
+
+def test_nodes_split_pdfs_without_overlap():
+    print("🧪 Testing three nodes over one set of PDFs")
+    pdf_paths = make_pdfs(6)
+    coord_dir = tempfile.mkdtemp()
+    log_path = os.path.join(coord_dir, "processing.log")
+    nodes = [multiprocessing.Process(target=node_process, args=(pdf_paths, coord_dir, log_path, f"node{i}"))
+             for i in range(3)]
+    for node in nodes:
+        node.start()
+    for node in nodes:
+        node.join(timeout=60)
+
+    entries = read_log(log_path)
+    print(f"📊 {[(e['node'], e['pdf']) for e in entries]}")
+    assert sorted(e["pdf"] for e in entries) == sorted(os.path.basename(p) for p in pdf_paths)  # Each exactly once
+    assert len({e["node"] for e in entries}) == 3
+    assert lease_status(coord_dir, lease_keys(pdf_paths))["done"] == 6
+    assert os.listdir(os.path.join(coord_dir, "leases")) == []
+    print("✅ Every PDF processed once, spread over all nodes")
+
+def test_crashed_node_lease_is_taken_over():
+    print("🧪 Testing takeover of a crashed node's PDF")
+    pdf_paths = make_pdfs(3)
+    coord_dir = tempfile.mkdtemp()
+    log_path = os.path.join(coord_dir, "processing.log")
+
+    crashing = multiprocessing.Process(target=node_process, args=(pdf_paths, coord_dir, log_path, "crasher", "results_0.pdf"))
+    crashing.start()
+    crashing.join(timeout=30)
+    assert crashing.exitcode == 1
+    assert len(os.listdir(os.path.join(coord_dir, "leases"))) == 1  # Left behind by the dead node
+
+    survivor = multiprocessing.Process(target=node_process, args=(pdf_paths, coord_dir, log_path, "survivor"))
+    survivor.start()
+    survivor.join(timeout=60)
+
+    entries = read_log(log_path)
+    print(f"📊 {[(e['node'], e['pdf']) for e in entries]}")
+    assert [e["node"] for e in entries if e["pdf"] == "results_0.pdf"] == ["crasher", "survivor"]
+    assert lease_status(coord_dir, lease_keys(pdf_paths))["done"] == 3
+    print("✅ Expired lease taken over after the node died")
+
+def test_lease_keys_use_the_manifest_hash():
+    print("🧪 Testing that lease keys share the manifest's content hash")
+    pdf_path = make_pdfs(1)[0]
+    manifest = batch_manifest.get_connection(MANIFEST_PATH)
+    sha256 = batch_manifest.manifest_key(manifest, pdf_path, "student_results")[0]
+    assert pdf_key(manifest, pdf_path) == f"results_0_{sha256[:12]}"
+    manifest.close()
+    print("✅ Lease and manifest agree on the file's hash")
+
+def test_live_lease_is_not_stolen():
+    print("🧪 Testing that heartbeats keep a lease")
+    coord_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(coord_dir, "leases"))
+    holder = Lease(coord_dir, "results_x", "holder", lease_seconds=0.6)
+    assert holder.claim()
+    time.sleep(1.5)  # Well past the lease length, but renewed by the heartbeat
+    assert not Lease(coord_dir, "results_x", "other", lease_seconds=0.6).claim()
+    holder.release()
+    assert Lease(coord_dir, "results_x", "other", lease_seconds=0.6).claim()
+    print("✅ Live lease kept, released lease claimable")
+
+if __name__ == "__main__":
+    test_nodes_split_pdfs_without_overlap()
+    test_crashed_node_lease_is_taken_over()
+    test_lease_keys_use_the_manifest_hash()
+    test_live_lease_is_not_stolen()
+    print("\n🎉 All batch lease tests passed!")
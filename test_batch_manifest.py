@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the batch manifest that lets batch_pdf_processor.main skip already-ingested PDFs
+(content hash, parser version and collection keys, hash cache, --force)
+"""
+
+import os
+import itertools
+import tempfile
+import pytest
+import batch_manifest
+import batch_pdf_processor
+
+processed = []
+output_numbers = itertools.count(1)
+
+def fake_process_single_pdf(pdf_path, db, bucket, batch_size, **kwargs):
+    processed.append(os.path.basename(pdf_path))
+    json_path = os.path.join(os.getcwd(), f"output_{next(output_numbers)}.json")
+    with open(json_path, 'w') as f:
+        f.write("{}")
+    return {'success': True, 'total_students': 5, 'processing_time': 0.01, 'json_path': json_path}
+
+def write_pdf(name, content):
+    with open(name, 'wb') as f:
+        f.write(content)
+
+def run_main(force=False):
+    processed.clear()
+    batch_pdf_processor.main(500, force=force)
+    return sorted(processed)
+
+def test_unchanged_pdfs_are_skipped(tmp_path, monkeypatch):
+    print("🧪 Testing manifest skips, content changes, parser changes and --force")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(batch_manifest, "BATCH_MANIFEST_PATH", str(tmp_path / "manifest.db"))
+    monkeypatch.setattr(batch_manifest, "_parser_version", None)
+    monkeypatch.setattr(batch_pdf_processor, "process_single_pdf", fake_process_single_pdf)
+    monkeypatch.setattr(batch_pdf_processor, "setup_firebase", lambda: (None, None))
+    write_pdf("btech_results_1.pdf", b"%PDF-1.4 first")
+    write_pdf("btech_results_2.pdf", b"%PDF-1.4 second")
+
+    assert run_main() == ["btech_results_1.pdf", "btech_results_2.pdf"]
+    assert run_main() == []  # Nothing changed
+
+    write_pdf("btech_results_2.pdf", b"%PDF-1.4 second, corrected")
+    assert run_main() == ["btech_results_2.pdf"]
+
+    # Unchanged files are not re-hashed: size/mtime hit the hash cache
+    hashed = []
+    real_sha256 = batch_manifest.hashlib.sha256
+    with monkeypatch.context() as patch:
+        patch.setattr(batch_manifest.hashlib, "sha256", lambda *a: hashed.append(1) or real_sha256(*a))
+        assert run_main() == []
+    assert hashed == []
+
+    outputs_before = sorted(name for name in os.listdir(".") if name.endswith(".json"))
+    assert run_main(force=True) == ["btech_results_1.pdf", "btech_results_2.pdf"]
+    outputs_after = sorted(name for name in os.listdir(".") if name.endswith(".json"))
+    assert len(outputs_after) == len(outputs_before)  # Superseded outputs of the same key removed
+
+    monkeypatch.setattr(batch_manifest, "_parser_version", "new-parser")
+    assert run_main() == ["btech_results_1.pdf", "btech_results_2.pdf"]
+    print("✅ Only new or changed inputs were processed")
+
+def test_failed_outcomes_are_retried():
+    print("🧪 Testing that failed PDFs are not skipped")
+    conn = batch_manifest.get_connection(os.path.join(tempfile.mkdtemp(), "manifest.db"))
+    pdf_path = os.path.join(tempfile.mkdtemp(), "results.pdf")
+    write_pdf(pdf_path, b"%PDF-1.4 results")
+    key = batch_manifest.manifest_key(conn, pdf_path, "student_results")
+
+    batch_manifest.record(conn, key, pdf_path, {'success': False, 'error': 'boom'})
+    assert batch_manifest.lookup(conn, key)['status'] == 'failed'
+    assert batch_manifest.record(conn, key, pdf_path, {'success': True, 'json_path': 'a.json', 'total_students': 3}) is None
+    assert batch_manifest.lookup(conn, key)['status'] == 'completed'
+    assert batch_manifest.lookup(conn, key[:2] + ("other_collection",)) is None
+    print("✅ Failed outcomes reprocessed, collections kept apart")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
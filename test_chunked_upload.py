@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test resumable chunked uploads
+(offsets, resume after a dropped chunk, checksums and assembly without a copy)
+"""
+
+import os
+import hashlib
+import tempfile
+import chunked_upload
+
+def make_pdf_bytes(size):
+    return b'%PDF-1.4\n' + os.urandom(size - 9)
+
+def use_temp_dir():
+    tmp_dir = tempfile.mkdtemp()
+    chunked_upload.CHUNKED_UPLOAD_DIR = os.path.join(tmp_dir, "chunked")
+    return tmp_dir
+
+def test_resume_after_interrupted_upload():
+    print("🧪 Testing chunked upload resume")
+    tmp_dir = use_temp_dir()
+    content = make_pdf_bytes(1000)
+    session = chunked_upload.create_session("results.pdf", len(content), hashlib.sha256(content).hexdigest())
+    session_id = session["session_id"]
+
+    offset = chunked_upload.append_chunk(session_id, 0, content[:400], hashlib.sha256(content[:400]).hexdigest())
+    assert offset == 400
+
+    # Connection dropped; the client asks where to resume and retries the same chunk
+    assert chunked_upload.load_session(session_id)["offset"] == 400
+    assert chunked_upload.append_chunk(session_id, 0, content[:400]) == 400
+
+    # A chunk past the current offset is refused with the offset to resume from
+    try:
+        chunked_upload.append_chunk(session_id, 800, content[800:])
+        assert False, "Out-of-order chunk accepted"
+    except chunked_upload.ChunkedUploadError as e:
+        assert e.status_code == 409 and e.offset == 400
+
+    # Assembling before every byte arrived is refused
+    try:
+        chunked_upload.assemble(session_id, tmp_dir)
+        assert False, "Incomplete upload assembled"
+    except chunked_upload.ChunkedUploadError as e:
+        assert e.status_code == 409
+
+    chunked_upload.append_chunk(session_id, 400, content[400:])
+    part_inode = os.stat(os.path.join(chunked_upload.CHUNKED_UPLOAD_DIR, session_id, "data.part")).st_ino
+    file_path, filename = chunked_upload.assemble(session_id, tmp_dir)
+
+    with open(file_path, "rb") as f:
+        assert f.read() == content
+    assert filename == "results.pdf"
+    assert os.stat(file_path).st_ino == part_inode  # Renamed into place, not copied
+    assert chunked_upload.load_session(session_id) is None
+    print("✅ Upload resumed and assembled")
+
+def test_checksum_mismatches_are_rejected():
+    print("🧪 Testing chunk and file checksums")
+    tmp_dir = use_temp_dir()
+    content = make_pdf_bytes(500)
+
+    session_id = chunked_upload.create_session("results.pdf", len(content))["session_id"]
+    try:
+        chunked_upload.append_chunk(session_id, 0, content[:250], hashlib.sha256(b"other").hexdigest())
+        assert False, "Corrupt chunk accepted"
+    except chunked_upload.ChunkedUploadError as e:
+        assert e.status_code == 422 and e.offset == 0
+
+    session_id = chunked_upload.create_session("results.pdf", len(content), hashlib.sha256(b"other").hexdigest())["session_id"]
+    chunked_upload.append_chunk(session_id, 0, content)
+    try:
+        chunked_upload.assemble(session_id, tmp_dir)
+        assert False, "File with wrong checksum assembled"
+    except chunked_upload.ChunkedUploadError as e:
+        assert e.status_code == 422
+
+    try:
+        chunked_upload.load_session("../../etc")
+        assert False, "Path traversal accepted"
+    except chunked_upload.ChunkedUploadError as e:
+        assert e.status_code == 404
+
+    assert chunked_upload.purge_stale_sessions(max_age=-1) == 2
+    print("✅ Checksum mismatches rejected")
+
+if __name__ == "__main__":
+    test_resume_after_interrupted_upload()
+    test_checksum_mismatches_are_rejected()
+    print("\n🎉 All chunked upload tests passed!")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test delta ingestion: a corrected re-upload writes only added or changed students
+(bulk fetch per year/semester/exam type, content hashes, legacy records, diff summary)
+"""
+
+import copy
+import pytest
+import app
+import delta_ingestion
+
+def make_students(count):
+    return [{"student_id": f"20B81A{i:04d}", "semester": "Semester 1", "university": "JNTUK",
+             "upload_date": "2026-01-05", "sgpa": 8.0,
+             "subjectGrades": [{"code": "R2011", "subject": "Maths", "grade": "A", "credits": 3}]}
+            for i in range(count)]
+
+def save(fake_db, students, delta):
+    app.save_to_firebase(students, "1", ["Semester 1"], ["regular"], "jntuk", "doc", None, allow_duplicates=True, delta=delta)
+    assert app.write_journal.drain(timeout=10)
+
+def test_reupload_writes_only_changes(fake_db):
+    print("🧪 Testing a corrected re-upload in delta mode")
+    students = make_students(1200)
+    save(fake_db, students, delta_ingestion.new_delta())
+    assert fake_db.writes == 1200
+
+    corrected = copy.deepcopy(students)
+    for student in corrected[:3]:
+        student["subjectGrades"][0]["grade"] = "B"
+    for student in corrected:
+        student["upload_date"] = "2026-02-10"  # Parse date alone is not a change
+    corrected.append(make_students(1201)[-1])
+    del corrected[100]
+    before = dict(fake_db.docs)
+
+    delta = delta_ingestion.new_delta()
+    fake_db.writes = fake_db.queries = 0
+    save(fake_db, corrected, delta)
+    diff = delta_ingestion.summary(delta)
+    print(f"📊 {diff}")
+    assert fake_db.writes == diff["writes"] == 4
+    assert fake_db.queries == 1  # One bulk fetch for the (year, semester, exam type)
+    assert (diff["added"], diff["changed"], diff["unchanged"], diff["missing"]) == (1, 3, 1196, 1)
+    assert diff["sample"]["changed"] == ["20B81A0000", "20B81A0001", "20B81A0002"]
+    assert diff["sample"]["missing"] == ["20B81A0100"]
+    assert len(fake_db.docs) == 1201  # Changed students overwrote their documents
+    changed_ids = [doc_id for doc_id, data in fake_db.docs.items() if data["subjectGrades"][0]["grade"] == "B"]
+    assert len(changed_ids) == 3 and all(doc_id in before for doc_id in changed_ids)
+    print("✅ 4 writes instead of 1200")
+
+def test_records_without_content_hash_compare(fake_db):
+    print("🧪 Testing records written before delta mode")
+    students = make_students(50)
+    save(fake_db, students, None)
+    for data in fake_db.docs.values():
+        del data["contentHash"]
+        data["attempts"] = 1  # Metadata added by later merges is not content
+
+    delta = delta_ingestion.new_delta()
+    fake_db.writes = 0
+    save(fake_db, students, delta)
+    assert fake_db.writes == 0
+    assert delta_ingestion.summary(delta)["unchanged"] == 50
+    print("✅ Legacy records recognised as unchanged")
+
+def test_reverted_correction_is_written(fake_db):
+    print("🧪 Testing a re-upload that reverts a correction")
+    original = make_students(1)[0]
+    corrected = copy.deepcopy(original)
+    corrected["subjectGrades"][0]["grade"] = "B"
+    stored = {"year": "1", "year_semester": "1-1", "examType": "regular"}
+    fake_db.docs["first"] = dict(original, **stored, contentHash=delta_ingestion.content_hash(original),
+                                 uploadedAt="2026-01-05 10:00:00+00:00")
+    fake_db.docs["correction"] = dict(corrected, **stored, contentHash=delta_ingestion.content_hash(corrected),
+                                      uploadedAt="2026-02-10 10:00:00+00:00")
+
+    delta = delta_ingestion.new_delta()
+    save(fake_db, [original], delta)
+    assert delta_ingestion.summary(delta)["changed"] == 1
+    assert fake_db.docs["correction"]["subjectGrades"][0]["grade"] == "A"  # Latest record reverted
+
+    delta = delta_ingestion.new_delta()
+    fake_db.writes = 0
+    save(fake_db, [original], delta)
+    assert fake_db.writes == 0 and delta_ingestion.summary(delta)["unchanged"] == 1
+    print("✅ Reverted record written over the latest document")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
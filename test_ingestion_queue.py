@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Test the ingestion job queue and its SQLite job store
+(admission control, positions, ordering, leases, reclaim and cancellation)
+"""
+
+import os
+import time
+import tempfile
+import threading
+import pytest
+import job_store
+import ingestion
+
+@pytest.fixture
+def queue_settings(job_db, monkeypatch):
+    """Fresh job store; returns a setter for ingestion's queue settings (restored after the test)"""
+    def configure(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(ingestion, name, value)
+    return configure
+
+def test_queue_positions_rejection_and_order(queue_settings):
+    print("🧪 Testing ingestion job queue")
+    queue_settings(INGEST_WORKERS=1, MAX_RUNNING_JOBS=1, MAX_QUEUED_JOBS=2, JOB_POLL_SECONDS=0.05)
+    release = threading.Event()
+    started = threading.Event()
+    finished = []
+
+    def blocking_job(payload):
+        started.set()
+        release.wait(10)
+        finished.append(payload['name'])
+        return {"name": payload['name']}
+
+    def quick_job(payload):
+        finished.append(payload['name'])
+        return {"name": payload['name']}
+
+    ingestion.register_job_handler('blocking', blocking_job)
+    ingestion.register_job_handler('quick', quick_job)
+
+    ingestion.submit_ingestion_job('first', 'blocking', {'name': 'first'})
+    assert started.wait(5)
+    assert ingestion.queue_status('first')['state'] == 'running'
+
+    second = ingestion.submit_ingestion_job('second', 'quick', {'name': 'second'})
+    third = ingestion.submit_ingestion_job('third', 'quick', {'name': 'third'})
+    assert (second['position'], third['position']) == (1, 2)
+    assert third['eta_seconds'] >= second['eta_seconds']
+
+    try:
+        ingestion.submit_ingestion_job('fourth', 'quick', {'name': 'fourth'})
+        assert False, "queue beyond capacity should reject"
+    except ingestion.IngestionQueueFull:
+        pass
+
+    stats = ingestion.queue_stats()
+    assert stats['running'] == 1 and stats['queued'] == 2
+
+    release.set()
+    deadline = time.time() + 10
+    while job_store.get_job('third')['state'] != 'finished' and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert finished == ['first', 'second', 'third']
+    # Results are readable through a fresh connection, as another gunicorn worker would
+    results = []
+    reader = threading.Thread(target=lambda: results.append(job_store.get_job('third')['result']))
+    reader.start()
+    reader.join()
+    assert results == [{"name": "third"}]
+    print("✅ Ingestion queue test complete")
+
+def test_queue_limit_holds_under_concurrent_submits():
+    """Workers submitting at once can't push the pending count past the limit"""
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    job_store.get_connection(db_path)  # Schema in place before the race
+    created = []
+    barrier = threading.Barrier(20)
+
+    def submit(index):
+        barrier.wait()
+        if job_store.create_job(f'job-{index}', 'upload', {}, db_path=db_path, max_pending=5) is not None:
+            created.append(index)
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 5
+    assert job_store.count_jobs('pending', db_path=db_path) == 5
+
+def test_running_jobs_capped_across_workers(queue_settings):
+    """Runners in different workers share MAX_RUNNING_JOBS slots, and the ETA counts those slots"""
+    queue_settings(MAX_RUNNING_JOBS=2)
+    for name in ('a', 'b', 'c'):
+        job_store.create_job(name, 'upload', {})
+    # Each claim comes from a different process's runner, as with several gunicorn workers
+    assert job_store.claim_next_job('host:1:0', max_running=2)['job_id'] == 'a'
+    assert job_store.claim_next_job('host:2:0', max_running=2)['job_id'] == 'b'
+    assert job_store.claim_next_job('host:3:0', max_running=2) is None
+    status = ingestion.queue_status('c')
+    assert status['position'] == 1 and status['eta_seconds'] > 0  # Waits for a running job to finish
+    assert ingestion.queue_stats()['max_running'] == 2
+
+    assert job_store.finish_job('a', 'host:1:0', {})
+    assert ingestion.queue_status('c')['eta_seconds'] == 0
+    assert job_store.claim_next_job('host:3:0', max_running=2)['job_id'] == 'c'
+
+def test_streamed_parse_runs_in_parse_pool(monkeypatch):
+    print("🧪 Testing that streamed parses share the parser pool")
+    from synthetic_results_pdf import generate_results_pdf
+    pdf_path = os.path.join(tempfile.mkdtemp(), "results.pdf")
+    truth = generate_results_pdf(pdf_path, 'jntuk', num_students=60, num_pages=2, write_truth=False)
+
+    pools = []
+    original = ingestion.get_parse_pool
+    monkeypatch.setattr(ingestion, "get_parse_pool", lambda: pools.append(1) or original())
+    batches = list(ingestion.stream_pdf_batches(pdf_path, 'jntuk'))
+    # Abandoning a stream stops its task, so the pool still serves the next parse
+    stream = ingestion.stream_pdf_batches(pdf_path, 'jntuk')
+    next(stream)
+    stream.close()
+    records = ingestion.parse_pdf_in_pool(pdf_path, 'jntuk')
+    events = list(ingestion.stream_pdfs_parallel([("first", pdf_path), ("second", pdf_path)], 'jntuk'))
+    streamed = [record for kind, batch in batches if kind == 'records' for record in batch]
+    assert len(pools) == 4
+    for file_key in ("first", "second"):
+        assert [kind for key, kind, _ in events if key == file_key][-1] == 'done'
+        assert sum(len(batch) for key, kind, batch in events if key == file_key and kind == 'records') == 60
+    assert sorted(r['student_id'] for r in streamed) == sorted(s['student_id'] for s in truth['students'])
+    assert len(records) == len(streamed)
+    print(f"✅ {len(streamed)} records streamed through the pool")
+
+def test_expired_lease_is_reclaimed():
+    """A job whose worker stops heartbeating is taken over; the old owner can't finish it"""
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    job_store.create_job('stalled', 'upload', {'upload_id': 'stalled'}, db_path=db_path)
+
+    first = job_store.claim_next_job('worker-a', lease_seconds=0.05, db_path=db_path)
+    assert first['job_id'] == 'stalled' and first['attempts'] == 1
+    assert job_store.claim_next_job('worker-b', db_path=db_path) is None  # Lease still valid
+
+    time.sleep(0.1)
+    second = job_store.claim_next_job('worker-b', db_path=db_path)
+    assert second['job_id'] == 'stalled' and second['attempts'] == 2
+    assert second['lease_owner'] == 'worker-b'
+
+    assert not job_store.heartbeat('stalled', 'worker-a', db_path=db_path)
+    assert not job_store.finish_job('stalled', 'worker-a', {'stale': True}, db_path=db_path)
+    assert job_store.heartbeat('stalled', 'worker-b', db_path=db_path)
+    assert job_store.finish_job('stalled', 'worker-b', {'ok': True}, db_path=db_path)
+    assert job_store.get_job('stalled', db_path=db_path)['result'] == {'ok': True}
+
+def test_job_fails_after_max_attempts():
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    job_store.create_job('crashy', 'upload', {}, db_path=db_path)
+    for attempt in range(job_store.MAX_JOB_ATTEMPTS):
+        assert job_store.claim_next_job(f'worker-{attempt}', lease_seconds=0.01, db_path=db_path)
+        time.sleep(0.02)
+
+    assert job_store.claim_next_job('worker-last', db_path=db_path) is None
+    job = job_store.get_job('crashy', db_path=db_path)
+    assert job['state'] == 'failed' and 'lease expired' in job['error']
+
+def test_cancel_pending_and_running_jobs(queue_settings):
+    print("🧪 Testing ingestion job cancellation")
+    queue_settings(INGEST_WORKERS=1, MAX_RUNNING_JOBS=1, JOB_POLL_SECONDS=0.05)
+    started = threading.Event()
+    pages_parsed = []
+
+    def long_job(payload):
+        # Stands in for the parser loop: one cancellation check per page
+        check = ingestion.cancellation_check(payload['name'])
+        started.set()
+        for page in range(500):
+            check()
+            pages_parsed.append(page)
+            time.sleep(0.01)
+        return {"pages": len(pages_parsed)}
+
+    ingestion.register_job_handler('long', long_job)
+    ingestion.submit_ingestion_job('running-job', 'long', {'name': 'running-job'})
+    assert started.wait(5)
+    ingestion.submit_ingestion_job('waiting-job', 'long', {'name': 'waiting-job'})
+
+    assert ingestion.cancel_ingestion_job('waiting-job') == 'pending'
+    assert job_store.get_job('waiting-job')['state'] == 'cancelled'  # Never reaches a runner
+
+    assert ingestion.cancel_ingestion_job('running-job') == 'running'
+    deadline = time.time() + 5
+    while job_store.get_job('running-job')['state'] == 'running' and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert job_store.get_job('running-job')['state'] == 'cancelled'
+    assert len(pages_parsed) < 500
+    assert ingestion.queue_status('running-job') == {"state": "cancelled"}
+    assert ingestion.cancel_ingestion_job('running-job') == 'cancelled'
+    assert ingestion.cancel_ingestion_job('missing-job') is None
+    print(f"✅ Cancelled after {len(pages_parsed)} pages")
+
+def test_lost_lease_stops_job(job_db, monkeypatch):
+    print("🧪 Testing a runner whose lease was reclaimed")
+    monkeypatch.setattr(job_store, "LEASE_SECONDS", 0.3)
+    pages_parsed = []
+
+    def long_job(payload):
+        check = ingestion.cancellation_check(payload['name'])
+        for page in range(500):
+            check()
+            pages_parsed.append(page)
+            time.sleep(0.01)
+        return {"pages": len(pages_parsed)}
+
+    ingestion.register_job_handler('lease_probe', long_job)
+    job_store.create_job('reclaimed', 'lease_probe', {'name': 'reclaimed'})
+    job = job_store.claim_next_job('worker-a')
+    # Another worker takes the job over, as after worker-a missed its heartbeats
+    job_store.get_connection().execute("UPDATE jobs SET lease_owner = 'worker-b' WHERE job_id = 'reclaimed'")
+
+    assert ingestion.run_claimed_job(job, 'worker-a')
+    assert len(pages_parsed) < 500  # Stopped at a check instead of running the job a second time
+    job = job_store.get_job('reclaimed')
+    assert job['state'] == 'running' and job['lease_owner'] == 'worker-b'  # Left to the new owner
+
+    # A job that finishes after losing its lease reports that its outcome wasn't recorded
+    ingestion.register_job_handler('lease_quick', lambda payload: {"done": True})
+    job_store.create_job('quick', 'lease_quick', {})
+    job = job_store.claim_next_job('worker-a')
+    job_store.get_connection().execute("UPDATE jobs SET lease_owner = 'worker-b' WHERE job_id = 'quick'")
+    assert not ingestion.run_claimed_job(job, 'worker-a')
+    assert job_store.get_job('quick')['result'] is None
+    print(f"✅ Old owner stopped after {len(pages_parsed)} pages")
+
+def test_cancelled_upload_rolls_back_committed_batches(fake_db):
+    print("🧪 Testing rollback of a cancelled Firestore upload")
+    import app
+    commits = []
+
+    def cancel_after_two_batches():
+        commits.append(len(fake_db.docs))
+        if len(commits) > 2:
+            raise ingestion.IngestionCancelled("cancelled")
+
+    students = [{"student_id": f"20B81A05{i:02d}{i}", "semester": "Semester 1", "subjectGrades": []} for i in range(1300)]
+    committed_refs = []
+    journal_batches = []
+    try:
+        app.save_to_firebase(students, "1", ["Semester 1"], ["regular"], "jntuk", "doc", None,
+                             cancel_check=cancel_after_two_batches, committed_refs=committed_refs,
+                             journal_batches=journal_batches)
+        assert False, "Cancellation was swallowed"
+    except ingestion.IngestionCancelled:
+        pass
+    assert app.write_journal.drain(timeout=10)
+    assert len(fake_db.docs) == len(committed_refs) == 1000  # Two full batches, third never journaled
+
+    assert app.rollback_committed_students(committed_refs, batch_ids=journal_batches) == 1000
+    assert fake_db.docs == {}
+    assert app.write_journal.status()["rolled_back"] == len(journal_batches) == 2
+    print("✅ Committed batches rolled back")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
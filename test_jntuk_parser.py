@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the JNTUK parser on the sample result PDFs
+(grade-column fast path against the table path, running SGPA totals against the previous output;
+the fast path's speedup is measured by parser_benchmark.py --compare-layouts)
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from synthetic_results_pdf import generate_results_pdf
+from parser.parser_jntuk import parse_jntuk_pdf, parse_jntuk_pdf_generator, SGPA_GRADE_POINTS
+
+CR24_PDF = "1st BTech 1st Sem (CR24) Results.pdf"
+
+# SHA-256 of parse_jntuk_pdf's records (upload_date dropped) from before SGPA used running totals
+PREVIOUS_OUTPUT = {
+    "Result of I B.Tech I Semester (R19R20R23) Regular  Supplementary Examinations, Jan-2024.pdf":
+        (1539, "9e711fef9e19d4caf4903ba9f9fb2a43cebde05259b3f7c1c6d001c9e5c7170a"),
+    "Results of I B.Tech II Semester (R23R20R19R16) RegularSupplementary Examinations, July-2024.pdf":
+        (1389, "d11cc299f33664ed7322e7ca37ae10339e5ea2f03482c94c875772180d21eb7c"),
+}
+
+def parse_all(file_path, **kwargs):
+    return [record for batch in parse_jntuk_pdf_generator(file_path, **kwargs) for record in batch]
+
+def test_grade_column_engine_matches_table_path():
+    print("🧪 Testing the grade-column engine against the table path on the CR24 sample")
+    fast = parse_all(CR24_PDF)
+    table = parse_all(CR24_PDF, layout='table')
+    print(f"📊 {len(fast)} records from each path")
+    assert len(fast) == 1248
+    assert fast == table  # Same order, grades, credits and SGPA
+    print("✅ Identical output")
+
+def recomputed_sgpa(record):
+    """SGPA summed from scratch over the record's subjects"""
+    total_credits = sum(subject["credits"] for subject in record["subjectGrades"])
+    total_points = sum(SGPA_GRADE_POINTS.get(subject["grade"], 0) * subject["credits"]
+                       for subject in record["subjectGrades"])
+    return round(total_points / total_credits, 2) if total_credits > 0 else 0.0
+
+def test_running_totals_match_previous_output():
+    print("🧪 Testing running SGPA totals against the previous parser output")
+    for file_path, (expected_count, expected_digest) in PREVIOUS_OUTPUT.items():
+        records = parse_jntuk_pdf(file_path)
+        assert len(records) == expected_count
+        assert all(record["sgpa"] == recomputed_sgpa(record) for record in records)
+        for record in records:
+            record.pop("upload_date")
+        digest = hashlib.sha256(json.dumps(records, sort_keys=True).encode()).hexdigest()
+        assert digest == expected_digest, file_path
+        print(f"📊 {len(records)} records unchanged: {file_path}")
+    print("✅ Same SGPA and records as before")
+
+def test_emitted_records_are_consistent_snapshots():
+    print("🧪 Testing records emitted before a student's last row")
+    pdf_path = os.path.join(tempfile.mkdtemp(), "results.pdf")
+    generate_results_pdf(pdf_path, 'jntuk', num_students=60, num_pages=2, write_truth=False)
+    streamed, batched = [], []
+    records = parse_jntuk_pdf(pdf_path, streaming_callback=lambda record, count: streamed.append(record),
+                              batch_callback=batched.extend)
+    assert len(streamed) == len(batched) == len(records) == 60
+    # Streamed on the first row: later rows must not change the subjects behind the SGPA already sent
+    assert all(len(record["subjectGrades"]) == 1 for record in streamed)
+    assert all(record["sgpa"] == recomputed_sgpa(record) for record in streamed + batched)
+    assert all(record["subjectGrades"] is not final["subjectGrades"] for record, final in zip(batched, records))
+    print("✅ Emitted subjects and SGPA agree")
+
+if __name__ == "__main__":
+    test_grade_column_engine_matches_table_path()
+    test_running_totals_match_previous_output()
+    test_emitted_records_are_consistent_snapshots()
+    print("\n🎉 All JNTUK parser tests passed!")
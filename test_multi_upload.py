@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the multi-file upload: records of several PDFs coalesced into shared Firestore
+batches, with each file credited for the students it saved
+"""
+
+import os
+import copy
+import json
+import pytest
+import app
+import progress_store
+import record_spool
+
+def make_students(start, count):
+    return [{"student_id": f"20B81A{i:04d}", "semester": "Semester 1", "sgpa": 8.0,
+             "subjectGrades": [{"code": "R2011", "grade": "A", "credits": 3}]} for i in range(start, start + count)]
+
+def run_multi_upload(monkeypatch, parsed, upload_id, delta=False, amended=None):
+    """Run process_multi_upload_background on fake PDFs named after the keys of parsed (from work_dir)"""
+    file_entries = []
+    for name in parsed:
+        path = os.path.join("temp", name)
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4\n")
+        file_entries.append((path, name))
+
+    def fake_stream(file_keys_and_paths, *args, **kwargs):
+        # Files interleave in batches of 50, as parser processes finish students
+        streams = {key: [parsed[key][i:i + 50] for i in range(0, len(parsed[key]), 50)] for key, _ in file_keys_and_paths}
+        while streams:
+            for key in list(streams):
+                if streams[key]:
+                    yield key, 'records', copy.deepcopy(streams[key].pop(0))
+                else:
+                    del streams[key]
+                    yield key, 'done', copy.deepcopy((amended or {}).get(key, []))
+
+    monkeypatch.setattr(app, "stream_pdfs_parallel", fake_stream)
+    monkeypatch.setattr(app, "upload_pdf_to_storage", lambda path, filename: None)
+    app.process_multi_upload_background(file_entries, "jntuk", "regular", upload_id, "1", "Semester 1", delta=delta)
+    assert app.write_journal.drain(timeout=10)
+    progress = progress_store.get(upload_id)
+    assert progress["status"] == "completed", progress
+    assert all(not os.path.exists(path) for path, _ in file_entries)
+    return progress["final_result"]
+
+def load_json(final_result, index):
+    with open(os.path.join("data", final_result["json_files"][index]), encoding="utf-8") as f:
+        return json.load(f)
+
+def saved_in_json(final_result, index):
+    return load_json(final_result, index)["firebase_status"]["saved_count"]
+
+def test_files_credited_per_student(monkeypatch, fake_db, work_dir):
+    print("🧪 Testing per-file saved counts of a multi-file upload")
+    # 300 + 450 records share batches, so most batches mix both files
+    parsed = {"cse.pdf": make_students(0, 300), "ece.pdf": make_students(300, 450)}
+    result = run_multi_upload(monkeypatch, parsed, "multi_first")
+    files = result["files"]
+    print(f"📊 {[(key, files[key]['students_saved']) for key in files]}")
+    assert result["firebase"]["students_saved"] == 750 and len(fake_db.docs) == 750
+    assert files["cse.pdf"]["students_saved"] == 300 and files["ece.pdf"]["students_saved"] == 450
+    assert saved_in_json(result, 0) == 300 and saved_in_json(result, 1) == 450
+
+    # A corrected re-upload in delta mode writes (and credits) only the changed students
+    parsed["ece.pdf"][10]["subjectGrades"][0]["grade"] = "B"
+    parsed["ece.pdf"][20]["sgpa"] = 7.5
+    result = run_multi_upload(monkeypatch, parsed, "multi_delta", delta=True)
+    files = result["files"]
+    assert result["firebase"]["students_saved"] == 2
+    assert files["cse.pdf"]["students_saved"] == 0 and files["ece.pdf"]["students_saved"] == 2
+    assert saved_in_json(result, 0) == 0 and saved_in_json(result, 1) == 2
+    print("✅ Each file credited with the students it saved")
+
+def test_streamed_files_stay_within_budget(monkeypatch, fake_db, work_dir, tmp_path):
+    print("🧪 Testing a multi-file upload larger than the memory budget")
+    spool_dir = str(tmp_path / "spool")
+    os.makedirs(spool_dir)
+    monkeypatch.setattr(app, "INGEST_MEMORY_BUDGET_MB", 0.02)
+    monkeypatch.setattr(record_spool, "INGEST_SPOOL_DIR", spool_dir)
+    spool_sizes = []
+    original_add = record_spool.RecordSpool.add
+
+    def add(spool, records):
+        original_add(spool, records)
+        spool_sizes.append((len(spool.memory), spool.memory_bytes))
+    monkeypatch.setattr(record_spool.RecordSpool, "add", add)
+
+    parsed = {"cse.pdf": make_students(0, 600), "ece.pdf": make_students(600, 400)}
+    # A student whose rows continued after it was streamed is rewritten, not duplicated
+    amended = {"ece.pdf": [dict(parsed["ece.pdf"][7], sgpa=9.3)]}
+    result = run_multi_upload(monkeypatch, parsed, "multi_budget", amended=amended)
+    ece_students = load_json(result, 1)["students"]
+
+    budget_bytes = 0.02 * 1024 * 1024 / 2  # Split between the two files
+    print(f"📊 {len(spool_sizes)} batches spooled, peak {max(size for _, size in spool_sizes)} bytes in memory")
+    assert len(spool_sizes) == 20  # Spooled batch by batch, not once per file
+    assert all(size <= budget_bytes for _, size in spool_sizes)
+    assert result["firebase"]["students_saved"] == 1000 and len(fake_db.docs) == 1000
+    assert [doc["sgpa"] for doc in fake_db.docs.values()].count(9.3) == 1
+    assert len(ece_students) == 400 and ece_students[7]["sgpa"] == 9.3
+    assert os.listdir(spool_dir) == []
+    print("✅ Records spooled as they arrived, within the budget")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test parallel PDF processing in batch_pdf_processor
+(--jobs process pool, shared token-bucket write limiter, per-process JSON outputs)
+"""
+
+import os
+import time
+import multiprocessing
+import pytest
+import batch_pdf_processor
+from write_limiter import TokenBucket
+
+def take_tokens(bucket, rounds, count):
+    for _ in range(rounds):
+        bucket.acquire(count)
+
+def test_token_bucket_is_shared_across_processes():
+    print("🧪 Testing the token bucket across processes")
+    bucket = TokenBucket(rate=1000, capacity=100)
+    start = time.monotonic()
+    workers = [multiprocessing.Process(target=take_tokens, args=(bucket, 5, 100)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - start
+
+    # 1500 tokens with 100 in the bucket at the start: at least 1.4s at 1000 tokens/s
+    print(f"📊 1500 tokens in {elapsed:.2f}s, {bucket.total_waited():.2f}s waited")
+    assert elapsed >= 1.3
+    assert elapsed < 3.0
+    assert bucket.total_waited() > 0
+    print("✅ Combined rate held by one shared bucket")
+
+def fake_process_single_pdf(pdf_path, db, bucket, batch_size, write_limiter=None, **kwargs):
+    waited = write_limiter.acquire(400)
+    time.sleep(0.3)
+    return {'success': True, 'total_students': 400, 'processing_time': 0.3, 'rate_limited_seconds': waited,
+            'pid': os.getpid(), 'pdf': pdf_path}
+
+def test_parallel_pdfs_keep_order_and_share_limiter(monkeypatch):
+    print("🧪 Testing --jobs process pool")
+    # Workers are forked after the patch, so they run the fakes
+    monkeypatch.setattr(batch_pdf_processor, "process_single_pdf", fake_process_single_pdf)
+    monkeypatch.setattr(batch_pdf_processor, "setup_firebase", lambda: (None, None))
+    pdfs = [f"results_{i}.pdf" for i in range(4)]
+    start = time.monotonic()
+    results = batch_pdf_processor.process_pdfs_in_parallel(pdfs, 500, jobs=2, writes_per_second=2000)
+    elapsed = time.monotonic() - start
+
+    print(f"📊 4 PDFs in {elapsed:.2f}s on pids {sorted({r['pid'] for r in results})}")
+    assert [r['pdf'] for r in results] == pdfs
+    assert len({r['pid'] for r in results}) == 2
+    assert elapsed < 4 * 0.3 + 1.0
+    # 1600 writes at 2000/s with 500 in the bucket: the limiter made someone wait
+    assert sum(r['rate_limited_seconds'] for r in results) > 0
+    print("✅ PDFs processed in parallel within the shared write rate")
+
+def test_json_outputs_never_collide():
+    print("🧪 Testing JSON output names for PDFs started in the same second")
+    paths = [batch_pdf_processor.create_json_file_header("same.pdf", "jntuk", ["regular"], "1", ["Semester 1"])
+             for _ in range(3)]
+    try:
+        assert len(set(paths)) == 3
+    finally:
+        for path in paths:
+            os.remove(path)
+    print("✅ Each run got its own JSON file")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
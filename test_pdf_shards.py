@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test distributed shard parsing: split, several local workers, deterministic reduce
+"""
+
+import io
+import os
+import tempfile
+import contextlib
+from synthetic_results_pdf import generate_results_pdf
+from parser.parser_jntuk import parse_jntuk_pdf_generator
+from pdf_shards import split_pdf, run_local_workers, reduce_shards, shard_status, claim_shard, load_manifest
+
+def _strip_dates(records):
+    return [{k: v for k, v in record.items() if k != 'upload_date'} for record in records]
+
+def test_sharded_parse_matches_single_parse():
+    """Shards parsed by 3 workers reduce to exactly the unsplit parser output"""
+    print("🧪 Testing sharded parsing")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "synthetic_jntuk.pdf")
+        # ~7 subject rows per student over 45-row pages, so students straddle page (and shard) boundaries
+        generate_results_pdf(pdf_path, 'jntuk', num_students=40, num_pages=6, write_truth=False)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = [r for batch in parse_jntuk_pdf_generator(pdf_path, batch_size=500) for r in batch]
+
+            work_dir = os.path.join(tmp_dir, "work")
+            job_dir = split_pdf(pdf_path, work_dir, {"format": "jntuk"}, pages_per_shard=1)
+            exit_codes = run_local_workers(work_dir, 3)
+            records = reduce_shards(job_dir)
+
+        status = shard_status(job_dir)
+        print(f"   📊 {status}, {len(records)} records")
+        assert exit_codes == [0, 0, 0]
+        assert status['parsed'] == status['total'] == 6
+        assert _strip_dates(records) == _strip_dates(expected)
+
+    print("✅ Sharded parsing test complete")
+
+def test_shard_claims_are_exclusive():
+    """A claimed shard can't be claimed again, and a parsed one is never re-claimed"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "synthetic_cr24.pdf")
+        generate_results_pdf(pdf_path, 'cr24', num_students=30, num_pages=2, write_truth=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            job_dir = split_pdf(pdf_path, tmp_dir, {"format": "jntuk"}, pages_per_shard=1)
+
+        shard = load_manifest(job_dir)['shards'][0]
+        assert claim_shard(job_dir, shard, "worker-a")
+        assert not claim_shard(job_dir, shard, "worker-b")
+
+if __name__ == "__main__":
+    test_sharded_parse_matches_single_parse()
+    test_shard_claims_are_exclusive()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test the shared upload progress store
+(partial updates across workers, coalescing, read cost and the SSE progress stream)
+"""
+
+import json
+import time
+import threading
+import pytest
+import progress_store
+
+@pytest.fixture(autouse=True)
+def temp_store(progress_db, monkeypatch):
+    """Every test gets an empty progress store with a short flush interval"""
+    monkeypatch.setattr(progress_store, "PROGRESS_FLUSH_SECONDS", 0.1)
+    return progress_db
+
+def test_partial_updates_merge_across_connections():
+    print("🧪 Testing partial progress updates from several threads")
+    upload_id = "upload_merge"
+
+    progress_store.update(upload_id, "parsing", parsing={"status": "parsing", "progress": 10})
+
+    # Each thread has its own SQLite connection, like separate gunicorn workers
+    def save_file(key):
+        progress_store.update(upload_id, f"saving_{key}", files={key: {"status": "completed"}})
+
+    threads = [threading.Thread(target=save_file, args=(f"file_{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    progress_store.flush()
+
+    record = progress_store.get(upload_id)
+    assert record["parsing"] == {"status": "parsing", "progress": 10}
+    assert sorted(record["files"]) == [f"file_{i}" for i in range(8)]
+    assert record["firebase"]["students_saved"] == 0  # Untouched fields keep their defaults
+
+    progress_store.update(upload_id, "completed", final_result={"success": True}, unknown_field="ignored")
+    record = progress_store.get(upload_id)
+    assert record["status"] == "completed"
+    assert record["final_result"] == {"success": True}
+    assert "unknown_field" not in record
+
+    progress_store.delete(upload_id)
+    assert progress_store.get(upload_id) is None
+    print("✅ Partial updates merge without losing fields")
+
+def test_updates_within_a_status_are_coalesced(monkeypatch):
+    print("🧪 Testing coalescing of high-frequency updates")
+    upload_id = "upload_coalesce"
+
+    writes = []
+    original_write = progress_store._write
+    with monkeypatch.context() as spy:
+        spy.setattr(progress_store, "_write", lambda uid, patch: (writes.append(patch), original_write(uid, patch)))
+        progress_store.update(upload_id, "firebase_saving", firebase={"batches": 0})
+        for batch in range(1, 501):
+            progress_store.update(upload_id, "firebase_saving", firebase={"batches": batch, "students_saved": batch * 10})
+
+        # This process sees its own unflushed updates immediately
+        assert progress_store.get(upload_id)["firebase"]["batches"] == 500
+
+        time.sleep(progress_store.PROGRESS_FLUSH_SECONDS * 3)
+        progress_store.update(upload_id, "completed", json={"status": "completed"})
+
+    print(f"📊 501 intermediate updates took {len(writes)} writes")
+    assert len(writes) < 20
+    assert writes[-1]["status"] == "completed"
+
+    # A fresh reader (no pending state) sees the final merged record
+    progress_store._pending.clear()
+    record = progress_store.get(upload_id)
+    assert record["firebase"] == {"status": "pending", "progress": 0, "batches": 500, "students_saved": 5000}
+    assert record["json"]["status"] == "completed"
+    print("✅ Updates coalesced and flushed")
+
+def test_reads_are_cheap():
+    print("🧪 Testing progress read cost")
+    progress_store.update("upload_read", "parsing", parsing={"status": "parsing", "progress": 50})
+
+    reads = 2000
+    start = time.perf_counter()
+    for _ in range(reads):
+        progress_store.get("upload_read")
+    per_read_us = (time.perf_counter() - start) / reads * 1e6
+
+    print(f"📊 {per_read_us:.1f}µs per read")
+    assert per_read_us < 1000
+    print("✅ Reads are cheap")
+
+def test_eviction_by_ttl_and_budget(monkeypatch):
+    print("🧪 Testing progress eviction (TTL and memory budget)")
+    monkeypatch.setattr(progress_store, "PROGRESS_TTL_SECONDS", 60)
+    monkeypatch.setattr(progress_store, "PROGRESS_MAX_BYTES", 4000)
+    monkeypatch.setattr(progress_store, "PROGRESS_EVICT_INTERVAL", 3600)  # Only sweep when the test asks
+    monkeypatch.setattr(progress_store, "eviction_stats",
+                        {"sweeps": 0, "expired": 0, "stale": 0, "over_budget": 0, "bytes_freed": 0, "last_sweep": None})
+
+    progress_store.update("upload_running", "parsing", parsing={"status": "parsing"})
+    for i in range(10):
+        progress_store.update(f"upload_done_{i}", "completed", final_result={"message": "x" * 300})
+
+    # Backdate two finished uploads past the TTL; the others get increasing ages
+    conn = progress_store.get_connection()
+    conn.execute("UPDATE progress SET updated_at = updated_at - 120 WHERE upload_id IN ('upload_done_0', 'upload_done_1')")
+    for i in range(2, 10):
+        conn.execute("UPDATE progress SET updated_at = updated_at - ? WHERE upload_id = ?", (10 - i, f"upload_done_{i}"))
+
+    counts = progress_store.evict()
+    stats = progress_store.stats()
+    print(f"📊 Evicted {counts}, {stats['entries']} entries / {stats['bytes']} bytes left")
+
+    assert counts["expired"] == 2
+    assert counts["over_budget"] > 0
+    assert stats["bytes"] <= progress_store.PROGRESS_MAX_BYTES
+    assert progress_store.get("upload_running") is not None  # Active uploads are never evicted for size
+    assert progress_store.get("upload_done_9") is not None  # Newest finished entries survive
+    assert progress_store.get("upload_done_2") is None  # Oldest go first
+    assert stats["evictions"]["expired"] == 2 and stats["evictions"]["sweeps"] == 1
+    print("✅ Expired and over-budget entries evicted")
+
+def test_progress_stream_pushes_updates_then_summary():
+    print("🧪 Testing the upload progress event stream")
+    from app import app
+    upload_id = "upload_stream"
+    progress_store.update(upload_id, "parsing", parsing={"status": "parsing", "progress": 0})
+
+    def run_upload():
+        time.sleep(0.3)
+        progress_store.update(upload_id, "firebase_saving", firebase={"status": "saving", "batches": 1})
+        time.sleep(0.3)
+        progress_store.update(upload_id, "completed", final_result={"success": True, "processed_count": 2, "students": [{}, {}]})
+
+    threading.Thread(target=run_upload).start()
+    response = app.test_client().get(f"/api/upload-progress/{upload_id}/stream")
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+
+    events = [block for block in body.split("\n\n") if block.startswith("event:")]
+    names = [block.split("\n")[0].split(": ", 1)[1] for block in events]
+    print(f"📊 Events: {names}")
+    assert names[0] == "progress" and names[-1] == "summary"
+    assert any('"firebase_saving"' in block for block in events)
+
+    summary = json.loads(events[-1].split("data: ", 1)[1])
+    assert summary["status"] == "completed"
+    assert summary["result"]["processed_count"] == 2
+    assert "students" not in summary["result"]
+    print("✅ Stream pushed stage changes and a final summary")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
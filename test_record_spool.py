@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test memory-budgeted ingestion: parsed records past the job's budget spill to a
+temporary JSONL file and later stages stream them back
+"""
+
+import os
+import json
+import pytest
+import record_spool
+from record_spool import RecordSpool
+from test_upload_pipeline import make_students, run_pipeline
+
+def test_records_spill_past_budget(tmp_path):
+    print("🧪 Testing the record spool budget")
+    spool_dir = str(tmp_path)
+    students = make_students(0, 1000)
+    line_bytes = len(json.dumps(students[0]))
+    spool = RecordSpool(budget_bytes=line_bytes * 100, spool_dir=spool_dir)
+    for start in range(0, 1000, 150):
+        spool.add(students[start:start + 150])
+
+    stats = spool.stats()
+    print(f"📊 {stats}")
+    assert len(spool) == 1000 and spool.spilled
+    assert stats["memory_records"] == 100 and stats["spilled_records"] == 900
+    assert list(spool) == students  # Order kept across memory and disk
+
+    amended = dict(students[700], sgpa=9.9)
+    batches = list(spool.iter_batches(300, {amended["student_id"]: amended}))
+    assert [len(batch) for batch in batches] == [300, 300, 300, 100]
+    assert batches[2][100]["sgpa"] == 9.9
+
+    spool.close()
+    assert os.listdir(spool_dir) == []
+    print("✅ 900 of 1000 records spilled, streamed back in order")
+
+def test_upload_within_memory_budget(monkeypatch, fake_db, work_dir, progress_db, tmp_path):
+    print("🧪 Testing an upload whose records exceed the memory budget")
+    spool_dir = str(tmp_path / "spool")
+    os.makedirs(spool_dir)
+    monkeypatch.setattr(record_spool, "INGEST_MEMORY_BUDGET_MB", 0.02)
+    monkeypatch.setattr(record_spool, "INGEST_SPOOL_DIR", spool_dir)
+    batches = [make_students(i * 300, 300) for i in range(4)]
+    amended = [dict(batches[0][3], sgpa=9.4), dict(batches[3][250], sgpa=9.7)]
+    _, progress = run_pipeline(monkeypatch, fake_db, batches, amended)
+
+    assert progress["status"] == "completed", progress
+    records = progress["final_result"]["records"]
+    print(f"📊 {records}")
+    assert records["spilled"] and records["memory_mb"] <= 0.02
+    assert records["memory_records"] + records["spilled_records"] == 1200
+    assert len(fake_db.docs) == 1200
+
+    with open(os.path.join(work_dir, "data", progress["final_result"]["json_file"]), encoding="utf-8") as f:
+        json_data = json.load(f)
+    expected = [s for batch in batches for s in batch]
+    expected[3], expected[1150] = amended
+    assert json_data["students"] == expected
+    assert json_data["metadata"]["total_students"] == 1200
+    assert os.listdir(spool_dir) == []  # Spill file removed with the job
+    print("✅ Upload completed with most records on disk")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
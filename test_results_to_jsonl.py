@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the JSONL streaming CLI on synthetic PDFs
+"""
+
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import pytest
+import results_to_jsonl
+from synthetic_results_pdf import generate_results_pdf
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results_to_jsonl.py')
+
+def _run_cli(*args):
+    completed = subprocess.run([sys.executable, SCRIPT, *args], capture_output=True, text=True, timeout=300)
+    records = [json.loads(line) for line in completed.stdout.splitlines()]
+    return completed.returncode, records, completed.stderr
+
+def test_cli_streams_every_pdf_in_parallel():
+    """--jobs 2 over three PDFs: one valid JSON record per line, parser logs kept off stdout"""
+    print("🧪 Testing results_to_jsonl CLI")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        expected = {}
+        pdf_paths = []
+        for layout in ('jntuk', 'cr24', 'autonomous'):
+            pdf_path = os.path.join(tmp_dir, f"synthetic_{layout}.pdf")
+            truth = generate_results_pdf(pdf_path, layout, num_students=20, num_pages=2, write_truth=False)
+            expected[os.path.basename(pdf_path)] = {s['student_id'] for s in truth['students']}
+            pdf_paths.append(pdf_path)
+
+        # Synthetic files carry no university keywords, so pick the format per layout explicitly
+        returncode, records, stderr = _run_cli(pdf_paths[0], pdf_paths[1], '--format', 'jntuk', '--jobs', '2')
+        assert returncode == 0, stderr
+        for name in ('synthetic_jntuk.pdf', 'synthetic_cr24.pdf'):
+            parsed = {r['student_id'] for r in records if r['source_file'] == name}
+            assert parsed == expected[name], name
+
+        returncode, records, stderr = _run_cli(pdf_paths[2], '--engine', 'autonomous')
+        assert returncode == 0, stderr
+        assert {r['student_id'] for r in records} == expected['synthetic_autonomous.pdf']
+        print(f"   ✅ {len(records)} autonomous records streamed")
+
+def test_cli_college_code_filter_and_output_file():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "colleges.pdf")
+        truth = generate_results_pdf(pdf_path, 'jntuk', num_students=20, num_pages=2,
+                                     college_codes=('B8', 'B9'), write_truth=False)
+        output_path = os.path.join(tmp_dir, "out.jsonl")
+
+        returncode, stdout_records, stderr = _run_cli(pdf_path, '--format', 'jntuk', '--college-code', 'B9',
+                                                      '--output', output_path)
+        assert returncode == 0, stderr
+        assert stdout_records == []
+        with open(output_path, encoding='utf-8') as f:
+            parsed = {json.loads(line)['student_id'] for line in f}
+        assert parsed == {s['student_id'] for s in truth['students'] if s['student_id'][2:4] == 'B9'}
+
+def test_cli_reports_missing_pdf():
+    returncode, records, stderr = _run_cli('does_not_exist.pdf')
+    assert returncode == 2 and not records and 'not found' in stderr
+
+def test_dead_parse_process_raises_instead_of_hanging(monkeypatch):
+    print("🧪 Testing that a crashed parse process is reported")
+    def crashing_records(pdf_path, **options):
+        if pdf_path == "crash.pdf":
+            os._exit(137)  # Like an OOM kill: no 'done' message ever arrives
+        yield [{"student_id": "1", "source_file": pdf_path}]
+    monkeypatch.setattr(results_to_jsonl, "iter_pdf_records", crashing_records)
+
+    with pytest.raises(RuntimeError, match="exited with code 137.*crash.pdf"):
+        list(results_to_jsonl.iter_parsed_batches(["ok.pdf", "crash.pdf"], jobs=2))
+    print("✅ Crash raised instead of blocking forever")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
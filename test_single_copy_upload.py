@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the single-copy upload path: the request body is written to temp/ once, validated
+and parsed from that file and streamed from it to Cloud Storage
+"""
+
+import os
+import hashlib
+import tempfile
+import tracemalloc
+import pytest
+import app
+from werkzeug.datastructures import FileStorage
+from werkzeug.test import EnvironBuilder
+
+PDF_MB = 20
+
+def post_pdf(content, filename="results.pdf"):
+    """Run one /upload-pdf request through the WSGI app; returns (status, peak traced bytes, body)"""
+    builder = EnvironBuilder(path="/upload-pdf", method="POST", headers={"X-API-Key": "my-very-secret-admin-api-key"},
+                             data={"pdf": (tempfile.SpooledTemporaryFile(), filename), "format": "jntuk", "exam_type": "regular"})
+    builder.files["pdf"].stream.write(content)
+    builder.files["pdf"].stream.seek(0)
+    environ = builder.get_environ()  # The client's copy of the body, built before tracing
+    statuses = []
+    tracemalloc.start()
+    try:
+        body = b"".join(app.app.wsgi_app(environ, lambda status, headers: statuses.append(status)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statuses[0], peak, body
+
+def test_upload_written_once_and_shared(monkeypatch, work_dir):
+    print("🧪 Testing a large upload through /upload-pdf")
+    content = b"%PDF-1.4\n" + os.urandom(PDF_MB * 1024 * 1024)
+    expected = hashlib.sha256(content).digest()
+    seen = {}
+
+    def fake_parse(file_path, **kwargs):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        seen["parsed"] = (file_path, digest.digest() == expected)
+        return [{"student_id": "20B81A0501", "semester": "Semester 1", "sgpa": 8.0, "subjectGrades": []}]
+
+    def fake_storage(file, filename):
+        seen["stored"] = file
+        return "https://storage.example/" + filename
+
+    def no_second_copy(*args, **kwargs):
+        raise AssertionError("Upload copied a second time")
+
+    monkeypatch.setattr(app, "parse_jntuk_pdf", fake_parse)
+    monkeypatch.setattr(app, "upload_pdf_to_storage", fake_storage)
+    monkeypatch.setattr(FileStorage, "save", no_second_copy)
+    status, peak, _ = post_pdf(content)
+
+    print(f"📊 {status}, peak traced memory {peak / 1024 / 1024:.1f}MB for a {PDF_MB}MB PDF")
+    assert status.startswith("200"), status
+    path, identical = seen["parsed"]
+    assert identical and os.path.dirname(path) == os.path.abspath("temp")
+    assert seen["stored"] == path  # Storage streams the parsed file itself
+    assert peak < 4 * 1024 * 1024
+    assert os.listdir("temp") == []
+    print("✅ One copy on disk, shared by validation, parsing and storage")
+
+def test_rejected_upload_leaves_nothing(work_dir):
+    print("🧪 Testing a rejected upload")
+    status, _, body = post_pdf(b"not a pdf" * 100)
+    assert status.startswith("400") and b"Invalid PDF file format" in body
+    status, _, _ = post_pdf(b"%PDF-1.4\n" + b"0" * 1000, filename="results.txt")
+    assert status.startswith("400")
+    assert os.listdir("temp") == []
+    print("✅ Rejected uploads removed from temp/")
+
+def test_storage_streams_from_file(monkeypatch):
+    print("🧪 Testing chunked storage upload from a path")
+    calls = []
+
+    class FakeBlob:
+        public_url = "https://storage.example/pdfs/results.pdf"
+        def __init__(self, name, chunk_size=None):
+            calls.append(("blob", chunk_size))
+        def upload_from_filename(self, path, content_type=None):
+            calls.append(("filename", path))
+        def upload_from_file(self, file, rewind=False, content_type=None):
+            calls.append(("file", rewind))
+        def make_public(self):
+            pass
+
+    class FakeBucket:
+        def blob(self, name, chunk_size=None):
+            return FakeBlob(name, chunk_size)
+
+    monkeypatch.setattr(app, "bucket", FakeBucket())
+    monkeypatch.setattr(app, "FIREBASE_AVAILABLE", True)
+    assert app.upload_pdf_to_storage("/tmp/results.pdf", "pdfs/results.pdf") == FakeBlob.public_url
+    with tempfile.TemporaryFile() as f:
+        app.upload_pdf_to_storage(f, "pdfs/results.pdf")
+    assert calls == [("blob", app.STORAGE_CHUNK_BYTES), ("filename", "/tmp/results.pdf"),
+                     ("blob", app.STORAGE_CHUNK_BYTES), ("file", True)]
+    print("✅ Storage uploads stream in chunks")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test the synthetic results PDF generator against the real parsers
+"""
+
+import os
+import tempfile
+from synthetic_results_pdf import generate_results_pdf, LAYOUTS
+from parser_benchmark import benchmark_pdf, DEFAULT_ENGINE_FOR_LAYOUT
+from parser.parser_jntuk import parse_jntuk_pdf, parse_jntuk_pdf_generator
+
+def test_synthetic_layouts_parse_to_ground_truth():
+    """Every layout should round-trip through its production parser"""
+    print("🧪 Testing synthetic PDF generator")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for layout in LAYOUTS:
+            pdf_path = os.path.join(tmp_dir, f"synthetic_{layout}.pdf")
+            truth = generate_results_pdf(pdf_path, layout, num_students=30, num_pages=2)
+
+            assert truth['pages'] == 2, f"{layout}: expected 2 pages, got {truth['pages']}"
+            assert os.path.exists(f"{pdf_path}.truth.json")
+            assert len({s['student_id'] for s in truth['students']}) == 30
+
+            result = benchmark_pdf(pdf_path, DEFAULT_ENGINE_FOR_LAYOUT[layout], truth=truth)
+            accuracy = result['accuracy']
+            print(f"   📄 {layout}: {result['students']} students, recall {accuracy['recall']:.0%}, "
+                  f"grades {accuracy['grade_accuracy']:.0%}, {result['parse_time']:.2f}s")
+
+            assert accuracy['recall'] == 1.0, f"{layout}: missed students {accuracy}"
+            assert accuracy['grade_accuracy'] == 1.0, f"{layout}: grade mismatch {accuracy}"
+
+    print("✅ Synthetic PDF test complete")
+
+def test_generator_is_deterministic():
+    """Same seed must render the same ground truth"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        first = generate_results_pdf(os.path.join(tmp_dir, "a.pdf"), 'cr24', 50, write_truth=False)
+        second = generate_results_pdf(os.path.join(tmp_dir, "b.pdf"), 'cr24', 50, write_truth=False)
+        assert first['students'] == second['students']
+
+def test_college_code_filter_keeps_only_matching_htnos():
+    """Rows from other colleges/branches are dropped by both JNTUK parsers"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for layout in ('jntuk', 'cr24'):
+            pdf_path = os.path.join(tmp_dir, f"colleges_{layout}.pdf")
+            truth = generate_results_pdf(pdf_path, layout, num_students=40, num_pages=2,
+                                         college_codes=('B8', 'B9'), write_truth=False)
+            expected = {s['student_id'] for s in truth['students'] if s['student_id'][2:4] == 'B9'}
+            assert expected and len(expected) < len(truth['students'])
+
+            batches = parse_jntuk_pdf_generator(pdf_path, batch_size=500, college_codes='B9')
+            parsed = {record['student_id'] for batch in batches for record in batch}
+            assert parsed == expected, f"{layout}: {sorted(parsed ^ expected)}"
+
+        # Branch filter on the real-time parser
+        pdf_path = os.path.join(tmp_dir, "branches.pdf")
+        truth = generate_results_pdf(pdf_path, 'jntuk', num_students=40, num_pages=2, write_truth=False)
+        branch = truth['students'][0]['student_id'][6:8]
+        expected = {s['student_id'] for s in truth['students'] if s['student_id'][6:8] == branch}
+        parsed = {record['student_id'] for record in parse_jntuk_pdf(pdf_path, branch_codes={branch})}
+        assert parsed == expected
+
+if __name__ == "__main__":
+    test_synthetic_layouts_parse_to_ground_truth()
+    test_generator_is_deterministic()
+    test_college_code_filter_keeps_only_matching_htnos()
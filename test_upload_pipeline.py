@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test the staged single-file upload pipeline
+(storage, parsing, Firestore writes and JSON output overlapping, with stage timings)
+"""
+
+import os
+import json
+import time
+import pytest
+import app
+import progress_store
+
+STORAGE_SECONDS = 1.0
+BATCH_SECONDS = 0.2
+COMMIT_SECONDS = 0.1
+
+def make_students(start, count):
+    return [{"student_id": f"20B81A{i:04d}", "semester": "Semester 1", "sgpa": 8.0,
+             "subjectGrades": [{"code": "R2011", "grade": "A"}]} for i in range(start, start + count)]
+
+def run_pipeline(monkeypatch, fake_db, batches, amended=None):
+    """Run process_upload_background from the current (work) directory; returns (elapsed, progress)"""
+    file_path = os.path.abspath("upload.pdf")
+    with open(file_path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+
+    def slow_storage(path, filename):
+        with open(path, "rb") as f:
+            assert f.read(5) == b"%PDF-"
+        time.sleep(STORAGE_SECONDS)
+        return f"https://storage.example/{filename}"
+
+    def fake_stream(*args, **kwargs):
+        for batch in batches:
+            time.sleep(BATCH_SECONDS)
+            yield 'records', batch
+        if amended:
+            yield 'amended', amended
+
+    fake_db.commit_seconds = COMMIT_SECONDS
+    monkeypatch.setattr(app, "upload_pdf_to_storage", slow_storage)
+    monkeypatch.setattr(app, "stream_pdf_batches", fake_stream)
+    start = time.time()
+    app.process_upload_background(file_path, "jntuk", "regular", "results.pdf", "upload_pipeline", "1", "Semester 1")
+    elapsed = time.time() - start
+
+    assert not os.path.exists(file_path)
+    return elapsed, progress_store.get("upload_pipeline")
+
+def test_stages_overlap(monkeypatch, fake_db, work_dir, progress_db):
+    print("🧪 Testing overlapped upload stages")
+    batches = [make_students(i * 300, 300) for i in range(5)]
+    elapsed, progress = run_pipeline(monkeypatch, fake_db, batches)
+
+    assert progress["status"] == "completed", progress
+    stages = progress["final_result"]["stages"]
+    print(f"📊 {elapsed:.2f}s total, stages: {stages}")
+
+    # Run one after another the stages would take storage + parsing + every commit
+    sequential = STORAGE_SECONDS + len(batches) * BATCH_SECONDS + 3 * COMMIT_SECONDS
+    assert elapsed < sequential - 0.5
+    assert stages["storage"]["started"] < stages["parsing"]["seconds"]
+    assert stages["firebase"]["started"] < stages["parsing"]["seconds"]
+    assert progress["stages"] == stages
+
+    with open(os.path.join(work_dir, "data", progress["final_result"]["json_file"]), encoding="utf-8") as f:
+        json_data = json.load(f)
+    assert json_data["students"] == [s for batch in batches for s in batch]
+    assert json_data["firebase_status"]["saved_count"] == 1500
+    assert json_data["cloud_storage"]["uploaded"]
+    assert len(fake_db.docs) == 1500
+    assert not [name for name in os.listdir(os.path.join(work_dir, "data")) if name.endswith(".partial")]
+    print("✅ Stages overlapped and outputs are complete")
+
+def test_amended_students_are_rewritten(monkeypatch, fake_db, work_dir, progress_db):
+    print("🧪 Testing students amended after they were streamed")
+    batches = [make_students(0, 600), make_students(600, 10)]
+    amended = [dict(batches[0][5], sgpa=9.1)]
+    elapsed, progress = run_pipeline(monkeypatch, fake_db, batches, amended)
+
+    assert progress["status"] == "completed", progress
+    assert progress["final_result"]["firebase"]["students_saved"] == 610
+    assert len(fake_db.docs) == 610  # Rewritten in place, not duplicated
+    assert 9.1 in [doc.get("sgpa") for doc in fake_db.docs.values()]
+
+    with open(os.path.join(work_dir, "data", progress["final_result"]["json_file"]), encoding="utf-8") as f:
+        students = json.load(f)["students"]
+    assert len(students) == 610 and students[5]["sgpa"] == 9.1
+    print("✅ Amended students rewritten in Firestore and JSON")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
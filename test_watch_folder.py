@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test the watch-folder ingestion daemon
+(stability wait, hash deduplication through the batch manifest, bounded workers,
+inotify and polling)
+"""
+
+import os
+import time
+import tempfile
+import threading
+import pytest
+from concurrent.futures import Future, ThreadPoolExecutor
+import batch_manifest
+from watch_folder import WatchFolder
+
+def run_daemon(use_inotify):
+    drop_dir = tempfile.mkdtemp()
+    handled = []
+    active = [0, 0]  # current, peak
+    lock = threading.Lock()
+
+    def handler(path):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        with open(path, 'rb') as f:
+            content = f.read()
+        time.sleep(0.3)
+        with lock:
+            active[0] -= 1
+            handled.append((os.path.basename(path), content))
+        if b"broken" in content:
+            return {"success": False, "error": "No students found"}
+        return {"success": True, "total_students": 1}
+
+    daemon = WatchFolder(drop_dir, handler, workers=2, executor=ThreadPoolExecutor(max_workers=2),
+                         stable_seconds=0.5, poll_seconds=0.2, use_inotify=use_inotify,
+                         manifest_path=os.path.join(tempfile.mkdtemp(), "manifest.db"))
+    stop = threading.Event()
+    thread = threading.Thread(target=daemon.run, args=(stop,))
+    thread.start()
+
+    # A slow copy: the file keeps growing and must not be picked up half-written
+    with open(os.path.join(drop_dir, "slow.pdf"), 'wb') as f:
+        for part in range(4):
+            f.write(b"%%PDF-1.4 slow part %d\n" % part)
+            f.flush()
+            time.sleep(0.3)
+    for i in range(3):
+        with open(os.path.join(drop_dir, f"result_{i}.pdf"), 'wb') as f:
+            f.write(b"%%PDF-1.4 results %d\n" % i)
+    with open(os.path.join(drop_dir, "broken.pdf"), 'wb') as f:
+        f.write(b"%PDF-1.4 broken\n")
+    with open(os.path.join(drop_dir, "notes.txt"), 'w') as f:
+        f.write("ignored")
+
+    deadline = time.time() + 15
+    while time.time() < deadline and len(handled) < 5:
+        time.sleep(0.1)
+    time.sleep(0.5)
+
+    # The same content dropped again under another name is not ingested twice
+    with open(os.path.join(drop_dir, "result_0_copy.pdf"), 'wb') as f:
+        f.write(b"%PDF-1.4 results 0\n")
+    deadline = time.time() + 10
+    while time.time() < deadline and daemon.stats["duplicates"] < 1:
+        time.sleep(0.1)
+    stop.set()
+    thread.join()
+    return drop_dir, handled, active[1], daemon.stats
+
+def check_run(use_inotify):
+    drop_dir, handled, peak, stats = run_daemon(use_inotify)
+    print(f"📊 Stats {stats}, peak concurrency {peak}")
+    names = sorted(name for name, _ in handled)
+    assert names == ["broken.pdf", "result_0.pdf", "result_1.pdf", "result_2.pdf", "slow.pdf"]
+    slow = dict(handled)["slow.pdf"]
+    assert slow.count(b"slow part") == 4  # Only read after the copy finished
+    assert peak <= 2
+    assert stats == {"ingested": 4, "failed": 1, "duplicates": 1}
+    assert sorted(os.listdir(os.path.join(drop_dir, "done"))) == ["result_0.pdf", "result_1.pdf", "result_2.pdf", "slow.pdf"]
+    assert os.listdir(os.path.join(drop_dir, "failed")) == ["broken.pdf"]
+    assert os.listdir(os.path.join(drop_dir, "duplicates")) == ["result_0_copy.pdf"]
+    assert os.path.exists(os.path.join(drop_dir, "notes.txt"))
+
+def test_watch_folder_with_inotify():
+    print("🧪 Testing watch folder (inotify)")
+    check_run(use_inotify=True)
+    print("✅ Dropped PDFs ingested once each")
+
+def test_watch_folder_with_polling():
+    print("🧪 Testing watch folder (polling fallback)")
+    check_run(use_inotify=False)
+    print("✅ Dropped PDFs ingested once each")
+
+class PendingExecutor:
+    """Executor whose submitted files never finish, so they stay in flight"""
+    def submit(self, fn, *args):
+        return Future()
+
+def test_waiting_files_are_hashed_once(monkeypatch):
+    print("🧪 Testing that stable files are not re-hashed on every poll")
+    drop_dir = tempfile.mkdtemp()
+    manifest_path = os.path.join(tempfile.mkdtemp(), "manifest.db")
+    for name in ("a.pdf", "a_copy.pdf"):
+        with open(os.path.join(drop_dir, name), 'wb') as f:
+            f.write(b"%PDF-1.4 same content\n")
+    daemon = WatchFolder(drop_dir, None, workers=2, executor=PendingExecutor(), stable_seconds=1,
+                         use_inotify=False, manifest_path=manifest_path)
+    hashed = []
+    real_sha256 = batch_manifest.hashlib.sha256
+    monkeypatch.setattr(batch_manifest.hashlib, "sha256", lambda *a: hashed.append(1) or real_sha256(*a))
+    daemon.scan()
+    now = time.time()
+    daemon.dispatch(now)  # First sighting: not stable yet
+    for poll in range(5):
+        daemon.dispatch(now + 10 + poll)
+    assert len(daemon.in_flight) == 1
+    assert len(daemon.candidates) == 1  # The twin waits for the first copy to finish
+    assert len(hashed) == 2  # Once per file, not once per poll
+    daemon.manifest.close()
+    print("✅ Waiting duplicate hashed once")
+
+def test_batch_run_outcomes_are_recognised():
+    print("🧪 Testing that PDFs ingested by a batch run count as duplicates")
+    drop_dir = tempfile.mkdtemp()
+    manifest_path = os.path.join(tempfile.mkdtemp(), "manifest.db")
+    path = os.path.join(drop_dir, "results.pdf")
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4 ingested by batch_pdf_processor\n")
+    manifest = batch_manifest.get_connection(manifest_path)
+    batch_manifest.record(manifest, batch_manifest.manifest_key(manifest, path, "student_results"), path,
+                          {"success": True, "total_students": 3})
+    manifest.close()
+
+    daemon = WatchFolder(drop_dir, None, executor=PendingExecutor(), stable_seconds=1,
+                         use_inotify=False, manifest_path=manifest_path)
+    daemon.scan()
+    now = time.time()
+    daemon.dispatch(now)
+    daemon.dispatch(now + 10)
+    assert daemon.in_flight == {}
+    assert daemon.stats["duplicates"] == 1
+    assert os.listdir(os.path.join(drop_dir, "duplicates")) == ["results.pdf"]
+    daemon.manifest.close()
+    print("✅ Batch-run outcome shared with the watch folder")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
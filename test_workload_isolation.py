@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test workload isolation between request handling and bulk ingestion
+(capped bulk Firestore calls, jobs in a lower-priority ingestion process)
+"""
+
+import os
+import time
+import signal
+import threading
+import pytest
+import job_store
+import ingestion
+import ingestion_process
+from firestore_gate import FirestoreGate
+
+def probe_job(payload):
+    return {"pid": os.getpid(), "nice": os.nice(0)}
+
+ingestion.register_job_handler('isolation_probe', probe_job)
+
+def test_bulk_calls_are_capped():
+    print("🧪 Testing the cap on ingestion's Firestore calls")
+    gate = FirestoreGate(limit=3)
+    peak = {"bulk": 0}
+    lock = threading.Lock()
+
+    def bulk_call():
+        with gate.bulk():
+            with lock:
+                peak["bulk"] = max(peak["bulk"], gate.in_flight)
+            time.sleep(0.2)
+
+    threads = [threading.Thread(target=bulk_call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    assert gate.stats()["waiting"] == 5
+    for thread in threads:
+        thread.join()
+    print(f"📊 Peak bulk calls {peak['bulk']}, {gate.stats()}")
+    assert peak["bulk"] == 3 and gate.stats()["in_flight"] == 0
+    print("✅ Bulk calls held to the cap")
+
+def test_jobs_run_in_lower_priority_process(tmp_path, monkeypatch):
+    print("🧪 Testing the dedicated ingestion process")
+    store_path = str(tmp_path / "jobs.db")
+    lock_path = str(tmp_path / "ingest_process.lock")
+    monkeypatch.setattr(ingestion_process, "INGEST_PROCESS_LOCK", lock_path)
+    # The ingestion process reads its job store and lock from the environment it inherits
+    monkeypatch.setenv("JOB_STORE_PATH", store_path)
+    monkeypatch.setenv("INGEST_PROCESS_LOCK", lock_path)
+    assert ingestion_process.running_pid() is None
+    pid = ingestion_process.ensure_running('test_workload_isolation', master_pid=os.getpid())
+    try:
+        deadline = time.time() + 30
+        while ingestion_process.running_pid() != pid and time.time() < deadline:
+            time.sleep(0.1)
+        job_store.create_job('probe-1', 'isolation_probe', {}, db_path=store_path)
+        deadline = time.time() + 60
+        while time.time() < deadline and not job_store.get_job('probe-1', db_path=store_path)['result']:
+            time.sleep(0.2)
+        result = job_store.get_job('probe-1', db_path=store_path)['result']
+        print(f"📊 Job ran in pid {result['pid']} at nice {result['nice']} (test process {os.getpid()} at nice {os.nice(0)})")
+        assert result['pid'] == pid == ingestion_process.running_pid()
+        assert result['nice'] >= min(19, ingestion.INGEST_NICE)
+        assert ingestion_process.ensure_running('test_workload_isolation', master_pid=os.getpid()) == pid  # One per host
+    finally:
+        os.kill(pid, signal.SIGTERM)
+    print("✅ Job ran outside the test process at lower priority")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
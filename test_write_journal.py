@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test the write-ahead journal in front of Firestore batch commits
+(retries, crash replay, SERVER_TIMESTAMP round trip, appends not waiting on commits)
+"""
+
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+import pytest
+from firebase_admin import firestore
+import write_journal
+from write_journal import WriteJournal
+
+write_journal.JOURNAL_RETRY_SECONDS = 0.05
+
+class FakeFirestore:
+    """Applies committed batches to a dict; fails the first `failures` commits"""
+    def __init__(self, failures=0, commit_seconds=0):
+        self.docs = {}
+        self.failures = failures
+        self.commit_seconds = commit_seconds
+        self.attempts = 0
+    def commit(self, writes):
+        self.attempts += 1
+        time.sleep(self.commit_seconds)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("503 Service Unavailable")
+        for op, collection, doc_id, data in writes:
+            if op == 'delete':
+                self.docs.pop(doc_id, None)
+            else:
+                self.docs[doc_id] = data
+
+def student_writes(start, count):
+    return [('set', 'student_results', f"20B81A{i:04d}", {"student_id": f"20B81A{i:04d}", "sgpa": 8.0})
+            for i in range(start, start + count)]
+
+def test_failed_commits_are_retried():
+    print("🧪 Testing retries of a transient Firestore error")
+    store = FakeFirestore(failures=3)
+    journal = WriteJournal(store.commit, tempfile.mkdtemp())
+    batch_id = journal.append(student_writes(0, 500))
+    assert journal.wait([batch_id], timeout=10)
+    assert len(store.docs) == 500
+    assert store.attempts == 4
+    assert journal.status()["retries"] == 3
+    print("✅ Batch committed after 3 failed attempts")
+
+def test_stalled_batch_retried_in_document_order(monkeypatch):
+    print("🧪 Testing a batch that fails more than JOURNAL_MAX_ATTEMPTS times")
+    monkeypatch.setattr(write_journal, "JOURNAL_MAX_RETRY_SECONDS", 0.05)
+    monkeypatch.setattr(write_journal, "JOURNAL_STALLED_RETRY_SECONDS", 0.5)
+    store = FakeFirestore()
+    failing = {"left": 9}
+
+    def commit(writes):
+        if any(doc_id == "20B81A0000" for _, _, doc_id, _ in writes) and failing["left"] > 0:
+            failing["left"] -= 1
+            raise ConnectionError("503 Service Unavailable")
+        store.commit(writes)
+
+    journal = WriteJournal(commit, tempfile.mkdtemp())
+    first = journal.append([('set', 'student_results', "20B81A0000", {"sgpa": 7.0})])
+    other = journal.append(student_writes(1, 10))
+    newer = journal.append([('set', 'student_results', "20B81A0000", {"sgpa": 9.0})])
+
+    start = time.time()
+    assert not journal.wait([first], timeout=10)  # Returns as soon as it stalls
+    assert time.time() - start < 5
+    assert journal.wait([other], timeout=10)  # Other documents keep flowing
+    assert "20B81A0000" not in store.docs  # The newer write waits behind the stalled one
+
+    deadline = time.time() + 10
+    while newer not in journal.committed and time.time() < deadline:
+        time.sleep(0.05)
+    status = journal.status()
+    print(f"📊 {status}")
+    assert first in journal.committed and newer in journal.committed
+    assert store.docs["20B81A0000"] == {"sgpa": 9.0}
+    assert status["stalled_batches"] == 0 and journal._open_batches == 0
+    print("✅ Stalled batch committed later, before the newer write to its document")
+
+def crashing_process(journal_dir):
+    journal = WriteJournal(lambda writes: time.sleep(60), journal_dir)  # Firestore never answers
+    journal.append(student_writes(0, 500))
+    journal.append(student_writes(500, 200))
+    os._exit(1)  # Crash with both batches journaled but uncommitted
+
+def test_uncommitted_batches_replayed_after_crash():
+    print("🧪 Testing replay of a crashed process's journal")
+    journal_dir = tempfile.mkdtemp()
+    crashed = multiprocessing.Process(target=crashing_process, args=(journal_dir,))
+    crashed.start()
+    crashed.join(timeout=30)
+    assert crashed.exitcode == 1
+    assert len(os.listdir(journal_dir)) == 1
+
+    store = FakeFirestore()
+    journal = WriteJournal(store.commit, journal_dir)
+    journal.start()
+    assert journal.drain(timeout=10)
+    assert len(store.docs) == 700
+    assert journal.status()["replayed"] == 2
+    assert os.listdir(journal_dir) == [os.path.basename(journal.status()["segment"])]
+
+    # Committed batches are not replayed a second time
+    again = FakeFirestore()
+    WriteJournal(again.commit, journal_dir).start()
+    time.sleep(0.3)
+    assert again.attempts == 0
+    print("✅ All 700 journaled students committed after the crash")
+
+def test_rolled_back_batches_not_replayed():
+    print("🧪 Testing replay of a segment whose upload was rolled back")
+    journal_dir = tempfile.mkdtemp()
+    sets = [["set", "student_results", doc_id, data] for _, _, doc_id, data in student_writes(0, 3)]
+    deletes = [["delete", "student_results", doc_id, None] for _, _, doc_id, _ in sets]
+    # The sets committed but their "done" marker was lost; the rollback's deletes committed after them
+    with open(os.path.join(journal_dir, "segment-1-1.jsonl"), "w") as f:
+        f.write(json.dumps({"op": "batch", "id": "sets", "writes": sets}) + "\n")
+        f.write(json.dumps({"op": "rollback", "ids": ["sets"]}) + "\n")
+        f.write(json.dumps({"op": "batch", "id": "deletes", "writes": deletes}) + "\n")
+        f.write(json.dumps({"op": "done", "id": "deletes"}) + "\n")
+
+    store = FakeFirestore()
+    journal = WriteJournal(store.commit, journal_dir)
+    journal.start()
+    assert journal.drain(timeout=10)
+    assert store.attempts == 0 and journal.status()["replayed"] == 0
+    assert os.listdir(journal_dir) == [os.path.basename(journal.status()["segment"])]
+
+    # Live: the rollback is recorded before the deletes, and queued sets still commit ahead of them
+    batch_id = journal.append(sets)
+    journal.mark_rolled_back([batch_id])
+    assert journal.wait([journal.append(deletes)], timeout=10)
+    assert store.docs == {} and journal.status()["rolled_back"] == 1
+    with open(journal.status()["segment"]) as f:
+        ops = [json.loads(line)["op"] for line in f]
+    # The sets' "done" may land before or after the rollback entry; the deletes always follow it
+    assert [op for op in ops if op != "done"] == ["batch", "rollback", "batch"] and ops.count("done") == 2
+    print("✅ Rolled-back students stayed deleted")
+
+def test_server_timestamp_survives_journal():
+    print("🧪 Testing SERVER_TIMESTAMP through the journal")
+    store = FakeFirestore()
+    journal = WriteJournal(store.commit, tempfile.mkdtemp())
+    batch_id = journal.append([('set', 'student_results', 'doc', {"uploadedAt": firestore.SERVER_TIMESTAMP, "year": "1"})])
+    assert journal.wait([batch_id], timeout=10)
+    assert store.docs["doc"]["uploadedAt"] is firestore.SERVER_TIMESTAMP
+    assert store.docs["doc"]["year"] == "1"
+    print("✅ Sentinel restored on commit")
+
+def test_appends_do_not_wait_for_commits():
+    print("🧪 Testing that journaling is decoupled from commit latency")
+    store = FakeFirestore(commit_seconds=0.3)
+    journal = WriteJournal(store.commit, tempfile.mkdtemp())
+    start = time.time()
+    batch_ids = [journal.append(student_writes(i * 500, 500)) for i in range(4)]
+    append_seconds = time.time() - start
+    print(f"📊 4 batches journaled in {append_seconds:.3f}s")
+    assert append_seconds < 0.3
+    assert journal.wait(batch_ids, timeout=10)
+    assert len(store.docs) == 2000
+    print("✅ Appends returned before the commits ran")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Watch Folder
+Long-running ingestion daemon for a drop directory. New PDFs are noticed through inotify
+(ctypes, no extra dependency) or, where inotify is unavailable, by polling; a file is only
+picked up once its size and mtime have stopped changing for STABLE_SECONDS. Its SHA-256
+is checked against the batch manifest (the ledger batch_pdf_processor runs use), and new
+files are handed to a bounded worker pool. Finished files move to done/, failed/ or
+duplicates/ under the drop directory.
+
+Content hashes come from the manifest's (path, size, mtime) cache, so a file waiting in
+the folder is hashed once, not on every poll; outcomes are recorded under the manifest's
+(sha256, parser version, collection) key, so a PDF ingested by a batch run is recognised
+here as a duplicate and the other way round.
+"""
+
+import os
+import time
+import errno
+import select
+import shutil
+import struct
+import ctypes
+import ctypes.util
+from concurrent.futures import ProcessPoolExecutor
+import batch_manifest
+
+STABLE_SECONDS = 5  # Unchanged size/mtime for this long means the upload into the folder finished
+POLL_SECONDS = 2
+RESCAN_SECONDS = 60  # Full directory scan even with inotify, for events missed on overflow
+DEFAULT_WATCH_WORKERS = 2
+DEFAULT_COLLECTION = 'student_results'  # Firestore collection the handler writes to (manifest key)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatch:
+    """Minimal inotify binding: names of files created, written or moved into one directory"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+        self.overflowed = False
+
+    def read(self, timeout):
+        """Wait up to timeout seconds; returns the set of file names with events"""
+        names = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return names
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return names
+            raise
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+            elif name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WatchFolder:
+    """
+    Drop-directory daemon. handler(pdf_path) runs in the executor (a process pool by
+    default) and returns a result dict with 'success'; at most `workers` files are in
+    flight, the rest wait in the folder. Outcomes go to the batch manifest at
+    manifest_path (BATCH_MANIFEST_PATH by default) under `collection`.
+    """
+
+    def __init__(self, drop_dir, handler, workers=DEFAULT_WATCH_WORKERS, executor=None,
+                 stable_seconds=STABLE_SECONDS, poll_seconds=POLL_SECONDS, use_inotify=True,
+                 collection=DEFAULT_COLLECTION, manifest_path=None):
+        self.drop_dir = os.path.abspath(drop_dir)
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.executor = executor
+        self.stable_seconds = stable_seconds
+        self.poll_seconds = poll_seconds
+        self.candidates = {}  # name -> (size, mtime, stable since)
+        self.collection = collection
+        self.in_flight = {}  # future -> (name, manifest key)
+        self.stats = {"ingested": 0, "failed": 0, "duplicates": 0}
+        for sub_dir in ('done', 'failed', 'duplicates'):
+            os.makedirs(os.path.join(self.drop_dir, sub_dir), exist_ok=True)
+        self.manifest = batch_manifest.get_connection(manifest_path)
+
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = InotifyWatch(self.drop_dir)
+                print(f"👀 Watching {self.drop_dir} with inotify")
+            except (OSError, AttributeError) as e:
+                print(f"⚠️ inotify unavailable ({e}) - polling every {poll_seconds}s")
+        if self.inotify is None:
+            print(f"👀 Polling {self.drop_dir} every {poll_seconds}s")
+
+    @staticmethod
+    def is_pdf(name):
+        return name.lower().endswith('.pdf') and not name.startswith('.')
+
+    def track(self, name):
+        """Start watching a file for stability (unless it is already being ingested)"""
+        if self.is_pdf(name) and name not in {value[0] for value in self.in_flight.values()}:
+            self.candidates.setdefault(name, None)
+
+    def scan(self):
+        """Add every PDF currently in the drop directory to the candidates"""
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.track(entry.name)
+
+    def ingested_status(self, key):
+        outcome = batch_manifest.lookup(self.manifest, key)
+        return outcome['status'] if outcome else None
+
+    def _move(self, name, sub_dir):
+        if not os.path.exists(os.path.join(self.drop_dir, name)):
+            return None  # Removed from the folder while it was processed
+        target = os.path.join(self.drop_dir, sub_dir, name)
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(name)
+            target = os.path.join(self.drop_dir, sub_dir, f"{stem}_{int(time.time())}{ext}")
+        shutil.move(os.path.join(self.drop_dir, name), target)
+        return target
+
+    def stable_files(self, now=None):
+        """Candidates whose size and mtime have not changed for stable_seconds"""
+        now = now or time.time()
+        ready = []
+        for name, seen in list(self.candidates.items()):
+            try:
+                stat = os.stat(os.path.join(self.drop_dir, name))
+            except FileNotFoundError:
+                del self.candidates[name]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if seen is None or seen[:2] != signature:
+                self.candidates[name] = signature + (now,)
+            elif stat.st_size > 0 and now - seen[2] >= self.stable_seconds:
+                ready.append(name)
+        return ready
+
+    def dispatch(self, now=None):
+        """Hash stable files (cached by size/mtime) and submit new ones while worker slots are free"""
+        in_flight_keys = {key for _, key in self.in_flight.values()}
+        for name in self.stable_files(now):
+            if len(self.in_flight) >= self.workers:
+                break  # Bounded: the rest stay in the folder until a worker frees up
+            path = os.path.join(self.drop_dir, name)
+            try:
+                key = batch_manifest.manifest_key(self.manifest, path, self.collection)
+            except FileNotFoundError:
+                del self.candidates[name]
+                continue
+            if key in in_flight_keys:
+                continue  # Same content is being ingested now; decide once that finishes
+            del self.candidates[name]
+            if self.ingested_status(key) == 'completed':
+                target = self._move(name, 'duplicates')
+                self.stats["duplicates"] += 1
+                print(f"⏭️ {name} already ingested (sha256 {key[0][:12]}) - moved to {os.path.relpath(target, self.drop_dir)}")
+                continue
+            print(f"📥 Ingesting {name} (sha256 {key[0][:12]})")
+            self.in_flight[self.executor.submit(self.handler, path)] = (name, key)
+            in_flight_keys.add(key)
+
+    def reap(self):
+        """Record finished files in the manifest and move them out of the drop directory"""
+        for future in [f for f in self.in_flight if f.done()]:
+            name, key = self.in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            status = 'completed' if result and result.get('success') else 'failed'
+            target = self._move(name, 'done' if status == 'completed' else 'failed')
+            batch_manifest.record(self.manifest, key, name, result or {"success": False})
+            if status == 'completed':
+                self.stats["ingested"] += 1
+                print(f"✅ {name}: {result.get('total_students', 0)} students ingested")
+            else:
+                self.stats["failed"] += 1
+                print(f"❌ {name} failed: {(result or {}).get('error', 'unknown error')}")
+
+    def wait_for_changes(self, timeout):
+        if self.inotify is None:
+            time.sleep(timeout)
+            self.scan()
+            return
+        for name in self.inotify.read(timeout):
+            self.track(name)
+        if self.inotify.overflowed:
+            self.inotify.overflowed = False
+            self.scan()
+
+    def run(self, stop_event=None):
+        """Watch until stop_event is set (or Ctrl+C), then wait for in-flight files"""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.scan()
+        last_scan = time.time()
+        try:
+            while not (stop_event and stop_event.is_set()):
+                self.reap()
+                self.dispatch()
+                # Re-check sooner while files are settling or workers are busy
+                busy = self.candidates or self.in_flight
+                self.wait_for_changes(min(self.poll_seconds, 0.5) if busy else self.poll_seconds)
+                if time.time() - last_scan >= RESCAN_SECONDS:
+                    self.scan()
+                    last_scan = time.time()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping watch folder")
+        finally:
+            print(f"⏳ Waiting for {len(self.in_flight)} in-flight file(s)")
+            self.executor.shutdown(wait=True)
+            self.reap()
+            if self.inotify:
+                self.inotify.close()
+            self.manifest.close()
+            print(f"📊 Watch folder stats: {self.stats}")
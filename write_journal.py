@@ -0,0 +1,354 @@
+"""
+Write Journal
+Append-only local journal of pending Firestore writes. A batch is appended and fsynced
+before anything is sent to Firestore; a background flusher then commits journaled
+batches in order, retrying with backoff, and appends a "done" marker for each one.
+A batch that keeps failing is set aside and retried on a slow schedule; later batches
+touching any of its documents wait behind it, so a document's writes land in journal order.
+Whatever a crashed or recycled process left uncommitted is replayed by the next process
+that opens the journal, so a transient Firestore error or a crash never drops a write.
+Batches an upload rolled back (cancelled uploads delete what they wrote) are recorded too,
+so replay never re-commits them, even when their "done" marker was lost, after the deletes.
+
+Each process appends to its own segment file, held under an exclusive flock for the
+life of the process; a segment whose lock can be taken belongs to a dead process.
+    <journal_dir>/segment-<pid>-<time>.jsonl
+        {"op": "batch", "id": ..., "writes": [[op, collection, doc_id, data], ...]}
+        {"op": "done", "id": ...}
+        {"op": "rollback", "ids": [...]}
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import secrets
+import threading
+from collections import deque, Counter
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.environ.get('WRITE_JOURNAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'write_journal'))
+JOURNAL_RETRY_SECONDS = 1.0  # First retry delay; doubles per failed attempt
+JOURNAL_MAX_RETRY_SECONDS = 60.0
+JOURNAL_MAX_ATTEMPTS = 8  # Then the batch is set aside (stalled) so other documents' writes keep flowing
+JOURNAL_STALLED_RETRY_SECONDS = 300.0  # How often stalled batches are retried
+JOURNAL_REPLAY_SECONDS = 60  # How often the flusher looks for segments of dead processes
+JOURNAL_ROTATE_BYTES = 64 * 1024 * 1024
+
+SERVER_TIMESTAMP_MARKER = {"__firestore__": "SERVER_TIMESTAMP"}
+
+
+def _encode(value):
+    """JSON hook: Firestore's SERVER_TIMESTAMP sentinel is journaled as a marker"""
+    from firebase_admin import firestore
+    if value is firestore.SERVER_TIMESTAMP:
+        return SERVER_TIMESTAMP_MARKER
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+
+def _decode(data):
+    if not isinstance(data, dict):
+        return data
+    from firebase_admin import firestore
+    return {key: firestore.SERVER_TIMESTAMP if value == SERVER_TIMESTAMP_MARKER else value
+            for key, value in data.items()}
+
+
+class WriteJournal:
+    """
+    commit_batch(writes) commits one list of (op, collection, doc_id, data) writes
+    ('set' or 'delete') atomically and raises on failure.
+    """
+
+    def __init__(self, commit_batch, journal_dir=None):
+        self.commit_batch = commit_batch
+        self.journal_dir = journal_dir or JOURNAL_DIR
+        self.pending = deque()  # (batch_id, writes) in journal order
+        self.committed = set()
+        self.stalled = deque()  # (batch_id, writes) set aside after JOURNAL_MAX_ATTEMPTS, in journal order
+        self._stalled_ids = set()
+        self._stalled_docs = Counter()  # (collection, doc_id) -> stalled batches writing it
+        self._stalled_retry_at = 0
+        self.stats = {"appended": 0, "committed": 0, "retries": 0, "replayed": 0, "stalled": 0, "rolled_back": 0}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._segment = None
+        self._segment_path = None
+        self._open_batches = 0
+        self._flusher = None
+        self._last_replay = 0
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    # -- segment files ---------------------------------------------------------------
+
+    def _open_segment(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        path = os.path.join(self.journal_dir, f"segment-{os.getpid()}-{time.time_ns()}.jsonl")
+        segment = open(path, 'a', encoding='utf-8')
+        fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._segment, self._segment_path, self._open_batches = segment, path, 0
+
+    def _write_entry(self, entry, sync):
+        self._segment.write(json.dumps(entry, default=_encode, ensure_ascii=False) + '\n')
+        self._segment.flush()
+        if sync:
+            os.fsync(self._segment.fileno())
+
+    def _maybe_rotate(self):
+        """Start a fresh segment once the current one is large and fully committed"""
+        if self._open_batches == 0 and self._segment.tell() >= JOURNAL_ROTATE_BYTES:
+            old_segment, old_path = self._segment, self._segment_path
+            self._open_segment()
+            old_segment.close()
+            os.remove(old_path)
+
+    def _reset_after_fork(self):
+        """A forked child starts with no segment, queue or flusher of its own (opened on first append)"""
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.pending = deque()
+        self.committed = set()
+        self.stalled = deque()
+        self._stalled_ids = set()
+        self._stalled_docs = Counter()
+        self._segment = self._segment_path = self._flusher = None
+        self._open_batches = 0
+
+    def _ensure_started(self):
+        """Open this process's segment, replay dead ones and start the flusher (caller holds the lock)"""
+        if self._flusher is not None:
+            return
+        self._open_segment()
+        self._flusher = threading.Thread(target=self._flush_loop, name="write-journal-flusher", daemon=True)
+        self._flusher.start()
+        self._replay_dead_segments()
+
+    def start(self):
+        """Replay what dead processes left behind without waiting for the first append"""
+        with self._lock:
+            self._ensure_started()
+
+    # -- public API --------------------------------------------------------------------
+
+    def append(self, writes):
+        """Journal one batch (fsynced) and queue it for commit; returns its batch id"""
+        batch_id = secrets.token_hex(8)
+        writes = [list(write) for write in writes]
+        with self._lock:
+            self._ensure_started()
+            self._write_entry({"op": "batch", "id": batch_id, "writes": writes}, sync=True)
+            self._open_batches += 1
+            self.pending.append((batch_id, writes))
+            self.stats["appended"] += 1
+            self._cond.notify_all()
+        return batch_id
+
+    def mark_rolled_back(self, batch_ids):
+        """
+        Record (fsynced) that batch_ids are being undone, before the deletes that undo them are
+        appended: replay then skips those batches instead of re-committing them after the deletes.
+        Batches still queued in this process commit in order, ahead of the deletes.
+        """
+        batch_ids = list(batch_ids)
+        if not batch_ids:
+            return
+        with self._lock:
+            self._ensure_started()
+            self._write_entry({"op": "rollback", "ids": batch_ids}, sync=True)
+            self.stats["rolled_back"] += len(batch_ids)
+
+    def wait(self, batch_ids, timeout=None):
+        """Block until every batch in batch_ids is committed; False on timeout or once one has stalled"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            while not all(batch_id in self.committed for batch_id in batch_ids):
+                if any(batch_id in self._stalled_ids for batch_id in batch_ids):
+                    return False  # Still journaled and retried, but not worth blocking a request on
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def drain(self, timeout=None):
+        """Wait for everything queued so far"""
+        with self._lock:
+            batch_ids = [batch_id for batch_id, _ in self.pending] + [batch_id for batch_id, _ in self.stalled]
+        return self.wait(batch_ids, timeout)
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, pending=len(self.pending), stalled_batches=len(self.stalled),
+                        segment=self._segment_path)
+
+    # -- flusher -----------------------------------------------------------------------
+
+    def _flush_loop(self):
+        attempts = 0
+        while True:
+            with self._lock:
+                while not self.pending and not self._stalled_due():
+                    if not self._cond.wait(self._idle_seconds()):
+                        break
+                batch = self.pending[0] if self.pending else None
+                if batch is not None and self._touches_stalled(batch[1]):
+                    # An earlier write to one of its documents is stalled: keep their order
+                    self.pending.popleft()
+                    self._stall(batch)
+                    batch = None
+            if time.time() - self._last_replay >= JOURNAL_REPLAY_SECONDS:
+                with self._lock:
+                    self._replay_dead_segments()
+            if self._stalled_due():
+                self._retry_stalled()
+            if batch is None:
+                continue
+
+            batch_id, writes = batch
+            try:
+                self._commit(writes)
+            except Exception as e:
+                attempts += 1
+                if attempts >= JOURNAL_MAX_ATTEMPTS:
+                    logger.error(f"Journaled batch {batch_id} failed {attempts} times, retrying it every "
+                                 f"{JOURNAL_STALLED_RETRY_SECONDS:.0f}s: {e}")
+                    with self._lock:
+                        self.pending.popleft()
+                        self._stall(batch)
+                    attempts = 0
+                    continue
+                delay = min(JOURNAL_RETRY_SECONDS * 2 ** (attempts - 1), JOURNAL_MAX_RETRY_SECONDS)
+                logger.warning(f"Commit of journaled batch {batch_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {e}")
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+                continue
+
+            attempts = 0
+            with self._lock:
+                self.pending.popleft()
+                self._mark_committed(batch_id)
+
+    def _commit(self, writes):
+        self.commit_batch([(op, collection, doc_id, _decode(data)) for op, collection, doc_id, data in writes])
+
+    def _mark_committed(self, batch_id):
+        """Record a committed batch (caller holds the lock)"""
+        self._write_entry({"op": "done", "id": batch_id}, sync=False)  # Lost marker = harmless re-commit
+        self._open_batches -= 1
+        self.committed.add(batch_id)
+        self.stats["committed"] += 1
+        self._maybe_rotate()
+        self._cond.notify_all()
+
+    # -- stalled batches ---------------------------------------------------------------
+
+    @staticmethod
+    def _doc_keys(writes):
+        return {(collection, doc_id) for _, collection, doc_id, _ in writes}
+
+    def _touches_stalled(self, writes):
+        return bool(self._stalled_docs) and any(key in self._stalled_docs for key in self._doc_keys(writes))
+
+    def _stall(self, batch):
+        """Set a batch aside for the slow retry schedule (caller holds the lock)"""
+        if not self.stalled:
+            self._stalled_retry_at = time.time() + JOURNAL_STALLED_RETRY_SECONDS
+        self.stalled.append(batch)
+        self._stalled_ids.add(batch[0])
+        self._stalled_docs.update(self._doc_keys(batch[1]))
+        self.stats["stalled"] += 1
+        self._cond.notify_all()
+
+    def _stalled_due(self):
+        return bool(self.stalled) and time.time() >= self._stalled_retry_at
+
+    def _idle_seconds(self):
+        if self.stalled:
+            return max(0.0, min(JOURNAL_REPLAY_SECONDS, self._stalled_retry_at - time.time()))
+        return JOURNAL_REPLAY_SECONDS
+
+    def _retry_stalled(self):
+        """Commit stalled batches in journal order, stopping at the first that still fails"""
+        while True:
+            with self._lock:
+                if not self.stalled:
+                    return
+                batch_id, writes = self.stalled[0]
+            try:
+                self._commit(writes)
+            except Exception as e:
+                logger.warning(f"Stalled journaled batch {batch_id} failed again, next retry in "
+                               f"{JOURNAL_STALLED_RETRY_SECONDS:.0f}s: {e}")
+                with self._lock:
+                    self.stats["retries"] += 1
+                    self._stalled_retry_at = time.time() + JOURNAL_STALLED_RETRY_SECONDS
+                return
+            with self._lock:
+                self.stalled.popleft()
+                self._stalled_ids.discard(batch_id)
+                self._stalled_docs.subtract(self._doc_keys(writes))
+                self._stalled_docs = +self._stalled_docs  # Drop documents with no stalled writes left
+                self._mark_committed(batch_id)
+
+    def _replay_dead_segments(self):
+        """Move uncommitted batches of dead processes' segments into ours (caller holds the lock)"""
+        self._last_replay = time.time()
+        if not os.path.isdir(self.journal_dir):
+            return 0
+        dead = []  # (path, open segment holding its flock, uncommitted batches)
+        rolled_back = set()
+        try:
+            for name in sorted(os.listdir(self.journal_dir)):
+                path = os.path.join(self.journal_dir, name)
+                if not name.endswith('.jsonl') or path == self._segment_path:
+                    continue
+                try:
+                    segment = open(path, 'r', encoding='utf-8')
+                except FileNotFoundError:
+                    continue
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    segment.close()
+                    continue  # Its process is alive and flushing it
+                batches = {}
+                for line in segment:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn final line from a crash mid-append: never fsynced, never committed
+                    if entry.get("op") == "batch":
+                        batches[entry["id"]] = entry["writes"]
+                    elif entry.get("op") == "done":
+                        batches.pop(entry["id"], None)
+                    elif entry.get("op") == "rollback":
+                        rolled_back.update(entry["ids"])
+                dead.append((path, segment, batches))
+
+            # All segments are read before any batch is queued: a rollback may be in a later segment
+            replayed = 0
+            for path, segment, batches in dead:
+                for batch_id, writes in batches.items():
+                    if batch_id in rolled_back:
+                        continue
+                    self._write_entry({"op": "batch", "id": batch_id, "writes": writes}, sync=False)
+                    self._open_batches += 1
+                    self.pending.append((batch_id, writes))
+                    replayed += 1
+                if replayed:
+                    os.fsync(self._segment.fileno())
+                os.remove(path)
+        finally:
+            for _, segment, _ in dead:
+                segment.close()
+        skipped = sum(1 for _, _, batches in dead for batch_id in batches if batch_id in rolled_back)
+        if skipped:
+            logger.info(f"Skipping {skipped} uncommitted journaled batches that were rolled back")
+        if replayed:
+            logger.info(f"Replaying {replayed} uncommitted journaled batches")
+            self.stats["replayed"] += replayed
+            self._cond.notify_all()
+        return replayed
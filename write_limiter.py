@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Write Limiter
+Token bucket shared by every process of a batch run, so PDFs ingested in parallel stay
+within one combined Firestore write rate. The bucket state lives in shared memory
+(multiprocessing.Value), so it must be created before the worker processes and handed
+to them at start-up (e.g. through a pool initializer).
+"""
+
+import os
+import time
+import multiprocessing
+
+FIRESTORE_WRITES_PER_SECOND = float(os.environ.get('FIRESTORE_WRITES_PER_SECOND', 500))
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `capacity`; acquire(n) blocks until n are available"""
+
+    def __init__(self, rate=FIRESTORE_WRITES_PER_SECOND, capacity=None, context=None):
+        context = context or multiprocessing.get_context()
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = context.Value('d', self.capacity, lock=False)
+        self._updated = context.Value('d', time.monotonic(), lock=False)
+        self._waited = context.Value('d', 0.0, lock=False)
+        self._lock = context.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self._updated.value)
+        self._tokens.value = min(self.capacity, self._tokens.value + elapsed * self.rate)
+        self._updated.value = now
+
+    def acquire(self, count=1):
+        """Take count tokens (a batch larger than the bucket takes a full bucket); returns seconds waited"""
+        count = min(float(count), self.capacity)
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens.value >= count:
+                    self._tokens.value -= count
+                    waited = now - started
+                    self._waited.value += waited
+                    return waited
+                shortfall = (count - self._tokens.value) / self.rate
+            time.sleep(shortfall)
+
+    def total_waited(self):
+        """Seconds all processes together spent waiting for tokens"""
+        with self._lock:
+            return self._waited.value